@@ -1,82 +1,217 @@
 # run_all.py
+import os
+import argparse
 import subprocess
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from pathlib import Path
 import sys
-import re
 from urllib.parse import urlparse
 import config
 
 
 SCRIPTS_DIR = Path(__file__).parent
-CONFIG_PATH = SCRIPTS_DIR / "config.py"
 
-BASE_DIR = Path("/home/sundeep/Fandom-Span-Identification-and-Retrieval/1.Fandom_Dataset_Collection/raw_data")
-
-def derive_fandom_name() -> str:
-    """Derive fandom name from config.BASE_URL (e.g., marvel.fandom.com → marvel)."""
-    domain = urlparse(config.BASE_URL).netloc
-    return domain.split(".")[0]
-
-def update_config_links_file(file_path: Path):
-    """Ensure LINKS_FILE is defined/updated inside config.py"""
-    text = CONFIG_PATH.read_text(encoding="utf-8")
-    if re.search(r"^LINKS_FILE\s*=", text, flags=re.M):
-        new_text = re.sub(
-            r"^LINKS_FILE\s*=.*",
-            f'LINKS_FILE = r"{file_path.resolve()}"',
-            text,
-            flags=re.M,
-        )
-    else:
-        new_text = text.rstrip() + f'\nLINKS_FILE = r"{file_path.resolve()}"\n'
-    CONFIG_PATH.write_text(new_text, encoding="utf-8")
-
-def run(step_name: str, argv: list[str]):
-    print(f"\n▶️ {step_name} ...")
-    subprocess.run(argv, check=True)
-
-def main():
-    fandom = derive_fandom_name()
-    fandom_data_dir = BASE_DIR / f"{fandom}_fandom_data"
-    fandom_data_dir.mkdir(parents=True, exist_ok=True)
-
-    links_filename = f"{fandom}_articles_list.txt"
-    links_path = fandom_data_dir / links_filename
+BASE_DIR = config.BASE_DIR
 
+# (step name, script, pool) — "fetch" steps hit the network, "cpu" steps only parse local files.
+# Step 3 additionally gets the links basename as argv[1]; step 5 gets "master".
+# With --delta, the steps in DELTA_STEPS only redo the articles listed in the delta file.
+STEPS = [
     # 1) Article links list
-    run("Step 1: Article links fetching", ["python", str(SCRIPTS_DIR / "1.article_links_list_fetcher.py")])
-
-    if not links_path.exists():
-        raise FileNotFoundError(f"Expected links file not found: {links_path}")
-
-    update_config_links_file(links_path)
-    print(f"📌 config.py updated: LINKS_FILE = {links_path}")
-
+    ("Step 1: Article links fetching", "1.article_links_list_fetcher.py", "fetch"),
     # 2) HTML fetcher (no args; saves to <fandom>_fandom_data/<fandom>_fandom_html/)
-    run("Step 2: HTML fetching", ["python", str(SCRIPTS_DIR / "2.html_fetcher.py")])
-
+    ("Step 2: HTML fetching", "2.html_fetcher.py", "fetch"),
     # 3) Plaintext fetcher (pass basename; it resolves inside fandom_data_dir)
-    run("Step 3: Plaintext fetching", ["python", str(SCRIPTS_DIR / "3.plaintext_fetcher.py"), links_filename])
-
+    ("Step 3: Plaintext fetching", "3.plaintext_fetcher.py", "fetch"),
+    # 3b) Article delta vs. the last indexed crawl (writes article_delta_<fandom>.json)
+    ("Step 3b: Article delta detection", "article_delta.py", "cpu"),
     # 4) Spans fetcher (no args; reads from <fandom>_fandom_html, writes to <fandom>_fandom_spans and master_spans_<fandom>.csv)
-    run("Step 4: Spans fetching", ["python", str(SCRIPTS_DIR / "4.spans_fetcher.py")])
-
+    ("Step 4: Spans fetching", "4.spans_fetcher.py", "cpu"),
     # 5) Add probabilities (pass 'master' to use default master_spans_<fandom>.csv)
-    run("Step 5: Add probabilities", ["python", str(SCRIPTS_DIR / "5.add_probs_to_spans.py"), "master"])
-
+    ("Step 5: Add probabilities", "5.add_probs_to_spans.py", "cpu"),
     # 6) Title → ID mapping (no CLI; writes title_to_id_mapping_<fandom>.csv in data dir)
-    run("Step 6: Title→ID mapping", ["python", str(SCRIPTS_DIR / "6.title_id_mapping.py")])
-
+    ("Step 6: Title→ID mapping", "6.title_id_mapping.py", "cpu"),
     # 7) Paragraph link mapping (no CLI; writes processed_links_by_paragraph_<fandom>.csv)
-    run("Step 7: Paragraph link mapping", ["python", str(SCRIPTS_DIR / "7.paragraph_link_mapping.py")])
-
+    ("Step 7: Paragraph link mapping", "7.paragraph_link_mapping.py", "cpu"),
     # 8) Paragraph text extractor (no CLI; writes paragraphs_<fandom>.csv)
-    run("Step 8: Paragraph text extraction", ["python", str(SCRIPTS_DIR / "8.paragraph_text_extractor.py")])
-
+    ("Step 8: Paragraph text extraction", "8.paragraph_text_extractor.py", "cpu"),
+    # 8c) Paragraph text store (mmap blob + sorted offset index for text lookups by id in retrieval/re-ranking)
+    ("Step 8c: Paragraph text store", "paragraph_store.py", "cpu"),
     # 9) Master CSV (no CLI; writes master_csv_<fandom>.csv)
-    run("Step 9: Master CSV builder", ["python", str(SCRIPTS_DIR / "9.master_csv.py")])
+    ("Step 9: Master CSV builder", "9.master_csv.py", "cpu"),
+    # 9b) Near-duplicate clustering (MinHash/LSH; writes paragraph_clusters_<fandom>.csv for embedding/retrieval,
+    #     representatives picked among master CSV rows)
+    ("Step 9b: Near-duplicate paragraph clustering", "paragraph_dedup.py", "cpu"),
+]
 
+DELTA_STEPS = {"4.spans_fetcher.py", "8.paragraph_text_extractor.py"}
+
+def derive_fandom_name(base_url: str | None = None) -> str:
+    """Derive fandom name from a base URL, default config.BASE_URL (e.g., marvel.fandom.com → marvel)."""
+    domain = urlparse(base_url or config.BASE_URL).netloc
+    return domain.split(".")[0]
+
+def pipeline_env(base_url: str, links_path: Path) -> dict:
+    """
+    Environment for one fandom's pipeline. config.py reads these instead of being edited in place,
+    so several fandoms can run at the same time without stepping on each other.
+    """
+    env = os.environ.copy()
+    env["FANDOM_BASE_URL"] = base_url
+    env["FANDOM_BASE_DIR"] = str(BASE_DIR)
+    env["FANDOM_LINKS_FILE"] = str(links_path.resolve())
+    if base_url != config.BASE_URL:
+        env.pop("FANDOM_START_URL", None)  # let config derive Special:AllPages for this domain
+    return env
+
+def step_argv(script: str, links_filename: str, delta: bool = False) -> list[str]:
+    argv = ["python", str(SCRIPTS_DIR / script)]
+    if script.startswith("3."):
+        argv.append(links_filename)
+    elif script.startswith("5."):
+        argv.append("master")
+    if delta and script in DELTA_STEPS:
+        argv.append("--delta")
+    return argv
+
+def links_paths(base_url: str):
+    fandom = derive_fandom_name(base_url)
+    fandom_data_dir = BASE_DIR / f"{fandom}_fandom_data"
+    fandom_data_dir.mkdir(parents=True, exist_ok=True)
+    links_filename = f"{fandom}_articles_list.txt"
+    return fandom, fandom_data_dir, links_filename, fandom_data_dir / links_filename
+
+def check_step(script: str, links_path: Path):
+    if script.startswith("1.") and not links_path.exists():
+        raise FileNotFoundError(f"Expected links file not found: {links_path}")
+
+def run(step_name: str, argv: list[str], env: dict | None = None, cwd: Path | None = None,
+        log_path: Path | None = None):
+    if log_path is None:
+        print(f"\n▶️ {step_name} ...")
+        subprocess.run(argv, check=True, env=env, cwd=cwd)
+        return
+
+    with log_path.open("a", encoding="utf-8") as log:
+        log.write(f"\n▶️ {step_name} ...\n")
+        log.flush()
+        subprocess.run(argv, check=True, env=env, cwd=cwd, stdout=log, stderr=subprocess.STDOUT)
+
+def run_pipeline(base_url: str, delta: bool = False) -> Path:
+    """Run steps 1–9 for one fandom, one after the other, with console output."""
+    _, fandom_data_dir, links_filename, links_path = links_paths(base_url)
+    env = pipeline_env(base_url, links_path)
+    for step_name, script, _ in STEPS:
+        run(step_name, step_argv(script, links_filename, delta), env=env)
+        check_step(script, links_path)
+    return fandom_data_dir
+
+def run_batch(base_urls: list[str], fetch_workers: int, cpu_workers: int, delta: bool = False) -> int:
+    """
+    Run every fandom's pipeline on one shared pool of fetch_workers + cpu_workers threads. Steps,
+    not whole pipelines, are the unit of work: a fandom's next step is queued when its previous one
+    finishes, and a queued step starts once its category ("fetch" / "cpu") has fewer than its limit
+    running. Every step runs with cwd=<fandom>_fandom_data (so logs/ stay per fandom) and writes its
+    console output to <fandom>_fandom_data/logs/run_all.log.
+    """
+    limits = {"fetch": fetch_workers, "cpu": cpu_workers}
+    print(f"📦 Batch: {len(base_urls)} fandoms, {fetch_workers} fetch workers, {cpu_workers} CPU workers")
+
+    pipelines = {}
+    for url in base_urls:
+        fandom, fandom_data_dir, links_filename, links_path = links_paths(url)
+        log_path = fandom_data_dir / "logs" / "run_all.log"
+        log_path.parent.mkdir(parents=True, exist_ok=True)
+        log_path.write_text(f"run_all for {url}\n", encoding="utf-8")
+        pipelines[url] = {"fandom": fandom, "dir": fandom_data_dir, "links_filename": links_filename,
+                          "links_path": links_path, "env": pipeline_env(url, links_path),
+                          "log_path": log_path, "next": 0}
+
+    ready = {category: deque() for category in limits}   # urls whose next step may start, FIFO
+    running = {category: 0 for category in limits}
+    in_flight = {}
+    failed = []
+
+    def queue_next(url: str):
+        ready[STEPS[pipelines[url]["next"]][2]].append(url)
+
+    with ThreadPoolExecutor(max_workers=fetch_workers + cpu_workers) as pool:
+
+        def dispatch():
+            for category, queue in ready.items():
+                while queue and running[category] < limits[category]:
+                    url = queue.popleft()
+                    state = pipelines[url]
+                    step_name, script, _ = STEPS[state["next"]]
+                    argv = step_argv(script, state["links_filename"], delta)
+                    fut = pool.submit(run, step_name, argv, state["env"], state["dir"], state["log_path"])
+                    in_flight[fut] = (url, category)
+                    running[category] += 1
+
+        for url in base_urls:
+            queue_next(url)
+        dispatch()
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for fut in done:
+                url, category = in_flight.pop(fut)
+                running[category] -= 1
+                state = pipelines[url]
+                step_name, script, _ = STEPS[state["next"]]
+                try:
+                    fut.result()
+                    check_step(script, state["links_path"])
+                except Exception as e:
+                    failed.append(url)
+                    print(f"❌ [{state['fandom']}] failed: {e} (see {state['log_path']})", flush=True)
+                    continue
+                print(f"[{state['fandom']}] ✔ {step_name}", flush=True)
+                state["next"] += 1
+                if state["next"] < len(STEPS):
+                    queue_next(url)
+                else:
+                    print(f"✅ [{state['fandom']}] finished → {state['dir']}", flush=True)
+            dispatch()
+
+    print(f"\n📊 Batch done: {len(base_urls) - len(failed)} ok, {len(failed)} failed")
+    for url in failed:
+        print(f"   - {url}")
+    return 1 if failed else 0
+
+def read_base_urls(path: Path) -> list[str]:
+    """One fandom base URL per line; blank lines and '#' comments are ignored."""
+    urls = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if line and not line.startswith("#") and line not in urls:
+            urls.append(line)
+    return urls
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the 9-step fandom dataset pipeline.")
+    parser.add_argument("base_urls", nargs="*",
+                        help="Fandom base URLs (default: config.BASE_URL). More than one runs in batch mode.")
+    parser.add_argument("--batch-file", type=Path, help="Text file with one fandom base URL per line.")
+    parser.add_argument("--fetch-workers", type=int, default=4, help="Concurrent network steps across all fandoms.")
+    parser.add_argument("--cpu-workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="Concurrent parsing steps across all fandoms.")
+    parser.add_argument("--delta", action="store_true",
+                        help="Re-extract only articles added/changed since the last indexed crawl.")
+    args = parser.parse_args()
+
+    base_urls = list(args.base_urls)
+    if args.batch_file:
+        base_urls += [u for u in read_base_urls(args.batch_file) if u not in base_urls]
+
+    if len(base_urls) > 1:
+        sys.exit(run_batch(base_urls, args.fetch_workers, args.cpu_workers, args.delta))
+
+    base_url = base_urls[0] if base_urls else config.BASE_URL
+    run_pipeline(base_url, delta=args.delta)
     print("\n✅ All 9 steps finished successfully!")
+    if args.delta:
+        print("   Next: create_embeddings.py --delta, then create_faiss_index.py --delta (also rebuilds the article centroid index)")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
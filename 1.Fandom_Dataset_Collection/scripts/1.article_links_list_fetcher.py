@@ -76,9 +76,7 @@ if __name__ == "__main__":
 
     # derive name from BASE_URL host (e.g., "marvel.fandom.com" → "marvel_articles.txt")
     domain = urlparse(config.BASE_URL).netloc.split(".")[0]
-    base_dir = "/home/sundeep/Fandom-Span-Identification-and-Retrieval/1.Fandom_Dataset_Collection/raw_data"
-    output_dir = f"{domain}_fandom_data"
-    os.makedirs(output_dir, exist_ok=True)  # create folder if it doesn’t exist
+    FANDOM_DATA_DIR.mkdir(parents=True, exist_ok=True)  # create folder if it doesn’t exist
     filename = FANDOM_DATA_DIR / f"{domain}_articles_list.txt"
     with open(filename, "w", encoding="utf-8") as f:
         f.write("\n".join(links))
@@ -12,7 +12,7 @@ from net_log import make_logger, fetch_url_text, log_fetch_outcome, FetchResult
 domain = urlparse(config.BASE_URL).netloc  # e.g. alldimensions.fandom.com
 fandom_name = domain.split(".")[0]         # take "alldimensions"
 
-BASE_DIR = "/home/sundeep/Fandom-Span-Identification-and-Retrieval/1.Fandom_Dataset_Collection/raw_data"
+BASE_DIR = str(config.BASE_DIR)
 FANDOM_DATA_DIR = os.path.join(BASE_DIR, f"{fandom_name}_fandom_data")
 # NEST html folder inside the step-1 directory:
 OUTPUT_FOLDER = os.path.join(FANDOM_DATA_DIR, f"{fandom_name}_fandom_html")
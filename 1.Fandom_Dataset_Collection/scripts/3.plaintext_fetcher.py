@@ -12,7 +12,7 @@ domain = urlparse(config.BASE_URL).netloc          # e.g. "marvel.fandom.com"
 fandom_name = domain.split(".")[0]                 # e.g. "marvel"
 
 # Base location where raw_data lives
-BASE_DIR = "/home/sundeep/Fandom-Span-Identification-and-Retrieval/1.Fandom_Dataset_Collection/raw_data"
+BASE_DIR = str(config.BASE_DIR)
 
 # The fandom-specific data folder created by script #1
 FANDOM_DATA_DIR = os.path.join(BASE_DIR, f"{fandom_name}_fandom_data")
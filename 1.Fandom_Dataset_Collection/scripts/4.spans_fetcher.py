@@ -9,6 +9,7 @@ from pathlib import Path
 from urllib.parse import urljoin, urlparse
 from bs4 import BeautifulSoup
 from net_log import make_logger, log_fetch_outcome, FetchResult
+import article_delta
 import config
 
 # ---------- PATH SETUP (match your project layout) ----------
@@ -17,7 +18,7 @@ domain = urlparse(config.BASE_URL).netloc  # e.g. marvel.fandom.com
 fandom_name = domain.split(".")[0]         # e.g. "marvel"
 
 # Base raw_data directory
-BASE_DIR = "/home/sundeep/Fandom-Span-Identification-and-Retrieval/1.Fandom_Dataset_Collection/raw_data"
+BASE_DIR = str(config.BASE_DIR)
 
 # Fandom-specific data dir created by script #1
 FANDOM_DATA_DIR = Path(BASE_DIR) / f"{fandom_name}_fandom_data"
@@ -38,12 +39,19 @@ logger = make_logger(f"{SCRIPT}_{fandom_name}")
 
 # --- 1) Discover inputs (no hardcoded names) ---
 # Usage:
-#   python 4.spans_fetcher.py [html_dir] [base_url]
+#   python 4.spans_fetcher.py [html_dir] [base_url] [--delta]
+#
+# --delta: only re-parse the added/changed articles from article_delta_<fandom>.json,
+#          drop the per-article CSVs of deleted ones and rebuild the master CSV from SPANS_DIR.
 #
 # If not provided:
 #  - html_dir: DEFAULT_HTML_DIR or first folder matching "*_fandom_html" under FANDOM_DATA_DIR
 #  - base_url: config.BASE_URL (preferred) else sniffed from <link rel="canonical"> or internal links
 
+DELTA_MODE = "--delta" in sys.argv
+if DELTA_MODE:
+    sys.argv.remove("--delta")
+
 def resolve_html_dir_from_arg(arg: str) -> Path | None:
     """Try multiple ways to resolve the user-passed html_dir."""
     p = Path(arg)
@@ -196,6 +204,48 @@ def process_file(path: Path, master_writer):
     else:
         print(f"💾 Saved {out_csv.name} with {len(rows)} links")
 
+SPANS_HEADER = [
+    "article_id", "paragraph_id",
+    "link_text", "start", "end",
+    "link_type", "resolved_url",
+    "text_dict", "support"
+]
+
+def main_delta():
+    delta = article_delta.load_delta()
+    if delta is None:
+        print(f"❌ No pending delta at {article_delta.DELTA_PATH}; run article_delta.py first.")
+        sys.exit(1)
+    article_delta.print_delta_summary(delta)
+
+    for title in article_delta.deleted_titles(delta):
+        stale = SPANS_DIR / f"{title}.csv"
+        if stale.exists():
+            stale.unlink()
+            print(f"🗑️  Removed {stale.name}")
+
+    # Per-article CSVs are written as a side effect; their rows go to a throwaway writer here
+    # because the master is rebuilt from SPANS_DIR below.
+    titles = sorted(article_delta.reextract_titles(delta))
+    with open(os.devnull, "w", newline="", encoding="utf-8") as devnull:
+        sink = csv.writer(devnull)
+        for title in titles:
+            (SPANS_DIR / f"{title}.csv").unlink(missing_ok=True)  # never keep spans of the old revision
+            fpath = HTML_DIR / f"{title}.html"
+            if fpath.is_file():
+                process_file(fpath, sink)
+
+    with MASTER_CSV.open("w", newline="", encoding="utf-8") as f:
+        master_writer = csv.writer(f)
+        master_writer.writerow(SPANS_HEADER)
+        for span_csv in sorted(SPANS_DIR.glob("*.csv")):
+            with span_csv.open("r", newline="", encoding="utf-8") as sf:
+                reader = csv.reader(sf)
+                next(reader, None)
+                master_writer.writerows(reader)
+
+    print(f"\n✅ Master CSV rebuilt ({len(titles)} articles re-parsed): {MASTER_CSV}")
+
 def main():
     files = sorted([f for f in HTML_DIR.glob("*.html")])
     if not files:
@@ -204,16 +254,14 @@ def main():
 
     with MASTER_CSV.open("w", newline="", encoding="utf-8") as f:
         master_writer = csv.writer(f)
-        master_writer.writerow([
-            "article_id", "paragraph_id",
-            "link_text", "start", "end",
-            "link_type", "resolved_url",
-            "text_dict", "support"
-        ])
+        master_writer.writerow(SPANS_HEADER)
         for fpath in files:
             process_file(fpath, master_writer)
 
     print(f"\n✅ Master CSV written: {MASTER_CSV}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    if DELTA_MODE:
+        main_delta()
+    else:
+        main()
\ No newline at end of file
@@ -11,7 +11,7 @@ import config
 domain = urlparse(config.BASE_URL).netloc          # e.g. marvel.fandom.com
 fandom_name = domain.split(".")[0]                 # e.g. "marvel"
 
-BASE_DIR = Path("/home/sundeep/Fandom-Span-Identification-and-Retrieval/1.Fandom_Dataset_Collection/raw_data")
+BASE_DIR = config.BASE_DIR
 FANDOM_DATA_DIR = BASE_DIR / f"{fandom_name}_fandom_data"
 DEFAULT_MASTER = FANDOM_DATA_DIR / f"master_spans_{fandom_name}.csv"
 # ---------------------------------------------------------------
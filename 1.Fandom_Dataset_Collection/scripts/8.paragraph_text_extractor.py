@@ -3,6 +3,7 @@ import os, re, sys, csv
 from pathlib import Path
 from urllib.parse import urlparse
 from bs4 import BeautifulSoup
+import article_delta
 import config
 
 # -----------------------------
@@ -11,7 +12,7 @@ import config
 domain = urlparse(config.BASE_URL).netloc          # e.g. "marvel.fandom.com"
 fandom_name = domain.split(".")[0]                 # e.g. "marvel"
 
-BASE_DIR = Path("/home/sundeep/Fandom-Span-Identification-and-Retrieval/1.Fandom_Dataset_Collection/raw_data")
+BASE_DIR = config.BASE_DIR
 FANDOM_DATA_DIR = BASE_DIR / f"{fandom_name}_fandom_data"
 
 # Inputs
@@ -116,31 +117,77 @@ def main():
         writer.writeheader()
 
         for idx, fname in enumerate(files, 1):
-            title = Path(fname).stem
-            if title not in title_to_id_map:
-                print(f"[warn] No article_id found in spans CSVs for title '{title}'. Skipping.", flush=True)
-                continue
-
-            article_id = title_to_id_map[title]
-            html_path = html_dir / f"{title}.html"
-            txt_path  = plain_dir / fname
-
-            paras = extract_html_paragraphs(html_path)
-            if not paras and txt_path.is_file():
-                paras = split_plaintext(txt_path)
-
-            if not paras:
-                # write an empty paragraph row to preserve the article_id presence
-                writer.writerow({"article_id": article_id, "paragraph_id": 0, "paragraph_text": ""})
-            else:
-                for p_id, para in enumerate(paras, 1):
-                    writer.writerow({"article_id": article_id, "paragraph_id": p_id, "paragraph_text": para})
-                total_paras += len(paras)
+            total_paras += write_article_paragraphs(writer, fname, title_to_id_map)
 
             if idx % 100 == 0:
-                print(f"[info] {idx}/{len(files)} processed (last: {title})", flush=True)
+                print(f"[info] {idx}/{len(files)} processed (last: {Path(fname).stem})", flush=True)
 
     print(f"\n[done] wrote {total_paras} paragraphs to: {output_csv}", flush=True)
 
+def write_article_paragraphs(writer, fname, title_to_id_map):
+    """Extract one article's paragraphs and write its rows; returns the number of paragraphs."""
+    title = Path(fname).stem
+    if title not in title_to_id_map:
+        print(f"[warn] No article_id found in spans CSVs for title '{title}'. Skipping.", flush=True)
+        return 0
+
+    article_id = title_to_id_map[title]
+    html_path = html_dir / f"{title}.html"
+    txt_path  = plain_dir / fname
+
+    paras = extract_html_paragraphs(html_path)
+    if not paras and txt_path.is_file():
+        paras = split_plaintext(txt_path)
+
+    if not paras:
+        # write an empty paragraph row to preserve the article_id presence
+        writer.writerow({"article_id": article_id, "paragraph_id": 0, "paragraph_text": ""})
+        return 0
+    for p_id, para in enumerate(paras, 1):
+        writer.writerow({"article_id": article_id, "paragraph_id": p_id, "paragraph_text": para})
+    return len(paras)
+
+# --- Delta: keep rows of untouched articles, re-extract only added/changed ones ---
+def main_delta():
+    print("--- Paragraph Extraction (delta) ---", flush=True)
+    delta = article_delta.load_delta()
+    if delta is None:
+        print(f"[fatal] No pending delta at {article_delta.DELTA_PATH}; run article_delta.py first.", flush=True)
+        sys.exit(1)
+    if not output_csv.exists():
+        print(f"[fatal] {output_csv} not found; a delta needs a previous full run.", flush=True)
+        sys.exit(1)
+    article_delta.print_delta_summary(delta)
+
+    stale_ids = article_delta.stale_article_ids(delta)
+    titles = article_delta.reextract_titles(delta)
+    title_to_id_map = build_title_to_id_map(links_dir)
+    files = [fn for fn in list_plaintext_files(plain_dir) if Path(fn).stem in titles]
+
+    csv.field_size_limit(sys.maxsize)
+    with output_csv.open("r", encoding="utf-8", newline="") as f:
+        kept = [row for row in csv.DictReader(f) if int(row["article_id"]) not in stale_ids]
+
+    tmp_csv = output_csv.with_suffix(".csv.tmp")
+    total_paras = 0
+    with tmp_csv.open("w", encoding="utf-8", newline="") as out:
+        writer = csv.DictWriter(
+            out,
+            fieldnames=["article_id", "paragraph_id", "paragraph_text"],
+            quoting=csv.QUOTE_ALL
+        )
+        writer.writeheader()
+        writer.writerows(kept)
+        for fname in files:
+            total_paras += write_article_paragraphs(writer, fname, title_to_id_map)
+    tmp_csv.replace(output_csv)
+
+    print(f"\n[done] kept {len(kept)} rows, re-extracted {total_paras} paragraphs "
+          f"from {len(files)} articles into: {output_csv}", flush=True)
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # --delta: only re-extract articles listed in article_delta_<fandom>.json (see article_delta.py)
+    if "--delta" in sys.argv:
+        main_delta()
+    else:
+        main()
\ No newline at end of file
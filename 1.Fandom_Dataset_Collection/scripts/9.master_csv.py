@@ -14,7 +14,7 @@ except Exception:
 domain = urlparse(config.BASE_URL).netloc  # e.g. marvel.fandom.com
 fandom_name = domain.split(".")[0]         # e.g. "marvel"
 
-BASE_DIR = Path("/home/sundeep/Fandom-Span-Identification-and-Retrieval/1.Fandom_Dataset_Collection/raw_data")
+BASE_DIR = config.BASE_DIR
 FANDOM_DATA_DIR = BASE_DIR / f"{fandom_name}_fandom_data"
 
 PARAGRAPHS_CSV = FANDOM_DATA_DIR / f"paragraphs_{fandom_name}.csv"
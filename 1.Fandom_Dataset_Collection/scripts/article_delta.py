@@ -0,0 +1,153 @@
+# article_delta.py
+"""
+Track which articles were added / changed / deleted between two crawls so the
+downstream steps can redo only those articles.
+
+    python article_delta.py            # compare current crawl with the manifest, write the delta file
+    python article_delta.py --commit   # accept the pending delta as the new manifest
+
+The manifest (article_manifest_<fandom>.json) describes the crawl that the saved
+embeddings / FAISS index were built from: {title: {"version": ..., "article_id": ...}}.
+The version is the page's wgRevisionId ("rev:<id>"), or a sha1 of the article body
+text ("body:<sha1>") for pages without one. The raw HTML file is not hashed: it carries
+per-request values (wgRequestId, timings, ad/cache tokens) that differ on every fetch.
+The delta (article_delta_<fandom>.json) is written after the HTML fetch and is
+committed by 3.FAISS_Index/create_faiss_index.py once the index reflects it.
+"""
+import re
+import sys
+import json
+import time
+import hashlib
+from pathlib import Path
+from urllib.parse import urlparse
+from bs4 import BeautifulSoup
+import config
+
+# ---------- PATH SETUP (consistent with earlier scripts) ----------
+domain = urlparse(config.BASE_URL).netloc          # e.g. "marvel.fandom.com"
+fandom_name = domain.split(".")[0]                 # e.g. "marvel"
+
+BASE_DIR = config.BASE_DIR
+FANDOM_DATA_DIR = BASE_DIR / f"{fandom_name}_fandom_data"
+HTML_DIR = FANDOM_DATA_DIR / f"{fandom_name}_fandom_html"
+MANIFEST_PATH = FANDOM_DATA_DIR / f"article_manifest_{fandom_name}.json"
+DELTA_PATH = FANDOM_DATA_DIR / f"article_delta_{fandom_name}.json"
+# ------------------------------------------------------------------
+
+def read_article_id(html: str):
+    """Same "wgArticleId" lookup as #4.spans_fetcher, without parsing the whole page."""
+    match = re.search(r'"wgArticleId":(\d+)', html)
+    return int(match.group(1)) if match else None
+
+def article_version(html: str) -> str:
+    """"rev:<wgRevisionId>", else "body:<sha1 of the .mw-parser-output text>" (what #8 extracts from)."""
+    match = re.search(r'"wgRevisionId":(\d+)', html)
+    if match:
+        return f"rev:{match.group(1)}"
+    soup = BeautifulSoup(html, "html.parser")
+    container = soup.select_one("#mw-content-text .mw-parser-output") or soup
+    body = " ".join(container.get_text(" ", strip=True).split())
+    return "body:" + hashlib.sha1(body.encode("utf-8")).hexdigest()
+
+def crawl_titles(links_file: str) -> list[str]:
+    """Titles (= HTML file stems written by #2.html_fetcher) of the articles in the current links list."""
+    titles = []
+    with open(links_file, encoding="utf-8") as f:
+        for line in f:
+            url = line.strip()
+            if url:
+                titles.append(url.split("/")[-1])
+    return sorted(set(titles))
+
+def build_manifest(titles: list[str], html_dir: Path = HTML_DIR) -> dict:
+    manifest = {}
+    for title in titles:
+        html_path = html_dir / f"{title}.html"
+        if not html_path.is_file():
+            continue  # fetch failed/skipped this round → treated as deleted below
+        html = html_path.read_text(encoding="utf-8", errors="ignore")
+        manifest[title] = {"version": article_version(html), "article_id": read_article_id(html)}
+    return manifest
+
+def load_manifest(path: Path = MANIFEST_PATH) -> dict:
+    if not path.exists():
+        return {}
+    with path.open("r", encoding="utf-8") as f:
+        return json.load(f)
+
+def compute_delta(old: dict, new: dict) -> dict:
+    added, changed, deleted = [], [], []
+    for title, entry in new.items():
+        prev = old.get(title)
+        if prev is None:
+            added.append({"title": title, "article_id": entry["article_id"]})
+        elif prev.get("version") != entry["version"]:    # manifests from before "version" → changed once
+            changed.append({"title": title, "article_id": entry["article_id"], "old_article_id": prev["article_id"]})
+    for title, prev in old.items():
+        if title not in new:
+            deleted.append({"title": title, "old_article_id": prev["article_id"]})
+    return {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "added": added,
+        "changed": changed,
+        "deleted": deleted,
+        "manifest": new,
+    }
+
+def load_delta(path: Path = DELTA_PATH) -> dict | None:
+    if not path.exists():
+        return None
+    with path.open("r", encoding="utf-8") as f:
+        return json.load(f)
+
+def reextract_titles(delta: dict) -> set[str]:
+    """Articles whose spans/paragraphs must be rebuilt."""
+    return {e["title"] for e in delta["added"] + delta["changed"]}
+
+def new_article_ids(delta: dict) -> set[int]:
+    """Article ids whose paragraphs must be (re-)embedded and (re-)indexed."""
+    return {e["article_id"] for e in delta["added"] + delta["changed"] if e["article_id"] is not None}
+
+def stale_article_ids(delta: dict) -> set[int]:
+    """Article ids whose existing rows/vectors must be dropped before the new ones go in."""
+    ids = {e["old_article_id"] for e in delta["changed"] + delta["deleted"]}
+    ids |= new_article_ids(delta)
+    return {i for i in ids if i is not None}
+
+def deleted_titles(delta: dict) -> set[str]:
+    return {e["title"] for e in delta["deleted"]}
+
+def print_delta_summary(delta: dict):
+    print(f"🧾 Delta: +{len(delta['added'])} added, ~{len(delta['changed'])} changed, "
+          f"-{len(delta['deleted'])} deleted (of {len(delta['manifest'])} articles)")
+
+def commit_delta(delta_path: Path = DELTA_PATH, manifest_path: Path = MANIFEST_PATH) -> bool:
+    delta = load_delta(delta_path)
+    if delta is None:
+        return False
+    tmp = manifest_path.with_suffix(".json.tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(delta["manifest"], f)
+    tmp.replace(manifest_path)
+    delta_path.unlink()
+    print(f"📌 Manifest updated: {manifest_path} ({len(delta['manifest'])} articles)")
+    return True
+
+def main():
+    if "--commit" in sys.argv:
+        if not commit_delta():
+            print(f"⚠️ No pending delta at {DELTA_PATH}")
+        return
+
+    titles = crawl_titles(config.LINKS_FILE)
+    old = load_manifest()
+    new = build_manifest(titles)
+    delta = compute_delta(old, new)
+    with DELTA_PATH.open("w", encoding="utf-8") as f:
+        json.dump(delta, f)
+    print_delta_summary(delta)
+    print(f"💾 Delta written: {DELTA_PATH}")
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,33 @@
 # config.py
+import os
 from pathlib import Path
 
 # Your fandom URLs
-START_URL = "https://alldimensions.fandom.com/wiki/Special:AllPages?namespace=0&hideredirects=1"
-BASE_URL  = "https://alldimensions.fandom.com/wiki/All_dimensions_Wiki"
-
-# Root raw_data folder
-BASE_DIR = Path("/home/sundeep/Fandom-Span-Identification-and-Retrieval/1.Fandom_Dataset_Collection/raw_data")
+# (0.run_all.py passes these explicitly per fandom via FANDOM_BASE_URL / FANDOM_START_URL)
+BASE_URL  = os.environ.get("FANDOM_BASE_URL", "https://alldimensions.fandom.com/wiki/All_dimensions_Wiki")
 
 # Derive fandom name from BASE_URL
 domain = BASE_URL.split("//")[-1].split("/")[0]   # alldimensions.fandom.com
 fandom_name = domain.split(".")[0]                # alldimensions
 
+START_URL = os.environ.get(
+    "FANDOM_START_URL",
+    f"https://{domain}/wiki/Special:AllPages?namespace=0&hideredirects=1",
+)
+
+# Root raw_data folder
+BASE_DIR = Path(os.environ.get(
+    "FANDOM_BASE_DIR",
+    "/home/sundeep/Fandom-Span-Identification-and-Retrieval/1.Fandom_Dataset_Collection/raw_data",
+))
+
 # Fandom-specific data directory
 FANDOM_DATA_DIR = BASE_DIR / f"{fandom_name}_fandom_data"
 FANDOM_DATA_DIR.mkdir(parents=True, exist_ok=True)
 
 # Links file path (script #1 will write here, run_all.py will check here)
-LINKS_FILE = r"/home/sundeep/Fandom-Span-Identification-and-Retrieval/1.Fandom_Dataset_Collection/raw_data/alldimensions_fandom_data/alldimensions_articles_list.txt"
\ No newline at end of file
+LINKS_FILE = os.environ.get("FANDOM_LINKS_FILE", str(FANDOM_DATA_DIR / f"{fandom_name}_articles_list.txt"))
+
+# Model inference for embedding / retrieval / re-ranking: "torch", "onnx" or "onnx-int8"
+# (2.Embeddings/inference_backend.py)
+INFERENCE_BACKEND = os.environ.get("FANDOM_INFERENCE_BACKEND", "torch")
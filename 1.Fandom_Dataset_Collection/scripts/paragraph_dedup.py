@@ -0,0 +1,203 @@
+# paragraph_dedup.py
+"""
+Cluster near-duplicate paragraphs (stub notices, infobox leftovers, repeated
+episode intros, ...) with MinHash + LSH so only one representative per cluster
+is embedded and indexed.
+
+    python paragraph_dedup.py    # reads paragraphs_<fandom>.csv (from #8) and master_csv_<fandom>.csv (#9)
+
+Writes paragraph_clusters_<fandom>.csv with one row per member of every
+cluster of size > 1:
+    article_id, paragraph_id, rep_article_id, rep_paragraph_id, cluster_size
+Paragraphs not listed are their own representative. Only master CSV rows are
+embedded, so the representative is the smallest (article_id, paragraph_id) of its
+cluster that is in the master CSV (the smallest overall if no member is).
+"""
+import re
+import sys
+import csv
+import zlib
+import numpy as np
+from pathlib import Path
+from urllib.parse import urlparse
+import config
+
+# ---------- PATH SETUP (consistent with earlier scripts) ----------
+domain = urlparse(config.BASE_URL).netloc          # e.g. "marvel.fandom.com"
+fandom_name = domain.split(".")[0]                 # e.g. "marvel"
+
+BASE_DIR = config.BASE_DIR
+FANDOM_DATA_DIR = BASE_DIR / f"{fandom_name}_fandom_data"
+PARAGRAPHS_CSV = FANDOM_DATA_DIR / f"paragraphs_{fandom_name}.csv"
+CLUSTERS_CSV = FANDOM_DATA_DIR / f"paragraph_clusters_{fandom_name}.csv"
+MASTER_CSV = FANDOM_DATA_DIR / f"master_csv_{fandom_name}.csv"
+# ------------------------------------------------------------------
+
+# ---------- MinHash / LSH params ----------
+SHINGLE_WORDS = 3          # word n-gram size
+NUM_PERM = 128             # MinHash signature length
+BANDS, ROWS = 16, 8        # BANDS * ROWS == NUM_PERM; LSH threshold ≈ (1/BANDS)^(1/ROWS) ≈ 0.71
+THRESHOLD = 0.8            # min estimated Jaccard to merge two paragraphs
+SEED = 1
+# ------------------------------------------
+
+_MERSENNE = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_rng = np.random.RandomState(SEED)
+_A = _rng.randint(1, (1 << 32) - 1, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.randint(0, (1 << 32) - 1, size=NUM_PERM, dtype=np.uint64)
+
+def shingles(text: str) -> set[str]:
+    words = re.sub(r"[^\w\s]", " ", text.lower()).split()
+    if len(words) < SHINGLE_WORDS:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+def minhash(text: str) -> np.ndarray | None:
+    sh = shingles(text)
+    if not sh:
+        return None
+    hv = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in sh), dtype=np.uint64, count=len(sh))
+    phv = np.bitwise_and((hv[:, None] * _A + _B) % _MERSENNE, _MAX_HASH)
+    return phv.min(axis=0).astype(np.uint32)
+
+class _UnionFind:
+    def __init__(self, n: int):
+        self.parent = np.arange(n)
+
+    def find(self, i: int) -> int:
+        root = i
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[i] != root:
+            self.parent[i], i = root, self.parent[i]
+        return root
+
+    def union(self, i: int, j: int):
+        ri, rj = self.find(i), self.find(j)
+        if ri != rj:
+            self.parent[max(ri, rj)] = min(ri, rj)
+
+def cluster_signatures(sigs: np.ndarray) -> _UnionFind:
+    """
+    Band-by-band LSH. Within a bucket every member is checked against the bucket's first
+    member only, so a template repeated 10k times costs 10k comparisons, not 10k².
+    """
+    uf = _UnionFind(len(sigs))
+    for b in range(BANDS):
+        buckets: dict[bytes, int] = {}
+        band = np.ascontiguousarray(sigs[:, b * ROWS:(b + 1) * ROWS])
+        for i in range(len(sigs)):
+            key = band[i].tobytes()
+            first = buckets.setdefault(key, i)
+            if first == i or uf.find(first) == uf.find(i):
+                continue
+            if np.mean(sigs[first] == sigs[i]) >= THRESHOLD:
+                uf.union(first, i)
+    return uf
+
+def load_paragraphs(path: Path):
+    csv.field_size_limit(sys.maxsize)
+    keys, texts = [], []
+    with path.open("r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            text = (row.get("paragraph_text") or "").strip()
+            if not text:
+                continue
+            keys.append((int(row["article_id"]), int(row["paragraph_id"])))
+            texts.append(text)
+    return keys, texts
+
+def load_master_keys(path: Path = MASTER_CSV) -> set | None:
+    """(article_id, paragraph_id) of every master CSV row, i.e. the paragraphs that get embedded; None if absent."""
+    if not path.exists():
+        return None
+    csv.field_size_limit(sys.maxsize)
+    with path.open("r", encoding="utf-8", newline="") as f:
+        return {(int(row["article_id"]), int(row["paragraph_id"])) for row in csv.DictReader(f)}
+
+def pick_representative(members: list[int], keys: list, embedded: set | None) -> int:
+    """members are sorted by key → first embedded member, else the first one."""
+    if embedded:
+        for m in members:
+            if keys[m] in embedded:
+                return m
+    return members[0]
+
+def load_clusters(path: Path = CLUSTERS_CSV) -> dict:
+    """{(article_id, paragraph_id): (rep_article_id, rep_paragraph_id)} for clustered paragraphs; {} if absent."""
+    if not path.exists():
+        return {}
+    member_to_rep = {}
+    with path.open("r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            member_to_rep[(int(row["article_id"]), int(row["paragraph_id"]))] = (
+                int(row["rep_article_id"]), int(row["rep_paragraph_id"]))
+    return member_to_rep
+
+def members_by_rep(member_to_rep: dict) -> dict:
+    """{rep_key: [rep_key, other member keys...]} — used to attribute a representative's hit to every copy."""
+    groups: dict[tuple, list] = {}
+    for member, rep in sorted(member_to_rep.items()):
+        groups.setdefault(rep, [rep])
+        if member != rep:
+            groups[rep].append(member)
+    return groups
+
+def main():
+    if not PARAGRAPHS_CSV.exists():
+        print(f"❌ Paragraphs CSV not found: {PARAGRAPHS_CSV} (run #8 first)")
+        sys.exit(1)
+
+    print(f"📥 Loading paragraphs: {PARAGRAPHS_CSV}")
+    keys, texts = load_paragraphs(PARAGRAPHS_CSV)
+    order = sorted(range(len(keys)), key=keys.__getitem__)   # smallest key first → rep candidates in order
+    keys = [keys[i] for i in order]
+    texts = [texts[i] for i in order]
+
+    print(f"🧮 MinHash signatures for {len(keys)} paragraphs (num_perm={NUM_PERM})...")
+    sigs = np.zeros((len(keys), NUM_PERM), dtype=np.uint32)
+    valid = np.ones(len(keys), dtype=bool)
+    for i, text in enumerate(texts):
+        sig = minhash(text)
+        if sig is None:
+            valid[i] = False
+            continue
+        sigs[i] = sig
+        if (i + 1) % 100_000 == 0:
+            print(f"[info] {i + 1}/{len(keys)} signatures", flush=True)
+
+    idx = np.flatnonzero(valid)
+    print(f"🔗 LSH clustering (bands={BANDS}, rows={ROWS}, threshold={THRESHOLD})...")
+    uf = cluster_signatures(sigs[idx])
+
+    clusters: dict[int, list[int]] = {}
+    for local, global_i in enumerate(idx):
+        clusters.setdefault(uf.find(local), []).append(global_i)
+    dup_clusters = [members for members in clusters.values() if len(members) > 1]
+
+    embedded = load_master_keys()
+    if embedded is None:
+        print(f"⚠️ Master CSV not found: {MASTER_CSV} (run #9 first); representatives are picked over all paragraphs")
+
+    n_members, n_unembedded = 0, 0
+    with CLUSTERS_CSV.open("w", encoding="utf-8", newline="") as out:
+        writer = csv.writer(out)
+        writer.writerow(["article_id", "paragraph_id", "rep_article_id", "rep_paragraph_id", "cluster_size"])
+        for members in dup_clusters:
+            rep = keys[pick_representative(members, keys, embedded)]
+            if embedded is not None and rep not in embedded:
+                n_unembedded += 1
+            for m in members:
+                writer.writerow([*keys[m], *rep, len(members)])
+            n_members += len(members)
+
+    saved = n_members - len(dup_clusters)
+    print(f"✅ {len(dup_clusters)} near-duplicate clusters covering {n_members} paragraphs "
+          f"→ {saved} paragraphs ({100 * saved / max(1, len(keys)):.1f}%) need no embedding")
+    if embedded is not None:
+        print(f"🧬 {n_unembedded} clusters have no member in the master CSV (not embedded either way)")
+    print(f"💾 Clusters saved: {CLUSTERS_CSV}")
+
+if __name__ == "__main__":
+    main()
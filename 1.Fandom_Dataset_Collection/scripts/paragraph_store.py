@@ -0,0 +1,169 @@
+# paragraph_store.py
+"""
+Memory-mapped paragraph text store, built from paragraphs_<fandom>.csv (from #8).
+
+    python paragraph_store.py
+
+Writes two files next to the CSV:
+    paragraph_text_<fandom>.bin       all paragraph texts, UTF-8, back to back
+    paragraph_text_<fandom>.idx.npy   int64 (n, 3): packed (article_id, paragraph_id) key,
+                                      byte offset, byte length — sorted by key
+
+ParagraphStore opens both with mmap, so a lookup is a binary search over the keys plus one
+slice of the blob. Nothing is loaded up front, and processes reading the same store share
+the page cache. A key that appears twice in the CSV keeps its first text.
+"""
+import os
+import csv
+import mmap
+import sys
+import numpy as np
+from pathlib import Path
+from urllib.parse import urlparse
+import config
+
+# ---------- PATH SETUP (consistent with earlier scripts) ----------
+domain = urlparse(config.BASE_URL).netloc          # e.g. "marvel.fandom.com"
+fandom_name = domain.split(".")[0]                 # e.g. "marvel"
+
+BASE_DIR = config.BASE_DIR
+FANDOM_DATA_DIR = BASE_DIR / f"{fandom_name}_fandom_data"
+PARAGRAPHS_CSV = FANDOM_DATA_DIR / f"paragraphs_{fandom_name}.csv"
+STORE_PATH = FANDOM_DATA_DIR / f"paragraph_text_{fandom_name}.bin"
+# ------------------------------------------------------------------
+
+PARAGRAPH_BITS = 32          # same packing as the embedding store / FAISS ids
+
+def index_path(store_path: Path) -> Path:
+    return Path(store_path).with_suffix(".idx.npy")
+
+def pack_key(article_id, paragraph_id):
+    return (np.asarray(article_id, dtype="int64") << PARAGRAPH_BITS) | np.asarray(paragraph_id, dtype="int64")
+
+def build_store(paragraphs_csv: Path = PARAGRAPHS_CSV, store_path: Path = STORE_PATH) -> int:
+    """Stream the CSV into the blob, then write the key-sorted offset index. Returns the paragraph count."""
+    csv.field_size_limit(sys.maxsize)
+    keys, offsets, lengths = [], [], []
+    tmp_blob = Path(f"{store_path}.tmp")
+    offset = 0
+    with open(paragraphs_csv, "r", encoding="utf-8", newline="") as f, open(tmp_blob, "wb") as out:
+        for row in csv.DictReader(f):
+            try:
+                key = (int(row["article_id"]) << PARAGRAPH_BITS) | int(row["paragraph_id"])
+            except (TypeError, ValueError):
+                continue
+            data = (row.get("paragraph_text") or "").encode("utf-8")
+            out.write(data)
+            keys.append(key)
+            offsets.append(offset)
+            lengths.append(len(data))
+            offset += len(data)
+
+    index = np.stack([np.asarray(keys, dtype="int64"), np.asarray(offsets, dtype="int64"),
+                      np.asarray(lengths, dtype="int64")], axis=1) if keys else np.zeros((0, 3), dtype="int64")
+    index = index[np.argsort(index[:, 0], kind="stable")]
+    first = np.ones(len(index), dtype=bool)
+    first[1:] = index[1:, 0] != index[:-1, 0]          # stable sort → first CSV row of each key
+    index = index[first]
+
+    tmp_index = Path(f"{index_path(store_path)}.tmp.npy")
+    np.save(tmp_index, index)
+    os.replace(tmp_blob, store_path)
+    os.replace(tmp_index, index_path(store_path))
+    return len(index)
+
+class ParagraphStore:
+    """
+    Read-only (article_id, paragraph_id) → text lookups over the mmapped blob and index.
+    Supports store.get((article_id, paragraph_id)), store[key], `key in store` and len(store),
+    so it can stand in for a {(article_id, paragraph_id): text} dict.
+    """
+    def __init__(self, store_path: Path = STORE_PATH):
+        self.path = Path(store_path)
+        self.index = np.load(index_path(self.path), mmap_mode="r")
+        self.keys = self.index[:, 0]
+        self._file = open(self.path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self.blob = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _row(self, key) -> int:
+        article_id, paragraph_id = key
+        packed = int(pack_key(article_id, paragraph_id))
+        i = int(np.searchsorted(self.keys, packed))
+        return i if i < len(self.keys) and self.keys[i] == packed else -1
+
+    def get(self, key, default=None):
+        i = self._row(key)
+        if i < 0:
+            return default
+        _, offset, length = self.index[i]
+        return self.blob[offset:offset + length].decode("utf-8")
+
+    def get_many(self, article_ids, paragraph_ids, default=None) -> list:
+        """Texts for many keys at once (one vectorized search over the index)."""
+        packed = np.atleast_1d(pack_key(article_ids, paragraph_ids))
+        if not len(self.keys):
+            return [default] * len(packed)
+        at = np.clip(np.searchsorted(self.keys, packed), 0, len(self.keys) - 1)
+        found = self.keys[at] == packed
+        return [self.blob[o:o + n].decode("utf-8") if ok else default
+                for ok, (_, o, n) in zip(found.tolist(), self.index[at].tolist())]
+
+    def __getitem__(self, key):
+        text = self.get(key)
+        if text is None:
+            raise KeyError(key)
+        return text
+
+    def __contains__(self, key):
+        return self._row(key) >= 0
+
+    def close(self):
+        if isinstance(self.blob, mmap.mmap):
+            self.blob.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+def texts_from_csv(csv_path: Path) -> dict:
+    """{(article_id, paragraph_id): paragraph_text} from a CSV with those columns (e.g. the master CSV);
+    the first row wins for repeated keys. Fallback for trees without a built store."""
+    import pandas as pd
+    df = pd.read_csv(csv_path, usecols=["article_id", "paragraph_id", "paragraph_text"])
+    lookup = {}
+    keys = zip(df['article_id'].tolist(), df['paragraph_id'].tolist())
+    for key, text in zip(keys, df['paragraph_text'].tolist()):
+        lookup.setdefault(key, text)
+    return lookup
+
+def open_texts(store_path: Path = STORE_PATH, fallback_csv: Path = None):
+    """The mmap store when it has been built, else a dict from fallback_csv (None if neither exists)."""
+    if index_path(store_path).exists():
+        return ParagraphStore(store_path)
+    if fallback_csv is not None and Path(fallback_csv).exists():
+        return texts_from_csv(fallback_csv)
+    return None
+
+def lookup_texts(texts, article_ids, paragraph_ids, default=None) -> list:
+    """Texts for parallel id arrays from a ParagraphStore or a {(article_id, paragraph_id): text} dict."""
+    if isinstance(texts, ParagraphStore):
+        return texts.get_many(article_ids, paragraph_ids, default)
+    return [texts.get(key, default) for key in zip(np.asarray(article_ids).tolist(), np.asarray(paragraph_ids).tolist())]
+
+def main():
+    if not PARAGRAPHS_CSV.exists():
+        print(f"❌ Missing input: {PARAGRAPHS_CSV} (run 8.paragraph_text_extractor.py first)")
+        return
+    n = build_store()
+    print(f"✅ Paragraph text store: {n} paragraphs → {STORE_PATH} (+ {index_path(STORE_PATH).name})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Parity and throughput of the inference backends (inference_backend.py) against eager PyTorch,
+for the bi-encoder and the cross-encoder, on paragraphs from the master CSV.
+
+    python benchmark_backends.py [n_paragraphs] [backend ...]
+
+Bi-encoder parity is max |Δ| and the lowest cosine to the torch vectors; cross-encoder parity
+is max |Δ| of the scores and their Pearson r. The first ONNX run includes the one-off export,
+which is not timed.
+"""
+import sys
+import time
+import itertools
+import numpy as np
+
+import create_embeddings
+from create_embeddings import CSV_FILE, MODEL_NAME, iter_paragraphs, encode_texts
+from inference_backend import BACKENDS, load_encoder, load_cross_encoder
+
+CROSS_ENCODER_NAME = "cross-encoder/ms-marco-MiniLM-L-6-v2"   # same as 6.Re-Rank/rerank.py
+CE_BATCH_SIZE = 32
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - t0
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) >= 2 else 2000
+    backends = sys.argv[2:] or list(BACKENDS)
+    if "torch" not in backends:
+        backends = ["torch"] + backends   # reference for parity
+
+    texts = [t for _, t in itertools.islice(iter_paragraphs(CSV_FILE), n)]
+    # query-like prefix of one paragraph paired with another paragraph
+    pairs = [[" ".join(texts[i].split()[:8]), texts[(i * 7 + 3) % len(texts)]] for i in range(len(texts))]
+    print(f"📄 {len(texts)} paragraphs from {CSV_FILE} "
+          f"(length bucketing {'on' if create_embeddings.LENGTH_BUCKETING else 'off'})")
+
+    print(f"\n{MODEL_NAME}")
+    print(f"{'backend':<12}{'seconds':>10}{'para/s':>10}{'speedup':>9}{'max |Δ|':>11}{'min cos':>10}")
+    reference, t_ref = None, None
+    for backend in backends:
+        model = load_encoder(MODEL_NAME, backend)
+        encode_texts(model, texts[:64])   # warm-up
+        vecs, t = timed(encode_texts, model, texts)
+        if reference is None:
+            reference, t_ref = vecs, t
+        cos = np.sum(vecs * reference, axis=1) / (np.linalg.norm(vecs, axis=1) * np.linalg.norm(reference, axis=1))
+        print(f"{backend:<12}{t:>10.2f}{len(texts) / t:>10.1f}{t_ref / t:>9.2f}"
+              f"{float(np.abs(vecs - reference).max()):>11.2e}{float(cos.min()):>10.5f}")
+
+    print(f"\n{CROSS_ENCODER_NAME}")
+    print(f"{'backend':<12}{'seconds':>10}{'pairs/s':>10}{'speedup':>9}{'max |Δ|':>11}{'pearson':>10}")
+    reference, t_ref = None, None
+    for backend in backends:
+        ce = load_cross_encoder(CROSS_ENCODER_NAME, backend)
+        ce.predict(pairs[:CE_BATCH_SIZE], batch_size=CE_BATCH_SIZE)   # warm-up
+        scores, t = timed(lambda p: np.asarray(ce.predict(p, batch_size=CE_BATCH_SIZE), dtype="float32"), pairs)
+        if reference is None:
+            reference, t_ref = scores, t
+        r = np.corrcoef(scores, reference)[0, 1] if len(scores) > 1 else 1.0
+        print(f"{backend:<12}{t:>10.2f}{len(pairs) / t:>10.1f}{t_ref / t:>9.2f}"
+              f"{float(np.abs(scores - reference).max()):>11.2e}{r:>10.5f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Paragraphs/sec of fixed 64-item batching (CSV order) vs. length-bucketed token-budget batching.
+
+    python benchmark_batching.py [n_paragraphs] [token_budget ...]
+"""
+import sys
+import time
+import itertools
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+import create_embeddings
+from create_embeddings import CSV_FILE, MODEL_NAME, BATCH_SIZE, iter_paragraphs
+from length_batching import encode_length_bucketed, token_lengths
+
+def fixed_batches(model, texts):
+    out = []
+    for start in range(0, len(texts), BATCH_SIZE):
+        out.append(np.asarray(model.encode(texts[start:start + BATCH_SIZE], convert_to_tensor=False,
+                                           show_progress_bar=False), dtype="float32"))
+    return np.concatenate(out)
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - t0
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) >= 2 else 5000
+    budgets = [int(b) for b in sys.argv[2:]] or [create_embeddings.TOKEN_BUDGET]
+
+    texts = [t for _, t in itertools.islice(iter_paragraphs(CSV_FILE), n)]
+    model = SentenceTransformer(MODEL_NAME)
+    lengths = token_lengths(model, texts)
+    print(f"📄 {len(texts)} paragraphs from {CSV_FILE}")
+    print(f"🔡 tokens/paragraph: mean={lengths.mean():.0f}, p50={np.median(lengths):.0f}, "
+          f"p95={np.percentile(lengths, 95):.0f}, max={lengths.max()} (max_seq_length={model.max_seq_length})")
+
+    model.encode(texts[:BATCH_SIZE], show_progress_bar=False)   # warm-up
+
+    baseline, t_fixed = timed(fixed_batches, model, texts)
+    print(f"\n{'mode':<28}{'seconds':>10}{'para/s':>10}{'speedup':>9}{'max |Δ|':>11}")
+    print(f"{f'fixed batch={BATCH_SIZE}':<28}{t_fixed:>10.2f}{len(texts) / t_fixed:>10.1f}{1.0:>9.2f}{0.0:>11.2e}")
+    for budget in budgets:
+        vecs, t = timed(encode_length_bucketed, model, texts, budget)
+        diff = float(np.abs(vecs - baseline).max())
+        print(f"{f'bucketed budget={budget}':<28}{t:>10.2f}{len(texts) / t:>10.1f}{t_fixed / t:>9.2f}{diff:>11.2e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Recall@k of the existing query set against float32 vs. float16 vs. int8 (per-dimension scale)
+copies of the embedding store, plus how much of the float32 top-k each format keeps.
+
+    python compare_storage.py [n_queries] [k ...]
+
+The float32 store written by create_embeddings.py is the reference; the reduced formats are
+quantized in memory with the same functions EmbeddingWriter uses, so no extra files are written.
+"""
+import sys
+import time
+import faiss
+import numpy as np
+import pandas as pd
+from sentence_transformers import SentenceTransformer
+
+from create_embeddings import CSV_FILE, MODEL_NAME, OUTPUT_DIR, get_output_filename
+import config   # CONFIG_DIR is on sys.path once create_embeddings is imported
+from embedding_store import (STORAGE_DTYPES, PARAGRAPH_BITS, load_embeddings, int8_scale,
+                             quantize_int8, dequantize)
+
+QUERIES_CSV = config.BASE_DIR.parents[1] / "4.Query" / f"queries_{config.fandom_name}_{MODEL_NAME.split('/')[-1]}.csv"
+
+def stored_copy(matrix: np.ndarray, dtype: str):
+    """(float32 matrix as a reader would see it after load, bytes on disk) for one storage dtype."""
+    if dtype == "float32":
+        return matrix, matrix.nbytes
+    if dtype == "float16":
+        stored = matrix.astype("float16")
+        return dequantize(stored), stored.nbytes
+    scale = int8_scale(np.abs(matrix).max(axis=0))
+    stored = quantize_int8(matrix, scale)
+    return dequantize(stored, scale), stored.nbytes + scale.nbytes
+
+def search(matrix: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    index = faiss.IndexFlatIP(matrix.shape[1])
+    index.add(np.ascontiguousarray(matrix))
+    _, rows = index.search(queries, k)
+    return rows
+
+def main():
+    n_queries = int(sys.argv[1]) if len(sys.argv) >= 2 else 0
+    ks = sorted(int(k) for k in sys.argv[2:]) or [1, 10, 100]
+
+    ids, matrix, meta = load_embeddings(get_output_filename(CSV_FILE, MODEL_NAME, OUTPUT_DIR), mmap=False)
+    if meta["dtype"] != "float32":
+        print(f"⚠️ Store is {meta['dtype']}; comparing against its dequantized values, not true float32.")
+    article_of_row = ids >> PARAGRAPH_BITS
+
+    queries_df = pd.read_csv(QUERIES_CSV)
+    if n_queries:
+        queries_df = queries_df.head(n_queries)
+    model = SentenceTransformer(MODEL_NAME)
+    queries = np.asarray(model.encode(queries_df["query"].astype(str).tolist(), convert_to_tensor=False,
+                                      show_progress_bar=False), dtype="float32")
+    faiss.normalize_L2(queries)
+    correct = queries_df["correct_article_id"].to_numpy(dtype="int64")
+    print(f"📄 {len(ids)} paragraphs (dim={meta['dim']}), {len(queries)} queries from {QUERIES_CSV}")
+
+    k_max = max(ks)
+    reference = None
+    header = f"{'storage':<10}{'MB':>9}{'search s':>10}" + "".join(f"{f'R@{k}':>9}" for k in ks) + \
+        "".join(f"{f'overlap@{k}':>12}" for k in ks)
+    print(header)
+    for dtype in STORAGE_DTYPES:
+        restored, nbytes = stored_copy(matrix, dtype)
+        t0 = time.perf_counter()
+        rows = search(restored, queries, k_max)
+        elapsed = time.perf_counter() - t0
+        if reference is None:
+            reference = rows
+
+        hit = article_of_row[rows] == correct[:, None]
+        recalls = [hit[:, :k].any(axis=1).mean() for k in ks]
+        overlaps = [np.mean([len(np.intersect1d(a[:k], b[:k])) / k for a, b in zip(rows, reference)]) for k in ks]
+        print(f"{dtype:<10}{nbytes / 2**20:>9.1f}{elapsed:>10.2f}"
+              + "".join(f"{r:>9.4f}" for r in recalls) + "".join(f"{o:>12.4f}" for o in overlaps))
+
+if __name__ == "__main__":
+    main()
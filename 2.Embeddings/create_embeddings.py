@@ -1,14 +1,34 @@
 import csv
-import pickle
+import argparse
 import numpy as np
 import os
-from sentence_transformers import SentenceTransformer
+import sys
+from pathlib import Path
+
+CONFIG_DIR = Path("/home/sundeep/Fandom-Span-Identification-and-Retrieval/1.Fandom_Dataset_Collection/scripts")
+sys.path.append(str(CONFIG_DIR))
+import config
+import article_delta
+import paragraph_dedup
+from embedding_store import (EmbeddingWriter, STORAGE_DTYPES, load_meta, keys_path, iter_embedding_chunks,
+                             pack_paragraph_ids, unpack_paragraph_ids)
+from embedding_cache import EmbeddingCache
+from length_batching import encode_length_bucketed
+from inference_backend import BACKENDS, load_encoder, model_key
 
 # ===== Config =====
-CSV_FILE = "/home/sundeep/Fandom-Span-Identification-and-Retrieval/1.Fandom_Dataset_Collection/raw_data/alldimensions_fandom_data/master_csv_alldimensions.csv"
-OUTPUT_DIR = "/home/sundeep/Fandom-Span-Identification-and-Retrieval/2.Embeddings"
+CSV_FILE = str(config.FANDOM_DATA_DIR / f"master_csv_{config.fandom_name}.csv")
+OUTPUT_DIR = str(config.BASE_DIR.parents[1] / "2.Embeddings")
 MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
-BATCH_SIZE = 64
+BATCH_SIZE = 64                 # --fixed-batching: paragraphs per model.encode call, in CSV order
+LENGTH_BUCKETING = True         # default: sort by token length, batch by TOKEN_BUDGET (length_batching.py)
+TOKEN_BUDGET = 16384
+BUCKET_WINDOW = 8192            # paragraphs read ahead and bucketed together (= peak vectors in RAM)
+# Persistent (model, sha1(text_to_embed)) → vector cache; pass --no-cache to bypass it
+CACHE_PATH = os.path.join(OUTPUT_DIR, "embedding_cache.sqlite")
+CACHE_MAX_ENTRIES = 5_000_000
+INFERENCE_BACKEND = config.INFERENCE_BACKEND   # --backend torch / onnx / onnx-int8 (inference_backend.py)
+STORAGE_DTYPE = "float32"       # --storage float16 / int8 halves / quarters the store (embedding_store.py)
 
 def get_output_filename(csv_file, model_name, output_dir):
     # Extract folder name containing the CSV
@@ -17,27 +37,17 @@ def get_output_filename(csv_file, model_name, output_dir):
     fandom_name = folder_name.replace("_fandom_data", "")
     # Use only short model name (after last "/")
     model_short = model_name.split("/")[-1]
-    # Build full path
-    return os.path.join(output_dir, f"embeddings_{fandom_name}_{model_short}.pkl")
-
-def create_paragraph_embeddings(model, csv_file, output_embeddings_pkl):
-    embeddings_dict = {}
-    batch_keys, batch_texts = [], []
-
-    def flush():
-        nonlocal batch_keys, batch_texts
-        if not batch_texts:
-            return
-        vecs = model.encode(batch_texts, convert_to_tensor=False, show_progress_bar=False)
-        for k, v in zip(batch_keys, vecs):
-            embeddings_dict[k] = np.asarray(v, dtype="float32")
-        batch_keys, batch_texts = [], []
+    # Build full path (matrix; keys/meta sit next to it, see embedding_store.py)
+    return os.path.join(output_dir, f"embeddings_{fandom_name}_{model_short}.npy")
 
+def iter_paragraphs(csv_file, keep=None):
+    """Yield ((article_id, paragraph_id), text_to_embed) for rows whose key passes `keep` (if given)."""
     with open(csv_file, mode='r', encoding='utf-8') as file:
         reader = csv.DictReader(file)
         for row in reader:
-            article_id = int(row['article_id'])
-            paragraph_id = int(row['paragraph_id'])
+            key = (int(row['article_id']), int(row['paragraph_id']))
+            if keep is not None and not keep(key):
+                continue
             paragraph_text = (row.get('paragraph_text') or "").strip()
             if not paragraph_text:
                 continue
@@ -48,24 +58,173 @@ def create_paragraph_embeddings(model, csv_file, output_embeddings_pkl):
             else:
                 text_to_embed = paragraph_text
 
-            key = (article_id, paragraph_id)
-            batch_keys.append(key)
-            batch_texts.append(text_to_embed)
+            yield key, text_to_embed
+
+def representative_filter():
+    """
+    Key predicate that skips near-duplicate paragraphs whose cluster representative is embedded
+    instead (paragraph_clusters_<fandom>.csv from paragraph_dedup.py); everything passes without it.
+    """
+    member_to_rep = paragraph_dedup.load_clusters()
+    if member_to_rep:
+        n_reps = len(set(member_to_rep.values()))
+        print(f"🧬 Near-duplicate clusters: embedding {n_reps} representatives for {len(member_to_rep)} clustered paragraphs")
+
+    def is_rep(key):
+        if member_to_rep.get(key, key) == key:
+            return True
+        is_rep.skipped += 1
+        return False
+    is_rep.skipped = 0   # rejected keys, for the log line after a pass over the CSV
+    return is_rep
+
+def encode_texts(model, texts):
+    if LENGTH_BUCKETING:
+        return encode_length_bucketed(model, texts, TOKEN_BUDGET)
+    return np.asarray(model.encode(texts, convert_to_tensor=False, show_progress_bar=False), dtype="float32")
+
+def encode_batches(model, paragraphs, cache=None):
+    """
+    Encode (key, text) pairs window by window; yields (packed int64 ids, float32 matrix) per
+    window in input order, so callers can write each one out and drop it.
+    With a cache, only texts it has never seen for this model reach model.encode.
+    """
+    batch_keys, batch_texts = [], []
+
+    def encode_window():
+        if cache is None:
+            return encode_texts(model, batch_texts)
+        vecs = cache.get_many(batch_texts)
+        missed = [i for i, v in enumerate(vecs) if v is None]
+        if missed:
+            missed_texts = [batch_texts[i] for i in missed]
+            fresh = encode_texts(model, missed_texts)
+            cache.put_many(missed_texts, fresh)
+            for i, v in zip(missed, fresh):
+                vecs[i] = v
+        return vecs
+
+    window = BUCKET_WINDOW if LENGTH_BUCKETING else BATCH_SIZE
+    for key, text_to_embed in paragraphs:
+        batch_keys.append(key)
+        batch_texts.append(text_to_embed)
 
-            if len(batch_texts) >= BATCH_SIZE:
-                flush()
+        if len(batch_texts) >= window:
+            yield pack_paragraph_ids(batch_keys), np.asarray(encode_window(), dtype="float32")
+            batch_keys, batch_texts = [], []
 
-    flush()
+    if batch_texts:
+        yield pack_paragraph_ids(batch_keys), np.asarray(encode_window(), dtype="float32")
 
-    with open(output_embeddings_pkl, 'wb') as f:
-        pickle.dump(embeddings_dict, f)
+def encode_paragraphs(model, paragraphs, cache=None):
+    """Like encode_batches, but concatenated: (packed int64 ids, float32 matrix) in input order."""
+    ids_parts, matrix_parts = [], []
+    for ids, vecs in encode_batches(model, paragraphs, cache):
+        ids_parts.append(ids)
+        matrix_parts.append(vecs)
+    if not ids_parts:
+        return pack_paragraph_ids([]), np.zeros((0, model.get_sentence_embedding_dimension()), dtype="float32")
+    return np.concatenate(ids_parts), np.concatenate(matrix_parts)
 
-    print(f"✅ Saved {len(embeddings_dict)} embeddings to {output_embeddings_pkl}")
+def create_paragraph_embeddings(model, csv_file, output_embeddings_npy, cache=None):
+    dim = model.get_sentence_embedding_dimension()
+    is_rep = representative_filter()
+    with EmbeddingWriter(output_embeddings_npy, dim, MODEL_NAME, STORAGE_DTYPE) as writer:
+        for ids, vecs in encode_batches(model, iter_paragraphs(csv_file, is_rep), cache):
+            writer.append(ids, vecs)
+
+    if is_rep.skipped:
+        print(f"🧬 Skipped {is_rep.skipped} master CSV rows of near-duplicates (their representative is embedded)")
+
+    print(f"✅ Saved {writer.count} {STORAGE_DTYPE} embeddings to {output_embeddings_npy}")
+
+def update_paragraph_embeddings(model, csv_file, embeddings_npy, delta, cache=None):
+    """
+    Drop vectors of changed/deleted articles and encode only the added/changed ones. Representatives
+    that moved because of re-clustering are reconciled too (old ones dropped, missing ones encoded).
+    Kept rows are copied from the memory-mapped store chunk by chunk; the store keeps its dtype.
+    """
+    meta = load_meta(embeddings_npy)
+    ids = np.load(keys_path(embeddings_npy))
+
+    stale = article_delta.stale_article_ids(delta)
+    fresh = article_delta.new_article_ids(delta)
+    is_rep = representative_filter()
+    keys = [(int(a), int(p)) for a, p in unpack_paragraph_ids(ids)]
+    keep = np.fromiter((k[0] not in stale and is_rep(k) for k in keys), dtype=bool, count=len(keys))
+    dropped = len(ids) - int(keep.sum())
+
+    have = {k for k, kept in zip(keys, keep) if kept}
+    needs_vector = lambda key: is_rep(key) and (key[0] in fresh or key not in have)
+
+    encoded, offset = 0, 0
+    with EmbeddingWriter(embeddings_npy, meta["dim"], MODEL_NAME, meta.get("dtype", "float32")) as writer:
+        for chunk_ids, chunk_rows in iter_embedding_chunks(embeddings_npy, BUCKET_WINDOW):
+            chunk_keep = keep[offset:offset + len(chunk_ids)]
+            writer.append(chunk_ids[chunk_keep], chunk_rows[chunk_keep])
+            offset += len(chunk_ids)
+        for new_ids, new_vecs in encode_batches(model, iter_paragraphs(csv_file, needs_vector), cache):
+            writer.append(new_ids, new_vecs)
+            encoded += len(new_ids)
+
+    print(f"✅ Delta: dropped {dropped}, encoded {encoded} "
+          f"({len(fresh)} articles); {writer.count} embeddings in {embeddings_npy}")
 
 def main():
-    model = SentenceTransformer(MODEL_NAME)
+    global LENGTH_BUCKETING, STORAGE_DTYPE, INFERENCE_BACKEND
+    parser = argparse.ArgumentParser(description="Embed master_csv paragraphs into the embedding store.")
+    parser.add_argument("--delta", action="store_true",
+                        help="Re-embed only the articles in article_delta_<fandom>.json (see article_delta.py).")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the persistent embedding cache.")
+    parser.add_argument("--fixed-batching", action="store_true",
+                        help=f"Encode {BATCH_SIZE} paragraphs per call in CSV order (no length bucketing).")
+    parser.add_argument("--shards", action="store_true",
+                        help="Encode resumable shards in a pool of worker processes (sharded_embeddings.py).")
+    parser.add_argument("--workers", type=int, default=max(1, min(4, (os.cpu_count() or 1) // 2)))
+    parser.add_argument("--threads-per-worker", type=int, default=0,
+                        help="torch threads per worker (default: cpu_count // workers).")
+    parser.add_argument("--keep-shards", action="store_true", help="Keep shard files after the merge.")
+    parser.add_argument("--storage", choices=list(STORAGE_DTYPES), default=STORAGE_DTYPE,
+                        help="On-disk dtype of the matrix (int8 = per-dimension scalar quantization). "
+                             "--delta keeps the dtype of the existing store.")
+    parser.add_argument("--backend", choices=BACKENDS, default=INFERENCE_BACKEND,
+                        help="Encoder runtime; onnx/onnx-int8 export the model once to ONNX Runtime.")
+    args = parser.parse_args()
+    if args.delta and args.shards:
+        # the sharded path always encodes the whole CSV; a delta only touches a few articles anyway
+        parser.error("--delta and --shards cannot be combined (run --delta without --shards)")
+
+    LENGTH_BUCKETING = not args.fixed_batching
+    STORAGE_DTYPE = args.storage
+    INFERENCE_BACKEND = args.backend
     output_file = get_output_filename(CSV_FILE, MODEL_NAME, OUTPUT_DIR)
-    create_paragraph_embeddings(model, CSV_FILE, output_file)
+
+    if args.shards:
+        from sharded_embeddings import run_sharded
+        threads = args.threads_per_worker or max(1, (os.cpu_count() or 1) // args.workers)
+        run_sharded(CSV_FILE, output_file, args.workers, threads, INFERENCE_BACKEND, LENGTH_BUCKETING,
+                    STORAGE_DTYPE, use_cache=not args.no_cache, keep_shards=args.keep_shards)
+        return
+
+    model = load_encoder(MODEL_NAME, INFERENCE_BACKEND)
+    # vectors from another runtime are close but not identical → cached separately
+    cache = None if args.no_cache else EmbeddingCache(CACHE_PATH, model_key(MODEL_NAME, INFERENCE_BACKEND), CACHE_MAX_ENTRIES)
+
+    try:
+        if args.delta:
+            delta = article_delta.load_delta()
+            if delta is None or not os.path.exists(output_file):
+                print(f"ERROR: --delta needs a pending delta ({article_delta.DELTA_PATH}) "
+                      f"and existing embeddings ({output_file}).")
+                sys.exit(1)
+            article_delta.print_delta_summary(delta)
+            update_paragraph_embeddings(model, CSV_FILE, output_file, delta, cache)
+        else:
+            create_paragraph_embeddings(model, CSV_FILE, output_file, cache)
+    finally:
+        if cache is not None:
+            cache.close()
+            print(cache.stats_line())
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,108 @@
+"""
+Persistent embedding cache keyed by (model name, sha1 of text_to_embed).
+
+Backed by one SQLite file so it survives runs and can be shared by several
+processes (WAL mode). Entries carry a last-used timestamp; when the cache grows
+past `max_entries` the least recently used rows are evicted on close().
+
+    cache = EmbeddingCache(CACHE_PATH, MODEL_NAME)
+    vecs = cache.get_many(texts)          # list of np.ndarray | None
+    cache.put_many(missed_texts, missed_vecs)
+    cache.close()
+    print(cache.stats_line())
+"""
+import time
+import sqlite3
+import hashlib
+import numpy as np
+from pathlib import Path
+
+DEFAULT_MAX_ENTRIES = 5_000_000
+
+def text_hash(text: str) -> bytes:
+    return hashlib.sha1(text.encode("utf-8")).digest()
+
+class EmbeddingCache:
+    def __init__(self, path: Path, model_name: str, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = Path(path)
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.hits = self.misses = self.evicted = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path), timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model      TEXT    NOT NULL,
+                text_hash  BLOB    NOT NULL,
+                dim        INTEGER NOT NULL,
+                vector     BLOB    NOT NULL,
+                last_used  REAL    NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            ) WITHOUT ROWID
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings(last_used)")
+        self.conn.commit()
+
+    def get_many(self, texts: list[str]) -> list:
+        """Cached vectors (float32) aligned with `texts`; None where the text was never encoded."""
+        hashes = [text_hash(t) for t in texts]
+        found = {}
+        for start in range(0, len(hashes), 500):   # stay below SQLite's bound-parameter limit
+            chunk = hashes[start:start + 500]
+            marks = ",".join("?" * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({marks})",
+                [self.model_name, *chunk],
+            ).fetchall()
+            found.update((h, np.frombuffer(v, dtype="float32")) for h, v in rows)
+            if rows:
+                self.conn.execute(
+                    f"UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash IN ({marks})",
+                    [time.time(), self.model_name, *chunk],
+                )
+
+        out = [found.get(h) for h in hashes]
+        n_hit = sum(v is not None for v in out)
+        self.hits += n_hit
+        self.misses += len(out) - n_hit
+        return out
+
+    def put_many(self, texts: list[str], vecs):
+        now = time.time()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (model, text_hash, dim, vector, last_used) VALUES (?, ?, ?, ?, ?)",
+            [
+                (self.model_name, text_hash(t), len(v), np.asarray(v, dtype="float32").tobytes(), now)
+                for t, v in zip(texts, vecs)
+            ],
+        )
+        self.conn.commit()
+
+    def evict(self) -> int:
+        """Drop least-recently-used rows (across all models) until at most max_entries remain."""
+        (count,) = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        excess = count - self.max_entries
+        if excess <= 0:
+            return 0
+        self.conn.execute(
+            "DELETE FROM embeddings WHERE (model, text_hash) IN "
+            "(SELECT model, text_hash FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+            (excess,),
+        )
+        self.conn.commit()
+        self.evicted += excess
+        return excess
+
+    def close(self):
+        self.conn.commit()
+        self.evict()
+        self.conn.close()
+
+    def stats_line(self) -> str:
+        total = self.hits + self.misses
+        rate = 100 * self.hits / total if total else 0.0
+        return (f"🗃️  Embedding cache: {self.hits} hits, {self.misses} misses ({rate:.1f}% hit rate), "
+                f"{self.evicted} evicted — {self.path}")
@@ -0,0 +1,253 @@
+"""
+On-disk embedding format shared by create_embeddings.py, create_faiss_index.py and retreive.py.
+
+    embeddings_<fandom>_<model>.npy        (n, dim) matrix, C-contiguous, L2-normalized rows
+    embeddings_<fandom>_<model>.keys.npy   int64 (n,) packed keys, row-aligned with the matrix
+    embeddings_<fandom>_<model>.meta.json  {"model", "dim", "count", "dtype", "normalized", "key_format"}
+    embeddings_<fandom>_<model>.scale.npy  float32 (dim,) per-dimension scale, int8 storage only
+
+The matrix is stored as float32 (default), float16, or int8 with a symmetric per-dimension
+scale (x ≈ q * scale, scale = max|x| / 127 per column). load_embeddings dequantizes back to
+float32 (rows re-normalized), so readers do not care which storage was picked.
+
+Keys pack (article_id, paragraph_id) as (article_id << PARAGRAPH_BITS) | paragraph_id; the
+same int64 is used as the FAISS id. Loading uses np.load(mmap_mode="r"), so opening the
+matrix costs no copy and the OS page cache is shared between processes. EmbeddingWriter
+streams batches straight into the files, so writing never holds more than one batch.
+
+    python embedding_store.py <embeddings.pkl>   # convert an old pickled {(aid, pid): vec} dict
+"""
+import os
+import sys
+import json
+import pickle
+import numpy as np
+from pathlib import Path
+
+# all paragraphs of one article share the high bits → whole-article id ranges
+PARAGRAPH_BITS = 32
+KEY_FORMAT = f"(article_id << {PARAGRAPH_BITS}) | paragraph_id"
+NPY_MAGIC = b"\x93NUMPY\x01\x00"
+HEADER_BYTES = 128   # fixed .npy header size used by EmbeddingWriter
+STORAGE_DTYPES = {"float32": "<f4", "float16": "<f2", "int8": "|i1"}
+
+def pack_paragraph_ids(keys) -> np.ndarray:
+    keys = np.asarray(list(keys), dtype="int64").reshape(-1, 2)
+    return (keys[:, 0] << PARAGRAPH_BITS) | keys[:, 1]
+
+def unpack_paragraph_ids(ids) -> np.ndarray:
+    ids = np.asarray(ids, dtype="int64")
+    return np.stack([ids >> PARAGRAPH_BITS, ids & ((1 << PARAGRAPH_BITS) - 1)], axis=-1)
+
+def keys_path(matrix_path: Path) -> Path:
+    return Path(matrix_path).with_suffix(".keys.npy")
+
+def meta_path(matrix_path: Path) -> Path:
+    return Path(matrix_path).with_suffix(".meta.json")
+
+def scale_path(matrix_path: Path) -> Path:
+    return Path(matrix_path).with_suffix(".scale.npy")
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.ascontiguousarray(matrix, dtype="float32")
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+def int8_scale(absmax: np.ndarray) -> np.ndarray:
+    """Per-dimension scale from the column-wise max |x|; all-zero columns get scale 1."""
+    scale = np.asarray(absmax, dtype="float32") / 127.0
+    scale[scale == 0] = 1.0
+    return scale
+
+def quantize_int8(matrix: np.ndarray, scale: np.ndarray) -> np.ndarray:
+    return np.clip(np.rint(np.asarray(matrix, dtype="float32") / scale), -127, 127).astype("int8")
+
+def dequantize(stored: np.ndarray, scale: np.ndarray = None) -> np.ndarray:
+    """float16/int8 rows → float32, L2-normalized again (a float32 matrix passes through as is)."""
+    if stored.dtype == np.float32:
+        return stored
+    matrix = np.asarray(stored, dtype="float32")
+    if scale is not None:
+        matrix *= scale
+    return normalize_rows(matrix)
+
+def _npy_header(shape: tuple, descr: str) -> bytes:
+    """
+    .npy v1.0 header padded to a fixed HEADER_BYTES, so it can be rewritten in place once the
+    final row count is known (np.save would pick the header length from the shape).
+    """
+    body = f"{{'descr': '{descr}', 'fortran_order': False, 'shape': {shape!r}, }}"
+    pad = HEADER_BYTES - len(NPY_MAGIC) - 2 - len(body) - 1
+    if pad < 0:
+        raise ValueError(f"shape {shape} does not fit a {HEADER_BYTES}-byte .npy header")
+    body = body + " " * pad + "\n"
+    return NPY_MAGIC + len(body).to_bytes(2, "little") + body.encode("latin1")
+
+class EmbeddingWriter:
+    """
+    Append-only writer for the store: every append() goes straight to disk, so peak memory
+    is one batch whatever the corpus size. Files are written under .tmp names and only
+    replace the previous store on close(); leaving the `with` block on an exception
+    discards them.
+
+        with EmbeddingWriter(path, dim, MODEL_NAME, dtype="float16") as writer:
+            for ids, vecs in batches:
+                writer.append(ids, vecs)
+
+    float32/float16 rows are written as they come. int8 needs the per-dimension max over the
+    whole matrix, so rows are spooled as float32 and quantized in a second, chunked pass on close().
+    """
+    def __init__(self, matrix_path: Path, dim: int, model_name: str, dtype: str = "float32"):
+        if dtype not in STORAGE_DTYPES:
+            raise ValueError(f"unknown storage dtype {dtype!r}; expected one of {list(STORAGE_DTYPES)}")
+        self.matrix_path = Path(matrix_path)
+        self.dim = int(dim)
+        self.model_name = model_name
+        self.dtype = dtype
+        self.count = 0
+        self._absmax = np.zeros(self.dim, dtype="float32")
+        self._targets = [self.matrix_path, keys_path(self.matrix_path)]
+        self._tmps = [p.with_name(p.name + ".tmp") for p in self._targets]
+        self._spool_dtype = "<f4" if dtype == "int8" else STORAGE_DTYPES[dtype]
+        self._spool = self._tmps[0].with_name(self._tmps[0].name + ".f32") if dtype == "int8" else self._tmps[0]
+        self._matrix_f = open(self._spool, "wb")
+        self._keys_f = open(self._tmps[1], "wb")
+        self._matrix_f.write(_npy_header((0, self.dim), self._spool_dtype))
+        self._keys_f.write(_npy_header((0,), "<i8"))
+
+    def append(self, ids, matrix):
+        matrix = normalize_rows(np.asarray(matrix, dtype="float32").reshape(-1, self.dim))
+        ids = np.ascontiguousarray(ids, dtype="<i8")
+        if len(ids) != len(matrix):
+            raise ValueError(f"keys/matrix mismatch: keys={ids.shape}, matrix={matrix.shape}")
+        if self.dtype == "int8" and len(matrix):
+            np.maximum(self._absmax, np.abs(matrix).max(axis=0), out=self._absmax)
+        self._matrix_f.write(matrix.astype(self._spool_dtype, copy=False).tobytes())
+        self._keys_f.write(ids.tobytes())
+        self.count += len(ids)
+
+    def _quantize_spool(self, chunk_rows: int = 65536):
+        scale = int8_scale(self._absmax)
+        spool = np.load(self._spool, mmap_mode="r")
+        with open(self._tmps[0], "wb") as f:
+            f.write(_npy_header((self.count, self.dim), STORAGE_DTYPES["int8"]))
+            for start in range(0, self.count, chunk_rows):
+                f.write(quantize_int8(spool[start:start + chunk_rows], scale).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        del spool
+        self._spool.unlink()
+        scale_tmp = scale_path(self.matrix_path).with_name(scale_path(self.matrix_path).name + ".tmp")
+        with open(scale_tmp, "wb") as f:
+            np.save(f, scale)
+        self._tmps.append(scale_tmp)
+        self._targets.append(scale_path(self.matrix_path))
+
+    def close(self) -> int:
+        for f, header in ((self._matrix_f, _npy_header((self.count, self.dim), self._spool_dtype)),
+                          (self._keys_f, _npy_header((self.count,), "<i8"))):
+            f.seek(0)
+            f.write(header)
+            f.flush()
+            os.fsync(f.fileno())
+            f.close()
+        if self.dtype == "int8":
+            self._quantize_spool()
+        for tmp, target in zip(self._tmps, self._targets):
+            os.replace(tmp, target)
+        if self.dtype != "int8":
+            scale_path(self.matrix_path).unlink(missing_ok=True)   # left over from an earlier int8 store
+
+        meta = {
+            "model": self.model_name,
+            "dim": self.dim,
+            "count": self.count,
+            "dtype": self.dtype,
+            "normalized": True,
+            "key_format": KEY_FORMAT,
+        }
+        tmp = meta_path(self.matrix_path).with_name(meta_path(self.matrix_path).name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp, meta_path(self.matrix_path))
+        return self.count
+
+    def abort(self):
+        for f in (self._matrix_f, self._keys_f):
+            f.close()
+        for tmp in self._tmps + [self._spool]:
+            tmp.unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+def save_embeddings(matrix_path: Path, ids: np.ndarray, matrix: np.ndarray, model_name: str,
+                    dtype: str = "float32"):
+    """Write a whole in-memory matrix + keys + meta (see EmbeddingWriter for the streaming path)."""
+    matrix = np.asarray(matrix, dtype="float32")
+    if matrix.ndim != 2:
+        raise ValueError(f"expected a 2-D matrix, got {matrix.shape}")
+    with EmbeddingWriter(matrix_path, matrix.shape[1], model_name, dtype) as writer:
+        writer.append(ids, matrix)
+
+def load_meta(matrix_path: Path) -> dict:
+    with open(meta_path(matrix_path), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def load_stored(matrix_path: Path, mmap: bool = True):
+    """
+    Return (ids, stored matrix, scale or None, meta) without dequantizing: the matrix keeps its
+    on-disk dtype (float32/float16/int8) and is read-only when memory-mapped.
+    """
+    matrix_path = Path(matrix_path)
+    meta = load_meta(matrix_path)
+    matrix = np.load(matrix_path, mmap_mode="r" if mmap else None)
+    ids = np.load(keys_path(matrix_path))
+    dtype = meta.get("dtype", "float32")
+    if (matrix.shape != (meta["count"], meta["dim"]) or len(ids) != len(matrix)
+            or matrix.dtype != np.dtype(STORAGE_DTYPES[dtype])):
+        raise ValueError(f"Corrupt embedding store {matrix_path}: meta={meta}, "
+                         f"matrix={matrix.shape} {matrix.dtype}, keys={ids.shape}")
+    scale = np.load(scale_path(matrix_path)) if dtype == "int8" else None
+    return ids, matrix, scale, meta
+
+def load_embeddings(matrix_path: Path, mmap: bool = True):
+    """
+    Return (ids int64 (n,), matrix float32 (n, dim), meta). A float32 store is memory-mapped
+    (read-only, no copy) when mmap is set; float16/int8 stores are dequantized into RAM.
+    """
+    ids, stored, scale, meta = load_stored(matrix_path, mmap)
+    return ids, dequantize(stored, scale), meta
+
+def iter_embedding_chunks(matrix_path: Path, chunk_rows: int = 65536):
+    """Yield (ids, float32 rows) chunk by chunk from the memory-mapped store, whatever its dtype."""
+    ids, stored, scale, _ = load_stored(matrix_path)
+    for start in range(0, len(ids), chunk_rows):
+        yield ids[start:start + chunk_rows], dequantize(stored[start:start + chunk_rows], scale)
+
+def convert_pickle(pkl_path: Path, model_name: str) -> Path:
+    with open(pkl_path, "rb") as f:
+        embeddings_dict = pickle.load(f)
+    ids = pack_paragraph_ids(embeddings_dict.keys())
+    matrix = np.array(list(embeddings_dict.values()), dtype="float32")
+    out = Path(pkl_path).with_suffix(".npy")
+    save_embeddings(out, ids, matrix, model_name)
+    return out
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python embedding_store.py <embeddings_<fandom>_<model>.pkl> [model_name]")
+        sys.exit(1)
+    pkl = Path(sys.argv[1])
+    model = sys.argv[2] if len(sys.argv) >= 3 else "sentence-transformers/" + pkl.stem.rsplit("_", 1)[-1]
+    out = convert_pickle(pkl, model)
+    print(f"✅ Converted {pkl} → {out} (+ {keys_path(out).name}, {meta_path(out).name})")
@@ -0,0 +1,200 @@
+"""
+Selectable CPU inference backend for the bi-encoder (SentenceTransformer) and the cross-encoder.
+
+    backend = "torch"       eager PyTorch, as before
+    backend = "onnx"        ONNX Runtime on an exported copy of the model
+    backend = "onnx-int8"   same, with dynamic int8 quantization of the weights
+
+The first ONNX load exports the transformer once to
+
+    <cache_dir>/<model_short>[-int8]/model.onnx + tokenizer files + backend.json
+
+and later loads only read those local files (no hub access, no torch import). Pooling and
+normalization of the bi-encoder are done in numpy from backend.json, so the ONNX encoder
+is a drop-in for what the pipeline uses from SentenceTransformer: encode(),
+get_sentence_embedding_dimension(), tokenizer and max_seq_length. The cross-encoder wrapper
+provides predict().
+
+Pick the backend with FANDOM_INFERENCE_BACKEND (config.INFERENCE_BACKEND) or --backend in
+create_embeddings.py; benchmark_backends.py checks parity and throughput.
+"""
+import os
+import json
+import shutil
+from pathlib import Path
+import numpy as np
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parent / "onnx_models"
+OPSET = 14
+
+def export_dir(model_name: str, backend: str, cache_dir: Path = DEFAULT_CACHE_DIR) -> Path:
+    suffix = "-int8" if backend == "onnx-int8" else ""
+    return Path(cache_dir) / f"{model_name.split('/')[-1]}{suffix}"
+
+def _first_output(model, input_names):
+    """Wrap a HF model so torch.onnx.export sees positional tensors in and one tensor out."""
+    import torch
+
+    class FirstOutput(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs)))[0]
+
+    return FirstOutput().eval()
+
+def _export(model, tokenizer, sample, out_dir: Path, output_name: str, quantize: bool, settings: dict):
+    """Export `model` to out_dir/model.onnx (+ tokenizer, backend.json); written to a tmp dir, then renamed."""
+    import inspect
+    import torch
+
+    tmp = out_dir.with_name(out_dir.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+
+    encoded = tokenizer(*sample, padding=True, truncation=True, return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in encoded]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes[output_name] = {0: "batch"}
+
+    # newer torch defaults to the dynamo exporter; the TorchScript one handles these HF models as is
+    legacy = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    fp32_path = tmp / ("model_fp32.onnx" if quantize else "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(_first_output(model, input_names), tuple(encoded[name] for name in input_names),
+                          str(fp32_path), input_names=input_names, output_names=[output_name],
+                          dynamic_axes=dynamic_axes, opset_version=OPSET, **legacy)
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(str(fp32_path), str(tmp / "model.onnx"), weight_type=QuantType.QInt8)
+        fp32_path.unlink()
+
+    tokenizer.save_pretrained(str(tmp))
+    with open(tmp / "backend.json", "w", encoding="utf-8") as f:
+        json.dump({**settings, "input_names": input_names, "quantized": quantize}, f, indent=2)
+
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp, out_dir)
+
+def export_encoder(model_name: str, backend: str, cache_dir: Path = DEFAULT_CACHE_DIR) -> Path:
+    """Export the SentenceTransformer's transformer once; returns the export dir (no-op if present)."""
+    out_dir = export_dir(model_name, backend, cache_dir)
+    if (out_dir / "backend.json").exists():
+        return out_dir
+    from sentence_transformers import SentenceTransformer
+    st = SentenceTransformer(model_name, device="cpu")
+    modules = [type(m).__name__ for m in st]
+    pooling = st[1].get_config_dict() if len(modules) > 1 and modules[1] == "Pooling" else {}
+    mode = pooling.get("pooling_mode") or ("cls" if pooling.get("pooling_mode_cls_token")
+                                           else "mean" if pooling.get("pooling_mode_mean_tokens") else None)
+    if modules[0] != "Transformer" or mode not in ("mean", "cls") or any(
+            m not in ("Pooling", "Normalize") for m in modules[1:]):
+        raise ValueError(f"{model_name}: only Transformer + mean/cls Pooling [+ Normalize] can be exported, got {modules}")
+
+    print(f"📦 Exporting {model_name} → {out_dir} (ONNX{', dynamic int8' if backend == 'onnx-int8' else ''})")
+    _export(st[0].auto_model, st.tokenizer, (["export sample"],), out_dir, "token_embeddings",
+            backend == "onnx-int8", {
+                "model": model_name,
+                "kind": "sentence-transformer",
+                "pooling": mode,
+                "normalize": "Normalize" in modules,
+                "dim": st.get_sentence_embedding_dimension(),
+                "max_seq_length": st.max_seq_length,
+            })
+    return out_dir
+
+def export_cross_encoder(model_name: str, backend: str, cache_dir: Path = DEFAULT_CACHE_DIR) -> Path:
+    out_dir = export_dir(model_name, backend, cache_dir)
+    if (out_dir / "backend.json").exists():
+        return out_dir
+    import torch
+    from sentence_transformers import CrossEncoder
+    ce = CrossEncoder(model_name, device="cpu")
+    activation = getattr(ce, "activation_fn", None) or getattr(ce, "default_activation_function", None)
+    max_length = getattr(ce, "max_seq_length", None) or getattr(ce, "max_length", None) or 512
+
+    print(f"📦 Exporting {model_name} → {out_dir} (ONNX{', dynamic int8' if backend == 'onnx-int8' else ''})")
+    _export(ce.model, ce.tokenizer, (["export query"], ["export passage"]), out_dir, "logits",
+            backend == "onnx-int8", {
+                "model": model_name,
+                "kind": "cross-encoder",
+                "activation": "sigmoid" if isinstance(activation, torch.nn.Sigmoid) else "identity",
+                "max_seq_length": max_length,
+            })
+    return out_dir
+
+class _OnnxModel:
+    def __init__(self, out_dir: Path, threads: int = 0):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+        with open(out_dir / "backend.json", "r", encoding="utf-8") as f:
+            self.settings = json.load(f)
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(str(out_dir / "model.onnx"), options, providers=["CPUExecutionProvider"])
+        self.tokenizer = AutoTokenizer.from_pretrained(str(out_dir))
+        self.max_seq_length = self.settings["max_seq_length"]
+
+    def _run(self, *texts):
+        encoded = self.tokenizer(*texts, padding=True, truncation=True, max_length=self.max_seq_length,
+                                 return_tensors="np")
+        feeds = {name: encoded[name].astype("int64") for name in self.settings["input_names"]}
+        return self.session.run(None, feeds)[0], encoded["attention_mask"]
+
+class OnnxSentenceEncoder(_OnnxModel):
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.settings["dim"]
+
+    def encode(self, sentences, batch_size: int = 32, **_) -> np.ndarray:
+        """float32 (len(sentences), dim); extra SentenceTransformer kwargs (convert_to_tensor, ...) are ignored."""
+        if isinstance(sentences, str):
+            sentences = [sentences]
+        out = np.empty((len(sentences), self.settings["dim"]), dtype="float32")
+        for start in range(0, len(sentences), batch_size):
+            tokens, mask = self._run(list(sentences[start:start + batch_size]))
+            if self.settings["pooling"] == "cls":
+                pooled = tokens[:, 0]
+            else:
+                mask = mask[..., None].astype("float32")
+                pooled = (tokens * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            if self.settings["normalize"]:
+                pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            out[start:start + len(pooled)] = pooled
+        return out
+
+class OnnxCrossEncoder(_OnnxModel):
+    def predict(self, pairs, batch_size: int = 32, **_) -> np.ndarray:
+        scores = []
+        for start in range(0, len(pairs), batch_size):
+            batch = pairs[start:start + batch_size]
+            logits, _ = self._run([str(q) for q, _ in batch], [str(p) for _, p in batch])
+            scores.append(logits[:, 0] if logits.shape[1] == 1 else logits)
+        scores = np.concatenate(scores) if scores else np.zeros(0, dtype="float32")
+        if self.settings["activation"] == "sigmoid":
+            scores = 1.0 / (1.0 + np.exp(-scores))
+        return scores.astype("float32")
+
+def load_encoder(model_name: str, backend: str = "torch", threads: int = 0, cache_dir: Path = DEFAULT_CACHE_DIR):
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown inference backend {backend!r}; expected one of {BACKENDS}")
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_name)
+    return OnnxSentenceEncoder(export_encoder(model_name, backend, cache_dir), threads)
+
+def load_cross_encoder(model_name: str, backend: str = "torch", threads: int = 0, cache_dir: Path = DEFAULT_CACHE_DIR):
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown inference backend {backend!r}; expected one of {BACKENDS}")
+    if backend == "torch":
+        from sentence_transformers import CrossEncoder
+        return CrossEncoder(model_name)
+    return OnnxCrossEncoder(export_cross_encoder(model_name, backend, cache_dir), threads)
+
+def model_key(model_name: str, backend: str) -> str:
+    """Name for caches/fingerprints: torch keeps the plain model name, other backends are tagged."""
+    return model_name if backend == "torch" else f"{model_name}@{backend}"
@@ -0,0 +1,61 @@
+"""
+Length-bucketed dynamic batching for SentenceTransformer.encode.
+
+A fixed batch of 64 paragraphs is padded to its longest member, so one long
+paragraph makes every short one in the batch pay for its length. Here texts are
+pre-tokenized, sorted by token length and cut into batches whose padded size
+(batch_len * longest_len) stays under a token budget: many short paragraphs
+per batch, few long ones. Results are returned in the original order.
+"""
+import numpy as np
+
+DEFAULT_TOKEN_BUDGET = 16384   # ≈ 64 paragraphs x 256 tokens of padded work per forward pass
+DEFAULT_MAX_BATCH = 512
+
+def token_lengths(model, texts: list[str], chunk: int = 4096) -> np.ndarray:
+    """Token count per text as the encoder will see it (special tokens included, truncated to max_seq_length)."""
+    lengths = np.empty(len(texts), dtype=np.int64)
+    for start in range(0, len(texts), chunk):
+        enc = model.tokenizer(
+            texts[start:start + chunk],
+            add_special_tokens=True,
+            truncation=True,
+            max_length=model.max_seq_length,
+            return_attention_mask=False,
+            return_token_type_ids=False,
+        )
+        lengths[start:start + chunk] = [len(ids) for ids in enc["input_ids"]]
+    return lengths
+
+def token_budget_batches(lengths: np.ndarray, token_budget: int = DEFAULT_TOKEN_BUDGET,
+                         max_batch: int = DEFAULT_MAX_BATCH) -> list[np.ndarray]:
+    """Indices grouped into batches, shortest first, with len(batch) * max(length) <= token_budget."""
+    order = np.argsort(lengths, kind="stable")
+    batches, current = [], []
+    for i in order:
+        longest = lengths[i]               # ascending order → the newest item is the longest
+        if current and ((len(current) + 1) * longest > token_budget or len(current) >= max_batch):
+            batches.append(np.asarray(current))
+            current = []
+        current.append(i)
+    if current:
+        batches.append(np.asarray(current))
+    return batches
+
+def encode_length_bucketed(model, texts: list[str], token_budget: int = DEFAULT_TOKEN_BUDGET,
+                           max_batch: int = DEFAULT_MAX_BATCH) -> np.ndarray:
+    """Drop-in for model.encode(texts) → float32 (len(texts), dim), batched by token budget."""
+    dim = model.get_sentence_embedding_dimension()
+    out = np.empty((len(texts), dim), dtype="float32")
+    if not texts:
+        return out
+    lengths = token_lengths(model, texts)
+    for batch in token_budget_batches(lengths, token_budget, max_batch):
+        vecs = model.encode(
+            [texts[i] for i in batch],
+            batch_size=len(batch),
+            convert_to_tensor=False,
+            show_progress_bar=False,
+        )
+        out[batch] = np.asarray(vecs, dtype="float32")
+    return out
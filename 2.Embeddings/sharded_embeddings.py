@@ -0,0 +1,170 @@
+"""
+Sharded, resumable multi-process embedding (create_embeddings.py --shards).
+
+Paragraphs are cut into fixed shards of SHARD_SIZE in CSV order. Each shard is
+encoded by one of N worker processes (each with its own encoder and
+torch / ONNX Runtime thread count) and written to disk as soon as it finishes:
+
+    shards_<fandom>_<model>/shard_00042.npz   ids int64, matrix float32, fingerprint
+
+A shard whose file exists with the same fingerprint (sha1 of the model, backend,
+batching mode, keys and texts) is skipped, so after a crash only the missing shards
+are encoded again. When every shard is present they are streamed, one at a time, into
+the normal embedding store; shards are float32 and --storage is applied at the merge,
+so changing it alone reuses them.
+"""
+import os
+import sys
+import shutil
+import hashlib
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import multiprocessing as mp
+import numpy as np
+
+import create_embeddings
+from embedding_store import EmbeddingWriter
+from embedding_cache import EmbeddingCache
+from inference_backend import load_encoder, export_encoder, model_key
+
+SHARD_SIZE = 20_000
+
+_model = None
+_cache = None
+
+def shard_dir_for(output_npy) -> Path:
+    return Path(output_npy).with_name(Path(output_npy).stem.replace("embeddings_", "shards_", 1))
+
+def shard_fingerprint(keys, texts, backend: str, length_bucketing: bool) -> str:
+    h = hashlib.sha1(model_key(create_embeddings.MODEL_NAME, backend).encode("utf-8"))
+    h.update(b"bucketed:" if length_bucketing else b"fixed:")
+    for (article_id, paragraph_id), text in zip(keys, texts):
+        h.update(f"{article_id}:{paragraph_id}:".encode("utf-8"))
+        h.update(text.encode("utf-8"))
+    return h.hexdigest()
+
+def shard_is_done(path: Path, fingerprint: str) -> bool:
+    if not path.exists():
+        return False
+    try:
+        with np.load(path) as shard:
+            return str(shard["fingerprint"]) == fingerprint
+    except Exception:
+        return False   # truncated / unreadable → encode again
+
+def iter_shards(csv_file, keep):
+    keys, texts = [], []
+    for key, text in create_embeddings.iter_paragraphs(csv_file, keep):
+        keys.append(key)
+        texts.append(text)
+        if len(keys) == SHARD_SIZE:
+            yield keys, texts
+            keys, texts = [], []
+    if keys:
+        yield keys, texts
+
+def _init_worker(threads: int, length_bucketing: bool, use_cache: bool, backend: str):
+    global _model, _cache
+    # this process only runs encode_paragraphs for us → configure its copy of the module
+    create_embeddings.LENGTH_BUCKETING = length_bucketing
+    create_embeddings.INFERENCE_BACKEND = backend
+    if backend == "torch":
+        import torch
+        torch.set_num_threads(threads)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass   # already fixed by an earlier parallel call in this process
+    _model = load_encoder(create_embeddings.MODEL_NAME, backend, threads)
+    if use_cache:
+        _cache = EmbeddingCache(create_embeddings.CACHE_PATH, model_key(create_embeddings.MODEL_NAME, backend),
+                                create_embeddings.CACHE_MAX_ENTRIES)
+
+def _encode_shard(shard_idx: int, keys, texts, fingerprint: str, out_path: str):
+    before = (_cache.hits, _cache.misses) if _cache is not None else (0, 0)
+    ids, matrix = create_embeddings.encode_paragraphs(_model, zip(keys, texts), _cache)
+    tmp = out_path + ".tmp.npz"
+    np.savez(tmp, ids=ids, matrix=matrix, fingerprint=np.array(fingerprint))
+    os.replace(tmp, out_path)
+    if _cache is None:
+        return shard_idx, len(ids), (0, 0)
+    _cache.conn.commit()   # last_used updates of a fully cached shard; workers never close() their cache
+    return shard_idx, len(ids), (_cache.hits - before[0], _cache.misses - before[1])
+
+def merge_shards(shard_paths: list[Path], output_npy, storage_dtype: str):
+    """Stream shards into the store one at a time (peak memory: one shard)."""
+    if not shard_paths:
+        raise ValueError(f"No shards to merge into {output_npy} (no paragraphs to embed?)")
+    with np.load(shard_paths[0]) as shard:
+        dim = shard["matrix"].shape[1]
+    with EmbeddingWriter(output_npy, dim, create_embeddings.MODEL_NAME, storage_dtype) as writer:
+        for path in shard_paths:
+            with np.load(path) as shard:
+                writer.append(shard["ids"], shard["matrix"])
+    return writer.count
+
+def run_sharded(csv_file, output_npy, workers: int, threads_per_worker: int, backend: str,
+                length_bucketing: bool, storage_dtype: str, use_cache: bool = True, keep_shards: bool = False):
+    shard_dir = shard_dir_for(output_npy)
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    print(f"🧩 Sharded embedding: {workers} workers × {threads_per_worker} torch threads, "
+          f"shard size {SHARD_SIZE} → {shard_dir}")
+
+    # inherited by the spawned workers before they import torch
+    os.environ["OMP_NUM_THREADS"] = str(threads_per_worker)
+    os.environ["MKL_NUM_THREADS"] = str(threads_per_worker)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+    if backend != "torch":
+        export_encoder(create_embeddings.MODEL_NAME, backend)   # once, before the workers race for it
+
+    shard_paths, skipped, encoded = [], 0, 0
+    cache_hits = cache_misses = 0
+    pending = set()
+    ctx = mp.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                             initargs=(threads_per_worker, length_bucketing, use_cache, backend)) as pool:
+
+        def drain(block_until: int):
+            nonlocal encoded, cache_hits, cache_misses
+            while len(pending) > block_until:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    pending.discard(fut)
+                    shard_idx, n, (hits, misses) = fut.result()
+                    encoded += 1
+                    cache_hits += hits
+                    cache_misses += misses
+                    print(f"💾 shard {shard_idx:05d}: {n} vectors (cache {hits} hits / {misses} misses)", flush=True)
+
+        is_rep = create_embeddings.representative_filter()
+        for shard_idx, (keys, texts) in enumerate(iter_shards(csv_file, is_rep)):
+            path = shard_dir / f"shard_{shard_idx:05d}.npz"
+            shard_paths.append(path)
+            fingerprint = shard_fingerprint(keys, texts, backend, length_bucketing)
+            if shard_is_done(path, fingerprint):
+                skipped += 1
+                continue
+            pending.add(pool.submit(_encode_shard, shard_idx, keys, texts, fingerprint, str(path)))
+            drain(2 * workers)   # bounded read-ahead: at most ~2 shards queued per worker
+        drain(0)
+
+    # shards beyond the current count belong to an older, longer CSV
+    for stale in shard_dir.glob("shard_*.npz"):
+        if stale not in shard_paths:
+            stale.unlink()
+
+    if is_rep.skipped:
+        print(f"🧬 Skipped {is_rep.skipped} master CSV rows of near-duplicates (their representative is embedded)")
+    print(f"🧩 Shards: {len(shard_paths)} total, {skipped} reused, {encoded} encoded")
+    if use_cache:
+        # one LRU eviction for the whole run, with the run's totals
+        cache = EmbeddingCache(create_embeddings.CACHE_PATH, model_key(create_embeddings.MODEL_NAME, backend),
+                               create_embeddings.CACHE_MAX_ENTRIES)
+        cache.hits, cache.misses = cache_hits, cache_misses
+        cache.close()
+        print(cache.stats_line())
+    n = merge_shards(shard_paths, output_npy, storage_dtype)
+    print(f"✅ Merged {n} embeddings into {output_npy}")
+    if not keep_shards:
+        shutil.rmtree(shard_dir)
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Benchmark index configurations on the embedding store and the query set.
+
+    python benchmark_indexes.py [--configs flat ivf hnsw ivfpq32 opq32 ...] [--batch 256] [--threads 0]
+
+Configs: flat | ivf | hnsw | ivfpq<m> | opq<m>  (opq = ivfpq with an OPQ rotation, both with
+--rescore exact re-scoring). Approximate indexes are first auto-tuned (nprobe / efSearch)
+to --target-recall at recall@10, like create_faiss_index.py does, so they are compared at
+their working point.
+
+Each config is built and measured in a fresh process, so peak RSS is its own: build seconds,
+tune seconds, serialized index bytes, peak RSS (and its growth over the loaded store),
+single-query and batched QPS with latency percentiles, and recall@1/10/100 against exact
+search. The table goes to stdout and to index_benchmark_<fandom>_<model>.csv in 3.FAISS_Index.
+"""
+import csv
+import time
+import argparse
+import resource
+import multiprocessing as mp
+import numpy as np
+import faiss
+
+import create_faiss_index as cfi
+import index_tuning
+
+CONFIGS = ["flat", "ivf", "hnsw", "ivfpq16", "ivfpq32", "opq32"]
+RECALL_KS = (1, 10, 100)
+BATCH_SIZE = 256
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024   # Linux: KiB
+
+def percentiles(seconds) -> dict:
+    ms = 1000 * np.asarray(seconds)
+    return {f"p{p}": float(np.percentile(ms, p)) for p in (50, 95, 99)}
+
+def pq_spec(spec: str):
+    """(pq_m, opq) for "ivfpq<m>" / "opq<m>", else None."""
+    for prefix, opq in (("ivfpq", False), ("opq", True)):
+        if spec.startswith(prefix) and spec[len(prefix):].isdigit():
+            return int(spec[len(prefix):]), opq
+    return None
+
+def build(spec: str, ids, embeddings, args):
+    """(index, rescorer, rescore) for one config spec."""
+    if spec == "flat":
+        return cfi.create_faiss_index(ids, embeddings), None, 0
+    if spec == "ivf":
+        return cfi.create_ivf_index(ids, embeddings, args.nlist), None, 0
+    if spec == "hnsw":
+        return cfi.create_hnsw_index(ids, embeddings), None, 0
+    pq_m, opq = pq_spec(spec)
+    index = cfi.create_ivfpq_index(ids, embeddings, args.nlist, pq_m, opq)
+    rescorer = index_tuning.ExactRescorer(ids, embeddings) if args.rescore > 1 else None
+    return index, rescorer, args.rescore if rescorer is not None else 0
+
+def run_config(spec, args, queries, self_ids, truth):
+    """Runs in its own process; returns one table row."""
+    if args.threads:
+        faiss.omp_set_num_threads(args.threads)
+    ids, embeddings = cfi.load_embeddings(cfi.embeddings_path(cfi.MODEL_NAME))
+    rss_loaded = peak_rss_mb()
+    extra = 0 if self_ids is None else 1
+    k_max = max(RECALL_KS)
+
+    t0 = time.perf_counter()
+    index, rescorer, rescore = build(spec, ids, embeddings, args)
+    build_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    tuned = {}
+    tune_truth = truth[:, :cfi.TUNE_K]
+    if index_tuning.ivf_of(index) is not None:
+        value, _ = index_tuning.tune_nprobe(index, queries, tune_truth, cfi.TUNE_K, args.target_recall, self_ids,
+                                            rescorer, rescore)
+        index_tuning.ivf_of(index).nprobe = value
+        tuned = {"nprobe": value}
+    elif index_tuning.hnsw_of(index) is not None:
+        value, _ = index_tuning.tune_ef_search(index, queries, tune_truth, cfi.TUNE_K, args.target_recall, self_ids)
+        index_tuning.hnsw_of(index).efSearch = value
+        tuned = {"efSearch": value}
+    tune_s = time.perf_counter() - t0
+
+    # single queries: one search call per query (interactive latency)
+    single = []
+    for i in range(len(queries)):
+        t0 = time.perf_counter()
+        index_tuning.search(index, queries[i:i + 1], cfi.TUNE_K, rescorer, rescore)
+        single.append(time.perf_counter() - t0)
+    # batches of args.batch queries, top-100 (also used for recall)
+    batched, found = [], []
+    for start in range(0, len(queries), args.batch):
+        t0 = time.perf_counter()
+        _, I = index_tuning.search(index, queries[start:start + args.batch], k_max + extra, rescorer, rescore)
+        batched.append(time.perf_counter() - t0)
+        found.append(I)
+    found = index_tuning.drop_self_hits(np.concatenate(found), self_ids, k_max)
+
+    index_bytes = index_tuning.index_bytes(index)
+    row = {
+        "config": spec,
+        "params": " ".join(f"{key}={value}" for key, value in tuned.items()) + (f" rescore={rescore}" if rescore else ""),
+        "build_s": build_s,
+        "tune_s": tune_s,
+        "index_mb": index_bytes / 2**20,
+        "bytes_per_vector": index_bytes / max(1, index.ntotal),
+        "peak_rss_mb": peak_rss_mb(),
+        "rss_growth_mb": peak_rss_mb() - rss_loaded,
+        "single_qps": len(queries) / sum(single),
+        **{f"single_{key}_ms": value for key, value in percentiles(single).items()},
+        "batch_qps": len(queries) / sum(batched),
+        **{f"batch_{key}_ms": value for key, value in percentiles(batched).items()},
+    }
+    for k in RECALL_KS:
+        row[f"recall@{k}"] = index_tuning.recall_at_k(found, truth, k)
+    return row
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--configs", nargs="+", default=CONFIGS)
+    parser.add_argument("--nlist", type=int, default=cfi.NLIST, help="IVF cells (0 = auto).")
+    parser.add_argument("--rescore", type=int, default=cfi.RESCORE)
+    parser.add_argument("--target-recall", type=float, default=cfi.TARGET_RECALL)
+    parser.add_argument("--queries", type=int, default=cfi.TUNE_QUERIES)
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE)
+    parser.add_argument("--threads", type=int, default=0, help="FAISS OpenMP threads (0 = FAISS default).")
+    args = parser.parse_args()
+
+    ids, embeddings = cfi.load_embeddings(cfi.embeddings_path(cfi.MODEL_NAME))
+    queries, self_ids = cfi.tuning_queries(ids, embeddings, args.queries)
+    extra = 0 if self_ids is None else 1
+    k_max = max(RECALL_KS)
+    truth = index_tuning.drop_self_hits(index_tuning.exact_top_k(embeddings, ids, queries, k_max + extra),
+                                        self_ids, k_max)
+    n, dim = embeddings.shape
+    del ids, embeddings
+
+    rows = []
+    ctx = mp.get_context("spawn")
+    for spec in args.configs:
+        if spec not in ("flat", "ivf", "hnsw") and pq_spec(spec) is None:
+            print(f"⚠️ Skipping unknown config {spec}")
+            continue
+        if pq_spec(spec) and dim % pq_spec(spec)[0]:
+            print(f"⚠️ Skipping {spec}: pq_m must divide the embedding dim {dim}")
+            continue
+        print(f"\n⏱️ {spec}")
+        with ctx.Pool(1) as pool:   # fresh process → per-config peak RSS
+            rows.append(pool.apply(run_config, (spec, args, queries, self_ids, truth)))
+
+    print(f"\n{len(queries)} queries, n={n}, dim={dim}, batch={args.batch}, recall vs exact search")
+    print(f"{'config':<10}{'params':<22}{'build s':>9}{'tune s':>8}{'index MB':>10}{'peak MB':>9}"
+          f"{'1q QPS':>9}{'1q p50':>8}{'1q p99':>8}{'batch QPS':>11}{'R@1':>7}{'R@10':>7}{'R@100':>7}")
+    for row in rows:
+        print(f"{row['config']:<10}{row['params']:<22}{row['build_s']:>9.2f}{row['tune_s']:>8.2f}"
+              f"{row['index_mb']:>10.1f}{row['peak_rss_mb']:>9.0f}{row['single_qps']:>9.0f}"
+              f"{row['single_p50_ms']:>8.3f}{row['single_p99_ms']:>8.3f}{row['batch_qps']:>11.0f}"
+              f"{row['recall@1']:>7.3f}{row['recall@10']:>7.3f}{row['recall@100']:>7.3f}")
+
+    out = cfi.INDEX_DIR / f"index_benchmark_{cfi.config.fandom_name}_{cfi.MODEL_NAME.split('/')[-1]}.csv"
+    with open(out, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"✅ Benchmark written to {out}")
+
+if __name__ == "__main__":
+    main()
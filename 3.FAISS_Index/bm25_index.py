@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+In-process BM25 inverted index over the paragraph texts, the lexical first stage next to the
+dense FAISS index (5.Retrieval/retreive.py --retriever bm25 | hybrid). It indexes the same
+rows 2.Embeddings/create_embeddings.py encodes: master_csv_<fandom>.csv paragraphs with text,
+so dense and BM25 hits always come from one document set.
+
+    python bm25_index.py
+    → BM25_index_<fandom>.npz
+
+Postings are plain arrays in CSR layout: the documents of term t are
+doc_ids[offsets[t]:offsets[t+1]] (sorted) with their term frequencies, next to per-document
+lengths and packed (article_id, paragraph_id) keys. As in the embedding store, only
+near-duplicate cluster representatives (paragraph_dedup.py) are indexed; hits on a
+representative are expanded to its copies at query time.
+
+Top-k uses MaxScore pruning, term-at-a-time over NumPy arrays. Each term's upper bound (its
+best BM25 contribution in any document) is stored at build time. Query terms are processed in
+decreasing bound order. Once the current k-th best score is above the sum of the bounds of
+the remaining terms, no unseen document can reach the top-k, and the remaining terms only
+update the surviving candidates (a binary search into their postings) instead of scattering
+their full posting lists.
+
+An index_tuning.ArticleFilter (exclude / article range) drops filtered documents before they
+are scored, so they never take a top-k slot.
+"""
+import re
+import csv
+import sys
+from collections import Counter
+from pathlib import Path
+import numpy as np
+
+CONFIG_DIR = Path("/home/sundeep/Fandom-Span-Identification-and-Retrieval/1.Fandom_Dataset_Collection/scripts")
+sys.path.append(str(CONFIG_DIR))
+import config
+import paragraph_dedup
+import paragraph_store
+
+# ===== Config you may tweak =====
+K1 = 1.2
+B = 0.75
+# =================================
+
+PROJECT_ROOT = config.BASE_DIR.parents[1]
+INDEX_DIR = PROJECT_ROOT / "3.FAISS_Index"
+BM25_INDEX_PATH = INDEX_DIR / f"BM25_index_{config.fandom_name}.npz"
+PARAGRAPH_BITS = paragraph_store.PARAGRAPH_BITS
+
+TOKEN_RE = re.compile(r"\w+")
+
+def tokenize(text) -> list:
+    return TOKEN_RE.findall(str(text).lower()) if text is not None else []
+
+def build_index(master_csv: Path = paragraph_dedup.MASTER_CSV, member_to_rep: dict = None,
+                k1: float = K1, b: float = B) -> dict:
+    """Arrays of the index (see module docstring), from one streaming pass over the master CSV."""
+    csv.field_size_limit(sys.maxsize)
+    member_to_rep = member_to_rep or {}
+    vocab, keys, doc_lengths = {}, [], []
+    post_terms, post_docs, post_tfs = [], [], []        # one entry per (document, distinct term)
+    seen = set()
+    with open(master_csv, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            try:
+                key = (int(row["article_id"]), int(row["paragraph_id"]))
+            except (TypeError, ValueError):
+                continue
+            if key in seen or member_to_rep.get(key, key) != key:   # first copy / representatives only
+                continue
+            text = (row.get("paragraph_text") or "").strip()
+            if not text:                                          # not embedded either
+                continue
+            seen.add(key)
+            doc = len(keys)
+            tokens = tokenize(text)
+            keys.append((key[0] << PARAGRAPH_BITS) | key[1])
+            doc_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                post_terms.append(vocab.setdefault(term, len(vocab)))
+                post_docs.append(doc)
+                post_tfs.append(tf)
+
+    post_terms = np.asarray(post_terms, dtype="int32")
+    order = np.argsort(post_terms, kind="stable")      # by term, documents stay ascending within a term
+    doc_ids = np.asarray(post_docs, dtype="int32")[order]
+    tfs = np.asarray(post_tfs, dtype="int32")[order]
+    df = np.bincount(post_terms, minlength=len(vocab))
+    offsets = np.zeros(len(vocab) + 1, dtype="int64")
+    np.cumsum(df, out=offsets[1:])
+
+    doc_lengths = np.asarray(doc_lengths, dtype="int32")
+    n_docs = len(doc_lengths)
+    avgdl = float(doc_lengths.mean()) if n_docs else 0.0
+    idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype("float32")
+    # per-term upper bound: best contribution over its postings
+    norm = k1 * (1 - b + b * doc_lengths / max(avgdl, 1e-9))
+    contrib = tfs * (k1 + 1) / (tfs + norm[doc_ids])
+    max_score = np.zeros(len(vocab), dtype="float32")
+    nonempty = df > 0
+    if len(contrib):
+        max_score[nonempty] = np.maximum.reduceat(contrib, offsets[:-1][nonempty]) * idf[nonempty]
+
+    terms = np.empty(len(vocab), dtype=object)
+    for term, t in vocab.items():
+        terms[t] = term
+    return {"terms": terms.astype(str), "offsets": offsets, "doc_ids": doc_ids, "tfs": tfs,
+            "doc_lengths": doc_lengths, "keys": np.asarray(keys, dtype="int64"), "idf": idf,
+            "max_score": max_score, "params": np.array([k1, b, avgdl], dtype="float64")}
+
+def save_index(arrays: dict, path: Path = BM25_INDEX_PATH):
+    tmp = Path(f"{path}.tmp.npz")
+    np.savez(tmp, **arrays)
+    tmp.replace(path)
+
+class BM25Index:
+    """Loaded index; search() returns packed (article_id, paragraph_id) ids and BM25 scores."""
+    def __init__(self, path: Path = BM25_INDEX_PATH):
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {name: data[name] for name in data.files}
+        self.vocab = {term: t for t, term in enumerate(arrays["terms"].tolist())}
+        self.offsets, self.doc_ids, self.tfs = arrays["offsets"], arrays["doc_ids"], arrays["tfs"]
+        self.keys, self.idf, self.max_score = arrays["keys"], arrays["idf"], arrays["max_score"]
+        self.doc_articles = self.keys >> PARAGRAPH_BITS
+        self.k1, self.b, self.avgdl = arrays["params"].tolist()
+        self.doc_norm = (self.k1 * (1 - self.b + self.b * arrays["doc_lengths"] / max(self.avgdl, 1e-9))).astype("float32")
+        self._acc = np.zeros(len(self.keys), dtype="float32")   # reused score accumulator
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _contrib(self, t: int, lo: int, hi: int):
+        docs, tfs = self.doc_ids[lo:hi], self.tfs[lo:hi]
+        return docs, self.idf[t] * tfs * (self.k1 + 1) / (tfs + self.doc_norm[docs])
+
+    def search_one(self, query: str, k: int, article_filter=None):
+        """(packed ids, scores), best first, at most k; documents sharing no term with the query are not returned."""
+        counts = Counter(t for t in (self.vocab.get(token) for token in tokenize(query)) if t is not None)
+        if not counts or k <= 0:
+            return np.zeros(0, dtype="int64"), np.zeros(0, dtype="float32")
+        terms = sorted(counts, key=lambda t: -self.max_score[t] * counts[t])
+        bounds = np.array([self.max_score[t] * counts[t] for t in terms], dtype="float64")
+        remaining = np.concatenate([np.cumsum(bounds[::-1])[::-1], [0.0]])   # bound of terms i.. onwards
+
+        acc = self._acc
+        touched = []          # essential phase: every posting is scored
+        candidates = None     # non-essential phase: only these documents can still make the top-k
+        for i, t in enumerate(terms):
+            lo, hi = int(self.offsets[t]), int(self.offsets[t + 1])
+            if candidates is None:
+                docs, scores = self._contrib(t, lo, hi)
+                if article_filter:
+                    keep = article_filter.mask(self.doc_articles[docs])
+                    docs, scores = docs[keep], scores[keep]
+                acc[docs] += counts[t] * scores
+                touched.append(docs)
+                seen = np.unique(np.concatenate(touched)) if len(touched) > 1 else docs
+                if len(seen) > k and i + 1 < len(terms):
+                    threshold = np.partition(acc[seen], len(seen) - k)[len(seen) - k]
+                    if remaining[i + 1] < threshold:          # unseen documents can no longer reach the top-k
+                        candidates = seen[acc[seen] + remaining[i + 1] >= threshold]
+            else:
+                postings = self.doc_ids[lo:hi]
+                at = np.minimum(np.searchsorted(postings, candidates), hi - lo - 1)
+                hit = postings[at] == candidates
+                if hit.any():
+                    docs, tfs = candidates[hit], self.tfs[lo:hi][at[hit]]
+                    acc[docs] += counts[t] * self.idf[t] * tfs * (self.k1 + 1) / (tfs + self.doc_norm[docs])
+                if len(candidates) > k and i + 1 < len(terms):
+                    threshold = np.partition(acc[candidates], len(candidates) - k)[len(candidates) - k]
+                    candidates = candidates[acc[candidates] + remaining[i + 1] >= threshold]
+
+        docs = np.unique(np.concatenate(touched)) if candidates is None else candidates
+        scores = acc[docs].copy()
+        acc[np.concatenate(touched)] = 0.0
+        if len(docs) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            docs, scores = docs[top], scores[top]
+        order = np.lexsort((docs, -scores))             # score desc, then document order
+        return self.keys[docs[order]], scores[order]
+
+    def search(self, queries, k: int, article_filters=None):
+        """Per query (packed ids, scores) for a batch of query strings, optionally one ArticleFilter per query."""
+        article_filters = article_filters or [None] * len(queries)
+        return [self.search_one(query, k, article_filter) for query, article_filter in zip(queries, article_filters)]
+
+def main():
+    if not paragraph_dedup.MASTER_CSV.exists():
+        print(f"❌ Missing input: {paragraph_dedup.MASTER_CSV} (run 9.master_csv.py first)")
+        return
+    member_to_rep = paragraph_dedup.load_clusters()
+    arrays = build_index(paragraph_dedup.MASTER_CSV, member_to_rep)
+    INDEX_DIR.mkdir(parents=True, exist_ok=True)
+    save_index(arrays, BM25_INDEX_PATH)
+    print(f"✅ BM25 index: {len(arrays['keys'])} paragraphs, {len(arrays['terms'])} terms, "
+          f"{len(arrays['doc_ids'])} postings → {BM25_INDEX_PATH}")
+
+if __name__ == "__main__":
+    main()
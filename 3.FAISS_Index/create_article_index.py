@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Per-article centroid index for article-level retrieval (5.Retrieval/article_search.py).
+
+Each article is represented by the L2-normalized mean of its paragraph vectors; near-duplicate
+copies (paragraph_dedup.py) contribute the representative's vector to their own article. The
+matrix is summed in one streaming pass over the embedding store, so only one float32 row per
+article is held in memory.
+
+    python create_article_index.py
+    → FAISS_article_index_<fandom>_<model>.faiss   (IDMap2(FlatIP), ids = article_id)
+
+create_faiss_index.py rebuilds it after every full or --delta paragraph index build, so
+centroid mode never serves articles the paragraph index no longer has.
+"""
+import sys
+import numpy as np
+import faiss
+
+import create_faiss_index as cfi
+from create_faiss_index import MODEL_NAME, embedding_store, write_index
+import paragraph_dedup
+
+CHUNK_ROWS = 65536
+
+def article_index_path(model_name: str):
+    model_short = model_name.split("/")[-1]
+    return cfi.INDEX_DIR / f"FAISS_article_index_{cfi.config.fandom_name}_{model_short}.faiss"
+
+def article_centroids(embeddings_npy, rep_members):
+    """(article_ids, normalized centroid matrix) from a streaming pass over the store."""
+    # one (packed rep id, article) pair per extra copy, sorted by rep id
+    copies = [(rep, a) for rep, members in rep_members.items() for a, _ in members[1:]]
+    copy_reps = embedding_store.pack_paragraph_ids([rep for rep, _ in copies])
+    copy_articles = np.asarray([a for _, a in copies], dtype="int64")
+    order = np.argsort(copy_reps, kind="stable")
+    copy_reps, copy_articles = copy_reps[order], copy_articles[order]
+    sums, counts = {}, {}
+    for ids, matrix in embedding_store.iter_embedding_chunks(embeddings_npy, CHUNK_ROWS):
+        ids = np.asarray(ids, dtype="int64")
+        owners = ids >> embedding_store.PARAGRAPH_BITS
+        rows = np.arange(len(ids))
+        rep_rows = np.flatnonzero(np.isin(ids, copy_reps))
+        if len(rep_rows):
+            lo = np.searchsorted(copy_reps, ids[rep_rows], side="left")
+            n = np.searchsorted(copy_reps, ids[rep_rows], side="right") - lo
+            at = np.repeat(lo - (np.cumsum(n) - n), n) + np.arange(int(n.sum()))
+            owners = np.concatenate([owners, copy_articles[at]])
+            rows = np.concatenate([rows, np.repeat(rep_rows, n)])
+        uniq, inverse = np.unique(owners, return_inverse=True)
+        chunk_sums = np.zeros((len(uniq), matrix.shape[1]), dtype="float64")
+        np.add.at(chunk_sums, inverse, matrix[rows])
+        chunk_counts = np.bincount(inverse, minlength=len(uniq))
+        for a, s, c in zip(uniq.tolist(), chunk_sums, chunk_counts.tolist()):
+            if a in sums:
+                sums[a] += s
+                counts[a] += c
+            else:
+                sums[a], counts[a] = s, c
+    article_ids = np.array(sorted(sums), dtype="int64")
+    centroids = np.stack([sums[a] / counts[a] for a in article_ids.tolist()]).astype("float32")
+    faiss.normalize_L2(centroids)
+    return article_ids, centroids
+
+def build_article_index(emb_npy):
+    rep_members = paragraph_dedup.members_by_rep(paragraph_dedup.load_clusters())
+    article_ids, centroids = article_centroids(emb_npy, rep_members)
+    index = faiss.IndexIDMap2(faiss.IndexFlatIP(centroids.shape[1]))
+    index.add_with_ids(centroids, article_ids)
+    out = article_index_path(MODEL_NAME)
+    write_index(index, out)
+    print(f"✅ Article centroid index: {index.ntotal} articles, dim={centroids.shape[1]} → {out}")
+
+def main():
+    emb_npy = cfi.embeddings_path(MODEL_NAME)
+    if not emb_npy.exists():
+        print(f"ERROR: Embeddings file not found:\n  {emb_npy}\nRun create_embeddings.py first.")
+        sys.exit(1)
+    build_article_index(emb_npy)
+
+if __name__ == "__main__":
+    main()
@@ -1,65 +1,277 @@
 #!/usr/bin/env python3
+import argparse
 import faiss
 import numpy as np
-import pickle
+import os
 import sys
+import time
 from pathlib import Path
 
 CONFIG_DIR = Path("/home/sundeep/Fandom-Span-Identification-and-Retrieval/1.Fandom_Dataset_Collection/scripts")
 sys.path.append(str(CONFIG_DIR))
 import config
+import article_delta
 # ===== Config you may tweak =====
 MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+INDEX_TYPE = "flat"          # --index-type flat | ivf | ivfpq | hnsw
+NLIST = 0                    # IVF cells; 0 → ~4*sqrt(n), at least 39 training points per cell
+PQ_M = 48                    # ivfpq: bytes per vector (8-bit sub-quantizers); must divide the dim
+OPQ = False                  # ivfpq: learn a rotation (OPQ) before PQ
+RESCORE = 4                  # ivfpq: re-score RESCORE*k candidates with exact mmap vectors (0/1 = off)
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+TARGET_RECALL = 0.95         # auto-tuning: recall@TUNE_K vs. exact search on held-out queries
+TUNE_K = 10
+TUNE_QUERIES = 1000
+SEED = 0
 # =================================
 
 # Infer project root from config.BASE_DIR = ".../1.Fandom_Dataset_Collection/raw_data"
 PROJECT_ROOT = config.BASE_DIR.parents[1]
 EMB_DIR = PROJECT_ROOT / "2.Embeddings"
 INDEX_DIR = PROJECT_ROOT / "3.FAISS_Index"
+QUERIES_CSV = PROJECT_ROOT / "4.Query" / f"queries_{config.fandom_name}_{MODEL_NAME.split('/')[-1]}.csv"
+
+sys.path.append(str(EMB_DIR))
+# FAISS ids are the packed (article_id, paragraph_id) keys of the embedding store, so every
+# paragraph keeps a stable id across rebuilds and all paragraphs of one article share the high bits.
+import embedding_store
+from embedding_store import PARAGRAPH_BITS
+import index_tuning
 
 def embeddings_path(model_name: str) -> Path:
     model_short = model_name.split("/")[-1]
-    return EMB_DIR / f"embeddings_{config.fandom_name}_{model_short}.pkl"
+    return EMB_DIR / f"embeddings_{config.fandom_name}_{model_short}.npy"
 
 def index_path(model_name: str) -> Path:
     model_short = model_name.split("/")[-1]
     INDEX_DIR.mkdir(parents=True, exist_ok=True)
     return INDEX_DIR / f"FAISS_index_{config.fandom_name}_{model_short}.faiss"
 
-def load_embeddings(embeddings_pkl: Path):
-    with open(embeddings_pkl, 'rb') as f:
-        embeddings_dict = pickle.load(f)
-    print(f"Loaded embeddings from {embeddings_pkl} (items={len(embeddings_dict)})")
-    return embeddings_dict
+def load_embeddings(embeddings_npy: Path):
+    ids, embeddings, meta = embedding_store.load_embeddings(embeddings_npy)   # memory-mapped, no copy
+    print(f"Loaded embeddings from {embeddings_npy} (items={len(ids)}, dim={meta['dim']}, model={meta['model']})")
+    return ids, embeddings
 
-def create_faiss_index(embeddings_dict):
-    embeddings = np.array(list(embeddings_dict.values()), dtype='float32')
+def create_faiss_index(ids, embeddings):
     if embeddings.ndim != 2:
         print(f"Unexpected embeddings shape: {embeddings.shape}")
         sys.exit(1)
-    faiss.normalize_L2(embeddings)                     # cosine-ready
-    index = faiss.IndexFlatIP(embeddings.shape[1])     # inner product == cosine after L2 norm
-    index.add(embeddings)
+    # rows are stored L2-normalized → inner product == cosine;
+    # IDMap2 keeps packed (article_id, paragraph_id) ids
+    index = faiss.IndexIDMap2(faiss.IndexFlatIP(embeddings.shape[1]))
+    index.add_with_ids(embeddings, ids)
     print(f"FAISS index built: dim={embeddings.shape[1]}, ntotal={index.ntotal}")
     return index
 
+def default_nlist(n: int) -> int:
+    return max(1, min(int(4 * np.sqrt(n)), n // 39))
+
+def create_ivf_index(ids, embeddings, nlist: int):
+    """IVF-Flat with its own id storage (ids live in the inverted lists, so remove_ids works)."""
+    n, dim = embeddings.shape
+    nlist = nlist or default_nlist(n)
+    index = faiss.IndexIVFFlat(faiss.IndexFlatIP(dim), dim, nlist, faiss.METRIC_INNER_PRODUCT)
+    rng = np.random.default_rng(SEED)
+    train_rows = np.sort(rng.choice(n, size=min(n, 256 * nlist), replace=False))
+    t0 = time.perf_counter()
+    index.train(np.ascontiguousarray(embeddings[train_rows]))
+    index.add_with_ids(embeddings, ids)
+    print(f"FAISS IVF-Flat built: nlist={nlist}, trained on {len(train_rows)}, ntotal={index.ntotal} "
+          f"({time.perf_counter() - t0:.1f}s)")
+    return index
+
+def create_ivfpq_index(ids, embeddings, nlist: int, pq_m: int, opq: bool):
+    """(OPQ+)IVF-PQ: pq_m bytes of code per vector instead of 4*dim; ids live in the inverted lists."""
+    n, dim = embeddings.shape
+    if dim % pq_m:
+        print(f"ERROR: --pq-m {pq_m} must divide the embedding dim {dim}.")
+        sys.exit(1)
+    nlist = nlist or default_nlist(n)
+    factory = f"{f'OPQ{pq_m},' if opq else ''}IVF{nlist},PQ{pq_m}"
+    index = faiss.index_factory(dim, factory, faiss.METRIC_INNER_PRODUCT)
+    rng = np.random.default_rng(SEED)
+    # 8-bit PQ needs ~39 * 256 points per sub-quantizer codebook, IVF ~39 per cell
+    train_rows = np.sort(rng.choice(n, size=min(n, max(256 * nlist, 64 * 256)), replace=False))
+    t0 = time.perf_counter()
+    index.train(np.ascontiguousarray(embeddings[train_rows]))
+    index.add_with_ids(embeddings, ids)
+    print(f"FAISS {factory} built: trained on {len(train_rows)}, ntotal={index.ntotal}, "
+          f"{index_tuning.bytes_per_vector(index):.1f} bytes/vector ({time.perf_counter() - t0:.1f}s)")
+    return index
+
+def create_hnsw_index(ids, embeddings, m: int = HNSW_M, ef_construction: int = HNSW_EF_CONSTRUCTION):
+    dim = embeddings.shape[1]
+    hnsw = faiss.IndexHNSWFlat(dim, m, faiss.METRIC_INNER_PRODUCT)
+    hnsw.hnsw.efConstruction = ef_construction
+    index = faiss.IndexIDMap2(hnsw)
+    t0 = time.perf_counter()
+    index.add_with_ids(embeddings, ids)
+    print(f"FAISS HNSW built: M={m}, efConstruction={ef_construction}, ntotal={index.ntotal} "
+          f"({time.perf_counter() - t0:.1f}s)")
+    return index
+
+def tuning_queries(ids, embeddings, n_queries: int):
+    """
+    Held-out queries for the auto-tuner: the real query set when 4.Query has produced one,
+    otherwise a sample of paragraph vectors (their own id is then ignored in every top-k).
+    Returns (float32 queries, self ids or None).
+    """
+    rng = np.random.default_rng(SEED)
+    if QUERIES_CSV.exists():
+        import pandas as pd
+        from inference_backend import load_encoder
+        texts = pd.read_csv(QUERIES_CSV)["query"].astype(str).tolist()
+        texts = [texts[i] for i in rng.choice(len(texts), size=min(n_queries, len(texts)), replace=False)]
+        model = load_encoder(MODEL_NAME, config.INFERENCE_BACKEND)
+        queries = np.asarray(model.encode(texts, convert_to_tensor=False, show_progress_bar=False), dtype="float32")
+        faiss.normalize_L2(queries)
+        print(f"Tuning on {len(queries)} queries from {QUERIES_CSV}")
+        return queries, None
+    rows = np.sort(rng.choice(len(ids), size=min(n_queries, len(ids)), replace=False))
+    print(f"Tuning on {len(rows)} held-out paragraph vectors (no query set at {QUERIES_CSV})")
+    return np.ascontiguousarray(embeddings[rows], dtype="float32"), ids[rows]
+
+def tune_index(index, index_type: str, ids, embeddings, target: float, k: int, n_queries: int,
+               build: dict = None) -> dict:
+    """Pick nprobe / efSearch for recall@k ≥ target against exact search; returns the params record."""
+    queries, self_ids = tuning_queries(ids, embeddings, n_queries)
+    extra = 0 if self_ids is None else 1
+    truth = index_tuning.drop_self_hits(index_tuning.exact_top_k(embeddings, ids, queries, k + extra), self_ids, k)
+    build = build or {}
+    if index_type in ("ivf", "ivfpq"):
+        rescore = build.get("rescore", 0)
+        rescorer = index_tuning.ExactRescorer(ids, embeddings) if rescore > 1 else None
+        value, curve = index_tuning.tune_nprobe(index, queries, truth, k, target, self_ids, rescorer, rescore)
+        params = {**build, "nlist": index_tuning.ivf_of(index).nlist, "nprobe": value}
+    else:
+        value, curve = index_tuning.tune_ef_search(index, queries, truth, k, target, self_ids)
+        hnsw = index_tuning.hnsw_of(index)
+        params = {"M": HNSW_M, "efConstruction": hnsw.efConstruction, "efSearch": value}
+    recall = next(point["recall"] for point in curve if point["value"] == value)
+    if recall < target:
+        print(f"⚠️ recall@{k} target {target} not reached; using the largest setting ({recall:.4f})")
+    else:
+        print(f"✅ {'efSearch' if index_type == 'hnsw' else 'nprobe'}={value}: recall@{k}={recall:.4f}")
+    index_tuning.apply_search_params(index, params)
+    return {
+        "index_type": index_type,
+        **params,
+        "target_recall": target,
+        "k": k,
+        "recall": recall,
+        "tuning_queries": len(queries),
+        "tuning_source": "queries" if self_ids is None else "paragraphs",
+        "curve": curve,
+        "ntotal": int(index.ntotal),
+        "bytes_per_vector": index_tuning.bytes_per_vector(index),
+        "tuned_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+def update_faiss_index(index, ids, embeddings, delta):
+    """
+    Remove the ids of changed/deleted articles (and ids no longer in the embeddings, e.g. former
+    duplicate-cluster representatives) and add the re-embedded paragraphs, in place. Works for
+    the flat (IDMap2) and IVF / IVF-PQ indexes; new vectors are assigned to the existing cells and
+    codebooks without retraining.
+    """
+    try:
+        present = index_tuning.index_ids(index)
+    except ValueError:
+        print("Saved index has no id map (built before delta support); rebuild it without --delta.")
+        sys.exit(1)
+
+    stale = np.fromiter(article_delta.stale_article_ids(delta), dtype="int64")
+    fresh = np.fromiter(article_delta.new_article_ids(delta), dtype="int64")
+
+    to_remove = present[np.isin(present >> PARAGRAPH_BITS, stale) | ~np.isin(present, ids)]
+    removed = index.remove_ids(faiss.IDSelectorBatch(to_remove)) if len(to_remove) else 0
+
+    present = index_tuning.index_ids(index)
+    rows = np.flatnonzero(np.isin(ids >> PARAGRAPH_BITS, fresh) | ~np.isin(ids, present))
+    if len(rows):
+        index.add_with_ids(np.ascontiguousarray(embeddings[rows]), ids[rows])
+
+    print(f"FAISS index updated: removed={removed}, added={len(rows)}, ntotal={index.ntotal}")
+    return index
+
+def write_index(index, idx_path: Path):
+    tmp = idx_path.with_suffix(".faiss.tmp")
+    faiss.write_index(index, str(tmp))
+    os.replace(tmp, idx_path)
+
+def build_index(index_type: str, ids, embeddings, args):
+    build = {}
+    if index_type == "ivf":
+        index = create_ivf_index(ids, embeddings, args.nlist)
+    elif index_type == "ivfpq":
+        index = create_ivfpq_index(ids, embeddings, args.nlist, args.pq_m, args.opq)
+        build = {"pq_m": args.pq_m, "opq": args.opq, "rescore": args.rescore}
+    elif index_type == "hnsw":
+        index = create_hnsw_index(ids, embeddings)
+    else:
+        return create_faiss_index(ids, embeddings), {"index_type": "flat", "ntotal": len(ids)}
+    return index, tune_index(index, index_type, ids, embeddings, args.target_recall, args.k, args.tune_queries, build)
+
 def main():
-    emb_pkl = embeddings_path(MODEL_NAME)
+    parser = argparse.ArgumentParser(description="Build (or --delta patch) the FAISS index over the embedding store.")
+    parser.add_argument("--delta", action="store_true",
+                        help="Patch the saved index with article_delta_<fandom>.json instead of rebuilding it.")
+    parser.add_argument("--index-type", choices=["flat", "ivf", "ivfpq", "hnsw"], default=INDEX_TYPE)
+    parser.add_argument("--nlist", type=int, default=NLIST, help="IVF cells (0 = auto).")
+    parser.add_argument("--pq-m", type=int, default=PQ_M, help="ivfpq code size in bytes per vector.")
+    parser.add_argument("--opq", action="store_true", default=OPQ, help="ivfpq: add an OPQ rotation.")
+    parser.add_argument("--rescore", type=int, default=RESCORE,
+                        help="ivfpq: re-score rescore*k candidates with exact vectors (0 = off).")
+    parser.add_argument("--target-recall", type=float, default=TARGET_RECALL)
+    parser.add_argument("--k", type=int, default=TUNE_K, help="k of the tuning recall@k.")
+    parser.add_argument("--tune-queries", type=int, default=TUNE_QUERIES)
+    args = parser.parse_args()
+
+    emb_npy = embeddings_path(MODEL_NAME)
     idx_path = index_path(MODEL_NAME)
 
-    if not emb_pkl.exists():
-        print(f"ERROR: Embeddings file not found:\n  {emb_pkl}\n"
-              f"Run embed_paragraphs.py first (same MODEL_NAME & config).")
+    if not emb_npy.exists():
+        print(f"ERROR: Embeddings file not found:\n  {emb_npy}\n"
+              f"Run create_embeddings.py first (same MODEL_NAME & config).")
         sys.exit(1)
 
-    emb_dict = load_embeddings(emb_pkl)
-    if not emb_dict:
+    ids, embeddings = load_embeddings(emb_npy)
+    if not len(ids):
         print("No embeddings found; aborting.")
         sys.exit(1)
 
-    index = create_faiss_index(emb_dict)
-    faiss.write_index(index, str(idx_path))
-    print(f"Saved FAISS index to {idx_path}\nDone.")
+    # --delta: patch the saved index with article_delta_<fandom>.json instead of rebuilding it
+    if args.delta:
+        delta = article_delta.load_delta()
+        if delta is None or not idx_path.exists():
+            print(f"ERROR: --delta needs a pending delta ({article_delta.DELTA_PATH}) "
+                  f"and a saved index ({idx_path}).")
+            sys.exit(1)
+        article_delta.print_delta_summary(delta)
+        params = index_tuning.load_params(idx_path)
+        if params["index_type"] == "hnsw":
+            # HNSW graphs cannot drop vectors → rebuild with the saved efSearch instead of re-tuning
+            print("HNSW index cannot remove vectors; rebuilding it.")
+            index = create_hnsw_index(ids, embeddings, params["M"], params["efConstruction"])
+        else:
+            index = update_faiss_index(faiss.read_index(str(idx_path)), ids, embeddings, delta)
+        index_tuning.apply_search_params(index, params)
+        params["ntotal"] = int(index.ntotal)
+    else:
+        index, params = build_index(args.index_type, ids, embeddings, args)
+
+    write_index(index, idx_path)
+    index_tuning.save_params(idx_path, params)
+    print(f"Saved FAISS index to {idx_path} (+ {index_tuning.params_path(idx_path).name})")
+
+    # Article centroids come from the same store → rebuild them so centroid mode stays in sync
+    from create_article_index import build_article_index
+    build_article_index(emb_npy)
+
+    # The saved index now reflects the current crawl → it becomes the baseline for the next delta
+    article_delta.commit_delta()
+    print("Done.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,279 @@
+"""
+Approximate-index helpers shared by create_faiss_index.py and the retrieval side.
+
+Approximate indexes (IVF-Flat, IVF-PQ, HNSW) are tuned against exact search: for a sample of
+held-out queries, the exact top-k from a brute-force scan is the ground truth, and the
+search knob (nprobe for IVF, efSearch for HNSW) is raised until recall@k reaches the
+target. The chosen parameters are written next to the index:
+
+    FAISS_index_<fandom>_<model>.faiss
+    FAISS_index_<fandom>_<model>.params.json   {"index_type", "nlist", "nprobe" | "efSearch", "recall", ...}
+
+apply_search_params() sets them again after faiss.read_index(). Compressed (PQ) indexes can
+re-score a larger candidate list with exact vectors from the embedding matrix
+(ExactRescorer, params["rescore"] = candidates per result).
+
+ArticleFilter turns article-level predicates (exclude some articles, keep an article range)
+into a FAISS IDSelector over the packed ids, so filtered paragraphs are skipped inside the
+index scan instead of being over-fetched and dropped afterwards.
+"""
+import os
+import json
+import time
+import tempfile
+from pathlib import Path
+import faiss
+import numpy as np
+
+from embedding_store import PARAGRAPH_BITS   # the packed id layout FAISS ids and IDSelector ranges use
+
+NPROBE_CANDIDATES = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096]
+EF_SEARCH_CANDIDATES = [16, 32, 64, 128, 256, 512, 1024, 2048, 4096]
+
+def params_path(idx_path: Path) -> Path:
+    return Path(idx_path).with_suffix(".params.json")
+
+def save_params(idx_path: Path, params: dict):
+    with open(params_path(idx_path), "w", encoding="utf-8") as f:
+        json.dump(params, f, indent=2)
+
+def load_params(idx_path: Path) -> dict:
+    """Saved build/search parameters; {"index_type": "flat"} for indexes built before tuning existed."""
+    path = params_path(idx_path)
+    if not path.exists():
+        return {"index_type": "flat"}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def ivf_of(index):
+    """The IVF part of an index (bare or wrapped), or None."""
+    try:
+        return faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return None
+
+def hnsw_of(index):
+    index = faiss.downcast_index(index.index) if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)) else index
+    return index.hnsw if hasattr(index, "hnsw") else None
+
+def index_ids(index) -> np.ndarray:
+    """All ids stored in an IDMap-wrapped or IVF index."""
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        return faiss.vector_to_array(index.id_map)
+    ivf = ivf_of(index)
+    if ivf is None:
+        raise ValueError(f"{type(index).__name__} does not keep ids")
+    invlists = ivf.invlists
+    parts = [faiss.rev_swig_ptr(invlists.get_ids(l), invlists.list_size(l)).copy()
+             for l in range(ivf.nlist) if invlists.list_size(l)]
+    return np.concatenate(parts) if parts else np.zeros(0, dtype="int64")
+
+def apply_search_params(index, params: dict):
+    if "nprobe" in params and ivf_of(index) is not None:
+        ivf_of(index).nprobe = int(params["nprobe"])
+    if "efSearch" in params and hnsw_of(index) is not None:
+        hnsw_of(index).efSearch = int(params["efSearch"])
+    return index
+
+# read_index flags that keep the vectors in the file. IO_FLAG_MMAP only maps inverted lists;
+# flat codes (IndexFlat, also under IDMap2 / HNSW) need the in-place IFC reader.
+MMAP_FLAGS = {
+    "ivf": faiss.IO_FLAG_MMAP,
+    "ivfpq": faiss.IO_FLAG_MMAP,
+    "flat": getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP),
+    "hnsw": getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP),
+}
+
+def open_index(idx_path: Path, mmap: bool = True):
+    """
+    read_index + saved search params. With mmap the vectors stay in the file (read-only,
+    paged in on demand and shared between processes), using the flag that maps this index
+    type (MMAP_FLAGS); indexes this FAISS build cannot map are read normally.
+    """
+    params = load_params(idx_path)
+    index = None
+    if mmap:
+        flag = MMAP_FLAGS.get(params.get("index_type", "flat"), faiss.IO_FLAG_MMAP)
+        try:
+            index = faiss.read_index(str(idx_path), flag | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            index = None
+    if index is None:
+        index = faiss.read_index(str(idx_path))
+    return apply_search_params(index, params), params
+
+def exact_top_k(embeddings: np.ndarray, ids: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """Ground-truth ids of the exact inner-product top-k (brute force, no index copy of the matrix)."""
+    _, rows = faiss.knn(queries, embeddings, k, metric=faiss.METRIC_INNER_PRODUCT)
+    return np.where(rows >= 0, ids[np.clip(rows, 0, None)], -1)
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray, k: int) -> float:
+    """Mean |approx top-k ∩ exact top-k| / k over the queries."""
+    return float(np.mean([len(np.intersect1d(f[:k][f[:k] >= 0], t[:k])) / k for f, t in zip(found, truth)]))
+
+def drop_self_hits(results: np.ndarray, self_ids, k: int) -> np.ndarray:
+    """For paragraph-vector queries: remove each query's own id, keep the next k."""
+    if self_ids is None:
+        return results[:, :k]
+    out = np.full((len(results), k), -1, dtype="int64")
+    for i, (row, own) in enumerate(zip(results, self_ids)):
+        row = row[row != own][:k]
+        out[i, :len(row)] = row
+    return out
+
+class ExactRescorer:
+    """
+    Re-scores index candidates with exact inner products from the embedding matrix (usually the
+    memory-mapped store), so only the few rows that are candidates are ever read.
+    """
+    def __init__(self, ids: np.ndarray, embeddings: np.ndarray):
+        self.order = np.argsort(ids, kind="stable")
+        self.sorted_ids = ids[self.order]
+        self.embeddings = embeddings
+
+    def rows(self, cand_ids: np.ndarray) -> np.ndarray:
+        pos = np.clip(np.searchsorted(self.sorted_ids, cand_ids), 0, len(self.sorted_ids) - 1)
+        rows = self.order[pos]
+        return np.where((cand_ids >= 0) & (self.sorted_ids[pos] == cand_ids), rows, -1)
+
+    def rescore(self, queries: np.ndarray, cand_ids: np.ndarray, k: int):
+        """(scores, ids) of the exact top-k among each query's candidates."""
+        rows = self.rows(cand_ids)
+        valid = rows >= 0
+        flat = np.unique(rows[valid])   # sorted → sequential reads from the mmap
+        vecs = np.asarray(self.embeddings[flat], dtype="float32")
+        scores = np.full(rows.shape, -np.inf, dtype="float32")
+        for i in range(len(queries)):
+            at = np.searchsorted(flat, rows[i][valid[i]])
+            scores[i, valid[i]] = vecs[at] @ queries[i]
+        top = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        top_ids = np.where(np.isfinite(top_scores), np.take_along_axis(cand_ids, top, axis=1), -1)
+        return top_scores, top_ids
+
+class ArticleFilter:
+    """
+    Keep paragraphs whose article is in [min_article, max_article] (either bound optional) and
+    not in `exclude`. Ids are packed (article_id << PARAGRAPH_BITS) | paragraph_id, so every
+    article is one contiguous id range and each condition is an IDSelectorRange.
+    """
+    def __init__(self, exclude=(), min_article=None, max_article=None):
+        self.exclude = tuple(sorted({int(a) for a in exclude}))
+        self.min_article = None if min_article is None else int(min_article)
+        self.max_article = None if max_article is None else int(max_article)
+        self._refs = []            # the C++ selectors only borrow their children
+        self.selector = self._build()
+
+    @property
+    def key(self):
+        return self.exclude, self.min_article, self.max_article
+
+    def __bool__(self):
+        return self.selector is not None
+
+    def _article_range(self, lo, hi):
+        """Ids of articles lo..hi (inclusive; None = unbounded)."""
+        lo_id = 0 if lo is None else lo << PARAGRAPH_BITS
+        hi_id = np.iinfo("int64").max if hi is None else (hi + 1) << PARAGRAPH_BITS
+        return self._keep(faiss.IDSelectorRange(lo_id, hi_id))
+
+    def _keep(self, selector):
+        self._refs.append(selector)
+        return selector
+
+    def _build(self):
+        parts = []
+        if self.min_article is not None or self.max_article is not None:
+            parts.append(self._article_range(self.min_article, self.max_article))
+        if self.exclude:
+            excluded = self._article_range(self.exclude[0], self.exclude[0])
+            for a in self.exclude[1:]:
+                excluded = self._keep(faiss.IDSelectorOr(excluded, self._article_range(a, a)))
+            parts.append(self._keep(faiss.IDSelectorNot(excluded)))
+        if not parts:
+            return None
+        selector = parts[0]
+        for part in parts[1:]:
+            selector = self._keep(faiss.IDSelectorAnd(selector, part))
+        return selector
+
+    def mask(self, article_ids) -> np.ndarray:
+        """Same predicate on article ids, for results produced outside FAISS."""
+        article_ids = np.asarray(article_ids, dtype="int64")
+        keep = ~np.isin(article_ids, self.exclude) if self.exclude else np.ones(len(article_ids), dtype=bool)
+        if self.min_article is not None:
+            keep &= article_ids >= self.min_article
+        if self.max_article is not None:
+            keep &= article_ids <= self.max_article
+        return keep
+
+    def keeps(self, article_id) -> bool:
+        return (article_id not in self.exclude
+                and (self.min_article is None or article_id >= self.min_article)
+                and (self.max_article is None or article_id <= self.max_article))
+
+    def search_params(self, index):
+        """SearchParameters carrying the selector and the index's current nprobe / efSearch."""
+        if ivf_of(index) is not None:
+            params = faiss.SearchParametersIVF()
+            params.nprobe = ivf_of(index).nprobe
+        elif hnsw_of(index) is not None:
+            params = faiss.SearchParametersHNSW()
+            params.efSearch = hnsw_of(index).efSearch
+        else:
+            params = faiss.SearchParameters()
+        params.sel = self.selector
+        return params
+
+def search(index, queries: np.ndarray, k: int, rescorer: ExactRescorer = None, rescore: int = 0,
+           article_filter: ArticleFilter = None):
+    """index.search, or with a rescorer: fetch rescore*k candidates and keep the exact top-k.
+    An article_filter is applied inside the scan."""
+    params = article_filter.search_params(index) if article_filter else None
+    if rescorer is None or rescore <= 1:
+        return index.search(queries, k, params=params)
+    _, cand_ids = index.search(queries, k * rescore, params=params)
+    return rescorer.rescore(queries, cand_ids, k)
+
+def _sweep(index, set_param, candidates, queries, truth, k, target, self_ids, rescorer=None, rescore=0):
+    curve = []
+    extra = 0 if self_ids is None else 1
+    for value in candidates:
+        set_param(value)
+        t0 = time.perf_counter()
+        _, found = search(index, queries, k + extra, rescorer, rescore)
+        ms = 1000 * (time.perf_counter() - t0) / len(queries)
+        recall = recall_at_k(drop_self_hits(found, self_ids, k), truth, k)
+        curve.append({"value": value, "recall": recall, "ms_per_query": ms})
+        print(f"   {value:>6}: recall@{k}={recall:.4f}, {ms:.3f} ms/query")
+        if recall >= target:
+            return value, curve
+    return candidates[-1], curve
+
+def tune_nprobe(index, queries, truth, k: int, target: float, self_ids=None, rescorer=None, rescore=0):
+    ivf = ivf_of(index)
+    candidates = [n for n in NPROBE_CANDIDATES if n < ivf.nlist] + [ivf.nlist]
+    note = f", exact re-scoring of {rescore}x candidates" if rescorer is not None and rescore > 1 else ""
+    print(f"🎛️ Tuning nprobe (nlist={ivf.nlist}{note}) for recall@{k} ≥ {target}")
+    return _sweep(index, lambda n: setattr(ivf, "nprobe", n), candidates, queries, truth, k, target, self_ids,
+                  rescorer, rescore)
+
+def tune_ef_search(index, queries, truth, k: int, target: float, self_ids=None):
+    hnsw = hnsw_of(index)
+    candidates = [ef for ef in EF_SEARCH_CANDIDATES if ef >= k] or [k]
+    print(f"🎛️ Tuning efSearch for recall@{k} ≥ {target}")
+    return _sweep(index, lambda ef: setattr(hnsw, "efSearch", ef), candidates, queries, truth, k, target, self_ids)
+
+def index_bytes(index) -> int:
+    """On-disk size of the index, written to a temp file (serialize_index would copy it into RAM)."""
+    fd, path = tempfile.mkstemp(suffix=".faiss")
+    os.close(fd)
+    try:
+        faiss.write_index(index, path)
+        return os.stat(path).st_size
+    finally:
+        os.remove(path)
+
+def bytes_per_vector(index) -> float:
+    """Serialized index size / ntotal (codes + ids + list overhead; trained tables amortized)."""
+    return index_bytes(index) / max(1, index.ntotal)
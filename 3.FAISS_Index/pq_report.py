@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Recall vs. bytes-per-vector for IVF-PQ code sizes (with and without OPQ), next to the
+flat and IVF-Flat baselines, on the same held-out queries the auto-tuner uses.
+
+    python pq_report.py [--nprobe 16] [--k 10] [--rescore 4] [--pq-m 16 32 48 ...]
+
+Recall is against exact search; "+rescore" re-scores rescore*k candidates with the exact
+vectors of the memory-mapped embedding matrix. Results also go to
+pq_report_<fandom>_<model>.csv in 3.FAISS_Index.
+"""
+import csv
+import time
+import argparse
+import numpy as np
+
+import create_faiss_index as cfi
+import index_tuning
+
+def evaluate(index, queries, truth, self_ids, k, rescorer=None, rescore=0):
+    extra = 0 if self_ids is None else 1
+    t0 = time.perf_counter()
+    _, found = index_tuning.search(index, queries, k + extra, rescorer, rescore)
+    ms = 1000 * (time.perf_counter() - t0) / len(queries)
+    return index_tuning.recall_at_k(index_tuning.drop_self_hits(found, self_ids, k), truth, k), ms
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--nlist", type=int, default=cfi.NLIST)
+    parser.add_argument("--k", type=int, default=cfi.TUNE_K)
+    parser.add_argument("--rescore", type=int, default=cfi.RESCORE)
+    parser.add_argument("--pq-m", type=int, nargs="+", default=[8, 16, 24, 32, 48, 64, 96])
+    parser.add_argument("--tune-queries", type=int, default=cfi.TUNE_QUERIES)
+    args = parser.parse_args()
+
+    ids, embeddings = cfi.load_embeddings(cfi.embeddings_path(cfi.MODEL_NAME))
+    dim = embeddings.shape[1]
+    queries, self_ids = cfi.tuning_queries(ids, embeddings, args.tune_queries)
+    extra = 0 if self_ids is None else 1
+    truth = index_tuning.drop_self_hits(index_tuning.exact_top_k(embeddings, ids, queries, args.k + extra),
+                                        self_ids, args.k)
+    rescorer = index_tuning.ExactRescorer(ids, embeddings)
+
+    rows = [{"index": "flat", "bytes_per_vector": 4 * dim + 8, "recall": 1.0, "ms_per_query": None}]
+
+    ivf = cfi.create_ivf_index(ids, embeddings, args.nlist)
+    index_tuning.ivf_of(ivf).nprobe = args.nprobe
+    recall, ms = evaluate(ivf, queries, truth, self_ids, args.k)
+    rows.append({"index": f"IVF{index_tuning.ivf_of(ivf).nlist},Flat",
+                 "bytes_per_vector": index_tuning.bytes_per_vector(ivf), "recall": recall, "ms_per_query": ms})
+    del ivf
+
+    for pq_m in [m for m in args.pq_m if dim % m == 0]:
+        for opq in (False, True):
+            index = cfi.create_ivfpq_index(ids, embeddings, args.nlist, pq_m, opq)
+            index_tuning.ivf_of(index).nprobe = args.nprobe
+            name = f"{f'OPQ{pq_m},' if opq else ''}IVF{index_tuning.ivf_of(index).nlist},PQ{pq_m}"
+            size = index_tuning.bytes_per_vector(index)
+            recall, ms = evaluate(index, queries, truth, self_ids, args.k)
+            rows.append({"index": name, "bytes_per_vector": size, "recall": recall, "ms_per_query": ms})
+            if args.rescore > 1:
+                recall, ms = evaluate(index, queries, truth, self_ids, args.k, rescorer, args.rescore)
+                rows.append({"index": f"{name} +rescore{args.rescore}", "bytes_per_vector": size,
+                             "recall": recall, "ms_per_query": ms})
+
+    print(f"\nrecall@{args.k} vs exact, nprobe={args.nprobe}, {len(queries)} queries, n={len(ids)}, dim={dim}")
+    print(f"{'index':<32}{'bytes/vec':>11}{'× smaller':>11}{f'R@{args.k}':>9}{'ms/query':>10}")
+    for row in rows:
+        ms = "" if row["ms_per_query"] is None else f"{row['ms_per_query']:.3f}"
+        print(f"{row['index']:<32}{row['bytes_per_vector']:>11.1f}{rows[0]['bytes_per_vector'] / row['bytes_per_vector']:>11.1f}"
+              f"{row['recall']:>9.4f}{ms:>10}")
+
+    out = cfi.INDEX_DIR / f"pq_report_{cfi.config.fandom_name}_{cfi.MODEL_NAME.split('/')[-1]}.csv"
+    with open(out, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"✅ Report written to {out}")
+
+if __name__ == "__main__":
+    main()
@@ -67,7 +67,8 @@ def create_query_csv(input_csv: Path, output_csv: Path):
 
         writer = csv.DictWriter(
             outfile,
-            fieldnames=["paragraph_text", "linked_word", "q_id", "query", "correct_article_id"]
+            fieldnames=["paragraph_text", "linked_word", "q_id", "query", "correct_article_id",
+                        "source_article_id", "source_paragraph_id"]
         )
         writer.writeheader()
 
@@ -105,7 +106,9 @@ def create_query_csv(input_csv: Path, output_csv: Path):
                     "linked_word": word,
                     "q_id": q_id,
                     "query": query,
-                    "correct_article_id": cid
+                    "correct_article_id": cid,
+                    "source_article_id": row.get("article_id"),      # the query's own article / paragraph,
+                    "source_paragraph_id": row.get("paragraph_id"),  # for filtered retrieval (--exclude-source)
                 })
                 q_id += 1
                 written += 1
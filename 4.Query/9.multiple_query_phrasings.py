@@ -63,7 +63,7 @@ def generate_sampled_queries(input_csv: str, output_dir: str):
     for version, template in query_formats.items():
         out_path = os.path.join(output_dir, f"sampled_queries_{version}.csv")
         with open(out_path, mode="w", encoding="utf-8", newline="") as outfile:
-            fieldnames = ["query", "linked_word", "q_id", "correct_article_id"]
+            fieldnames = ["query", "linked_word", "q_id", "correct_article_id", "source_article_id"]
             writer = csv.DictWriter(outfile, fieldnames=fieldnames)
             writer.writeheader()
 
@@ -85,6 +85,7 @@ def generate_sampled_queries(input_csv: str, output_dir: str):
                     "linked_word": word,
                     "q_id": row.get("q_id", ""),
                     "correct_article_id": row.get("correct_article_id", ""),
+                    "source_article_id": row.get("source_article_id", ""),
                 })
 
         print(f"[ok] Wrote {out_path}")
@@ -0,0 +1,174 @@
+"""
+Article-level search: rank articles instead of paragraphs.
+
+Retrieval is judged per article (retrieved_article_id == correct_article_id), but a paragraph
+top-k spends most of its slots on further paragraphs of articles already found. Two modes:
+
+- paragraph aggregation (search_articles): paragraph hits are grouped per article and
+  scored by their max, or by the sum of their best top_n. The paragraph index is over-fetched
+  adaptively — k * FETCH_FACTOR first, doubling only for the queries that are not settled —
+  until the top-k articles can no longer change. For "max" that is as soon as k distinct
+  articles have been seen; for "sum" once no unseen or partly seen article can still
+  overtake the k-th one.
+- centroid index (CentroidSearch): one normalized mean vector per article
+  (3.FAISS_Index/create_article_index.py), searched for k * CENTROID_CANDIDATES articles,
+  which are then re-ranked by their exact best paragraph from the memory-mapped embeddings:
+  the paragraph rows of all candidates of a group of queries are read in one sorted gather,
+  scored with one matmul and reduced per (query, article) with np.maximum.reduceat.
+
+Both return, per query, [(article_id, best paragraph_id, score)] best first — the same
+rows as a paragraph search, so the recall bookkeeping in retreive.py is unchanged.
+Near-duplicate copies (paragraph_dedup.py) count for their own articles.
+"""
+import numpy as np
+
+import embedding_store
+import index_tuning
+
+AGGREGATIONS = ("max", "sum")
+FETCH_FACTOR = 4             # first paragraph fetch = k * FETCH_FACTOR
+MAX_FETCH = 1 << 16          # give up widening past this many paragraphs per query
+CENTROID_CANDIDATES = 2      # centroid mode: re-rank k * CENTROID_CANDIDATES articles exactly
+CENTROID_ROW_BUDGET = 1 << 16  # centroid mode: paragraph rows gathered per re-ranking step
+CENTROID_QUERY_CHUNK = 64      # centroid mode: at most this many queries per re-ranking step
+
+def _expand_hits(scores, ids, rep_members):
+    """(article_id, paragraph_id, score) in score order, representatives expanded to their copies."""
+    keys = embedding_store.unpack_paragraph_ids(ids[ids >= 0]).tolist()
+    for (article_id, paragraph_id), score in zip(keys, scores[ids >= 0].tolist()):
+        for member in (rep_members or {}).get((article_id, paragraph_id), [(article_id, paragraph_id)]):
+            yield member[0], member[1], score
+
+def rank_articles(hits, k: int, agg: str = "max", top_n: int = 3, exhausted: bool = False):
+    """
+    hits: (article_id, paragraph_id, score) in descending score order, possibly a prefix of
+    the full ranking. Returns (top-k [(article_id, best paragraph_id, score)], settled), where
+    settled means more paragraphs could not change which articles are in the top-k.
+    """
+    best, total, count = {}, {}, {}
+    last = None
+    for article_id, paragraph_id, score in hits:
+        last = score
+        if article_id not in best:
+            best[article_id], total[article_id], count[article_id] = (paragraph_id, score), 0.0, 0
+        if count[article_id] < top_n:
+            total[article_id] += score
+            count[article_id] += 1
+    value = {a: best[a][1] for a in best} if agg == "max" else total
+    order = sorted(value, key=lambda a: -value[a])
+    top = [(a, best[a][0], value[a]) for a in order[:k]]
+    if exhausted or last is None:
+        return top, True
+    if agg == "max":
+        return top, len(order) >= k
+    if len(order) < k:
+        return top, False
+    # sum: every hit still to come scores ≤ last
+    remaining = {a: (top_n - count[a]) * last for a in order}
+    lower = min(value[a] + min(0.0, remaining[a]) for a in order[:k])
+    upper = max([last, top_n * last] + [value[a] + max(0.0, remaining[a]) for a in order[k:]])
+    return top, lower >= upper
+
+def search_articles(index, queries: np.ndarray, k: int, agg: str = "max", top_n: int = 3,
+                    rescorer=None, rescore: int = 0, rep_members=None):
+    """Per query: top-k articles by aggregated paragraph score (adaptive over-fetch)."""
+    results = [None] * len(queries)
+    pending = np.arange(len(queries))
+    fetch = k * FETCH_FACTOR
+    while len(pending):
+        fetch_k = min(fetch, index.ntotal, MAX_FETCH)
+        scores, ids = index_tuning.search(index, queries[pending], fetch_k, rescorer, rescore)
+        unsettled = []
+        for row, q in enumerate(pending):
+            exhausted = fetch_k >= min(index.ntotal, MAX_FETCH) or ids[row, -1] < 0
+            top, settled = rank_articles(_expand_hits(scores[row], ids[row], rep_members), k, agg, top_n, exhausted)
+            if settled:
+                results[q] = top
+            else:
+                unsettled.append(q)
+        pending = np.asarray(unsettled, dtype="int64")
+        fetch *= 2
+    return results
+
+def _ranges(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Concatenation of arange(start, start + length) for every (start, length), without a Python loop."""
+    offsets = np.cumsum(lengths) - lengths
+    return np.repeat(starts - offsets, lengths) + np.arange(int(lengths.sum()))
+
+class CentroidSearch:
+    """
+    Article centroid index + exact re-ranking of the candidate articles by their best paragraph.
+    ids/embeddings are the paragraph embedding store (memory-mapped); rep_members adds each
+    near-duplicate copy to its own article with the representative's row.
+    """
+    def __init__(self, centroid_index, ids: np.ndarray, embeddings: np.ndarray, rep_members=None):
+        self.index = centroid_index
+        self.embeddings = embeddings
+        ids = np.asarray(ids, dtype="int64")
+        article_ids, paragraph_ids = (a.astype("int64") for a in embedding_store.unpack_paragraph_ids(ids).T)
+        rows = np.arange(len(ids), dtype="int64")
+        if rep_members:
+            copies = [(rep, a, p) for rep, members in rep_members.items() for a, p in members[1:]]
+            if copies:
+                copy_reps = embedding_store.pack_paragraph_ids([rep for rep, _, _ in copies])
+                order = np.argsort(ids, kind="stable")
+                at = np.minimum(np.searchsorted(ids, copy_reps, sorter=order), len(ids) - 1)
+                found = ids[order[at]] == copy_reps           # representatives that have a vector
+                copy_keys = np.asarray([(a, p) for _, a, p in copies], dtype="int64")[found]
+                rows = np.concatenate([rows, order[at[found]]])
+                article_ids = np.concatenate([article_ids, copy_keys[:, 0]])
+                paragraph_ids = np.concatenate([paragraph_ids, copy_keys[:, 1]])
+        order = np.argsort(article_ids, kind="stable")
+        self.rows, self.paragraph_ids = rows[order], paragraph_ids[order]
+        self.articles, self.starts = np.unique(article_ids[order], return_index=True)
+        self.ends = np.append(self.starts[1:], len(order))
+
+    def _best_paragraphs(self, queries: np.ndarray, query_of: np.ndarray, at: np.ndarray):
+        """For (query, article position) pairs: (best paragraph id, its score) of that article."""
+        lengths = self.ends[at] - self.starts[at]
+        entries = _ranges(self.starts[at], lengths)
+        rows, inverse = np.unique(self.rows[entries], return_inverse=True)   # sorted → sequential mmap reads
+        local, query_pos = np.unique(query_of, return_inverse=True)
+        sims = np.asarray(self.embeddings[rows], dtype="float32") @ queries[local].T
+        sims = sims[inverse, np.repeat(query_pos, lengths)]
+        seg_starts = np.cumsum(lengths) - lengths
+        best = np.maximum.reduceat(sims, seg_starts)
+        hits = np.flatnonzero(sims == np.repeat(best, lengths))
+        _, first = np.unique(np.repeat(np.arange(len(at)), lengths)[hits], return_index=True)
+        return self.paragraph_ids[entries[hits[first]]], best
+
+    def search(self, queries: np.ndarray, k: int):
+        queries = np.ascontiguousarray(queries, dtype="float32")
+        _, cand = self.index.search(queries, k * CENTROID_CANDIDATES)
+        query_of, rank = np.nonzero(cand >= 0)             # by query, then centroid rank
+        articles = cand[query_of, rank]
+        at = np.minimum(np.searchsorted(self.articles, articles), len(self.articles) - 1)
+        known = self.articles[at] == articles
+        query_of, at = query_of[known], at[known]
+
+        # groups of whole queries, each within the row budget (a single query may exceed it)
+        rows_per_query = np.bincount(query_of, weights=self.ends[at] - self.starts[at], minlength=len(queries))
+        paragraphs = np.zeros(len(at), dtype="int64")
+        scores = np.zeros(len(at), dtype="float32")
+        q0 = 0
+        while q0 < len(queries):
+            q1, budget = q0 + 1, rows_per_query[q0]
+            while q1 < len(queries) and q1 - q0 < CENTROID_QUERY_CHUNK and budget + rows_per_query[q1] <= CENTROID_ROW_BUDGET:
+                budget += rows_per_query[q1]
+                q1 += 1
+            lo, hi = np.searchsorted(query_of, [q0, q1])
+            if hi > lo:
+                paragraphs[lo:hi], scores[lo:hi] = self._best_paragraphs(queries, query_of[lo:hi], at[lo:hi])
+            q0 = q1
+
+        order = np.lexsort((-scores, query_of))            # per query by score desc, centroid rank on ties
+        bounds = np.searchsorted(query_of[order], np.arange(len(queries) + 1))
+        results = []
+        for q in range(len(queries)):
+            top = order[bounds[q]:bounds[q + 1]][:k]
+            results.append(list(zip(self.articles[at[top]].tolist(), paragraphs[top].tolist(), scores[top].tolist())))
+        return results
+
+def open_centroid_search(centroid_path, ids, embeddings, rep_members=None) -> CentroidSearch:
+    index, _ = index_tuning.open_index(centroid_path, mmap=True)
+    return CentroidSearch(index, ids, embeddings, rep_members)
@@ -0,0 +1,112 @@
+"""
+Vectorized evaluation of ranked runs, shared by retreive.py and 6.Re-Rank/rerank.py.
+
+Everything is derived from one number per query: the rank (1-based) of the first hit whose
+article is the query's correct article, 0 if there is none. From an (n_queries x k) matrix
+of retrieved article ids that is a single NumPy pass, and then
+
+    recall@k  = share of queries with 0 < first_hit_rank <= k
+    MRR       = mean of 1 / first_hit_rank (0 for misses)
+    nDCG@k    = mean of 1 / log2(first_hit_rank + 1) within k (one relevant article per query)
+
+    python evaluation.py <run> [<run> ...]     # e.g. 5.Retrieval/retrieval_run_<fandom>_<model>
+"""
+import os
+import csv
+import sys
+import json
+import logging
+import numpy as np
+import pandas as pd
+
+import embedding_store
+import run_store
+
+SUMMARY_KS = (1, 3, 5, 10, 100, 1000)            # columns of the summary CSV rows
+NDCG_KS = (10, 100)
+HISTOGRAM_EDGES = (1, 2, 3, 5, 10, 20, 50, 100, 200, 500, 1000)
+SUMMARY_HEADER = ["Version"] + [f"Recall@{k}" for k in SUMMARY_KS] + ["Overall"]
+
+def first_hit_ranks(article_ids: np.ndarray, correct_article_ids: np.ndarray) -> np.ndarray:
+    """(n_queries,) 1-based rank of the first retrieved id equal to the query's correct id, 0 = miss."""
+    article_ids = np.asarray(article_ids)
+    hits = article_ids == np.asarray(correct_article_ids).reshape(-1, 1)
+    if hits.shape[1] == 0:
+        return np.zeros(hits.shape[0], dtype="int64")
+    found = hits.any(axis=1)
+    return np.where(found, hits.argmax(axis=1) + 1, 0)
+
+def recall_at(ranks: np.ndarray, k: int) -> float:
+    return float(np.mean((ranks > 0) & (ranks <= k))) if len(ranks) else 0.0
+
+def mrr(ranks: np.ndarray) -> float:
+    return float(np.mean(np.where(ranks > 0, 1.0 / np.maximum(ranks, 1), 0.0))) if len(ranks) else 0.0
+
+def ndcg_at(ranks: np.ndarray, k: int) -> float:
+    gain = np.where((ranks > 0) & (ranks <= k), 1.0 / np.log2(np.maximum(ranks, 1) + 1), 0.0)
+    return float(np.mean(gain)) if len(ranks) else 0.0
+
+def rank_histogram(ranks: np.ndarray, edges=HISTOGRAM_EDGES) -> dict:
+    """{"1": n, "2": n, "3-5": n, ..., ">1000": n, "miss": n} of first-hit ranks."""
+    hist, lo = {}, 1
+    for hi in edges:
+        hist[str(hi) if hi == lo else f"{lo}-{hi}"] = int(np.sum((ranks >= lo) & (ranks <= hi)))
+        lo = hi + 1
+    hist[f">{edges[-1]}"] = int(np.sum(ranks > edges[-1]))
+    hist["miss"] = int(np.sum(ranks == 0))
+    return hist
+
+def evaluate(article_ids: np.ndarray, correct_article_ids: np.ndarray, ks=SUMMARY_KS) -> dict:
+    return evaluate_ranks(first_hit_ranks(article_ids, correct_article_ids), ks)
+
+def evaluate_ranks(ranks: np.ndarray, ks=SUMMARY_KS) -> dict:
+    """All metrics from precomputed first-hit ranks (1-based, 0 = miss)."""
+    ranks = np.asarray(ranks)
+    return {
+        "n_queries": int(len(ranks)),
+        **{f"recall@{k}": recall_at(ranks, k) for k in ks},
+        "overall": float(np.mean(ranks > 0)) if len(ranks) else 0.0,
+        "mrr": mrr(ranks),
+        **{f"ndcg@{k}": ndcg_at(ranks, k) for k in NDCG_KS},
+        "first_hit_histogram": rank_histogram(ranks),
+    }
+
+def run_article_matrix(run: run_store.Run):
+    """(article id matrix with -1 padding, correct article ids) of a run."""
+    ids = np.asarray(run.ids)
+    article_ids = np.where(ids >= 0, ids >> embedding_store.PARAGRAPH_BITS, -1)
+    correct = pd.to_numeric(run.queries["correct_article_id"], errors="coerce").fillna(-2).astype("int64").to_numpy()
+    return article_ids, correct
+
+def evaluate_run(run_path, ks=SUMMARY_KS) -> dict:
+    return evaluate(*run_article_matrix(run_store.Run(run_path)), ks)
+
+def log_metrics(metrics: dict, title: str):
+    logging.info(f"\n ==================={title}======================")
+    for key, value in metrics.items():
+        if key.startswith("recall@"):
+            logging.info(f"Average Recall@{key[len('recall@'):]}: {value:.4f}")
+    logging.info(f"Average Overall Recall: {metrics['overall']:.4f}")
+    logging.info(f"MRR: {metrics['mrr']:.4f}")
+    for k in NDCG_KS:
+        logging.info(f"nDCG@{k}: {metrics[f'ndcg@{k}']:.4f}")
+    logging.info("First-hit rank histogram: " + ", ".join(f"{b}: {n}" for b, n in metrics["first_hit_histogram"].items()))
+    logging.info(f"\n ==================={title} End======================")
+
+def append_summary(summary_path, label: str, metrics: dict, header: bool = False):
+    """One "<label>, Recall@1..Recall@1000, Overall" row; header=True writes SUMMARY_HEADER into a new file."""
+    new_file = not os.path.isfile(summary_path)
+    with open(summary_path, mode='a', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        if header and new_file:
+            writer.writerow(SUMMARY_HEADER)
+        writer.writerow([label] + [metrics[f"recall@{k}"] for k in SUMMARY_KS] + [metrics["overall"]])
+
+def save_metrics(path, metrics: dict):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(metrics, f, indent=2)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    for path in sys.argv[1:]:
+        log_metrics(evaluate_run(path), path)
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Federated search over many per-fandom FAISS indexes (FAISS_index_<fandom>_<model>.faiss).
+
+Every fandom index is a shard. A batch of queries goes to all shards in parallel (threads,
+or dedicated worker processes that each own a group of shards), every shard returns its
+own top-k, and the per-query lists are merged with a k-way heap into one global top-k.
+Results carry the fandom they came from, because packed (article_id, paragraph_id) ids
+are only unique within one fandom. Like retreive.py, a hit on a near-duplicate cluster
+representative (paragraph_dedup.py) is expanded to every copy, using that fandom's clusters.
+
+FAISS already parallelizes each search with OpenMP, so the shard threads / processes are
+capped at MAX_PARALLEL_SHARDS and each one gets an equal share of the cores.
+
+    python federated_search.py "query text" [--fandoms a b ...] [--k 10] [--workers 0]
+"""
+import os
+import sys
+import heapq
+import argparse
+import itertools
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import multiprocessing as mp
+import numpy as np
+import faiss
+
+CONFIG_DIR = Path("/home/sundeep/Fandom-Span-Identification-and-Retrieval/1.Fandom_Dataset_Collection/scripts")
+sys.path.append(str(CONFIG_DIR))
+import config
+import paragraph_dedup
+# Config
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+PROJECT_ROOT = config.BASE_DIR.parents[1]
+EMBED_DIR    = PROJECT_ROOT / "2.Embeddings"
+INDEX_DIR    = PROJECT_ROOT / "3.FAISS_Index"
+sys.path.append(str(EMBED_DIR))
+sys.path.append(str(INDEX_DIR))
+import embedding_store
+import index_tuning
+from retreive import expand_duplicates
+
+MAX_PARALLEL_SHARDS = 4     # shard searches running at once (threads, or worker processes)
+
+model_short = MODEL_NAME.split("/")[-1]
+
+def omp_threads_per_search(parallel: int) -> int:
+    """OpenMP threads for each of `parallel` concurrent FAISS searches, so together they fill the cores once."""
+    return max(1, (os.cpu_count() or 1) // max(1, parallel))
+
+def clusters_path(fandom: str) -> Path:
+    """paragraph_clusters_<fandom>.csv of any fandom (paragraph_dedup.CLUSTERS_CSV is the configured one)."""
+    return config.BASE_DIR / f"{fandom}_fandom_data" / f"paragraph_clusters_{fandom}.csv"
+
+def index_paths(fandoms=None) -> dict:
+    """{fandom: index path} for the given fandoms, or every fandom with an index for MODEL_NAME."""
+    if fandoms:
+        paths = {f: INDEX_DIR / f"FAISS_index_{f}_{model_short}.faiss" for f in fandoms}
+        missing = [str(p) for p in paths.values() if not p.exists()]
+        if missing:
+            raise FileNotFoundError(f"No FAISS index for: {missing}")
+        return paths
+    prefix, suffix = "FAISS_index_", f"_{model_short}.faiss"
+    paths = {p.name[len(prefix):-len(suffix)]: p for p in sorted(INDEX_DIR.glob(f"{prefix}*{suffix}"))}
+    if not paths:
+        print(f"❌ No FAISS indexes matching {prefix}*{suffix} in {INDEX_DIR}")
+    return paths
+
+class IndexShard:
+    """One fandom's index, memory-mapped with its tuned params, plus its exact re-scorer if it uses one."""
+    def __init__(self, fandom: str, index_path: Path):
+        self.fandom = fandom
+        self.index, self.params = index_tuning.open_index(index_path, mmap=True)
+        self.rescore = int(self.params.get("rescore", 0))
+        self.rescorer = None
+        if self.rescore > 1:
+            ids, embeddings, _ = embedding_store.load_embeddings(EMBED_DIR / f"embeddings_{fandom}_{model_short}.npy")
+            self.rescorer = index_tuning.ExactRescorer(ids, embeddings)
+
+    def search(self, queries: np.ndarray, k: int):
+        return index_tuning.search(self.index, queries, k, self.rescorer, self.rescore)
+
+def _ranked(scores, ids, shard):
+    for s, i in zip(scores, ids):
+        if i >= 0:
+            yield -float(s), shard, int(i)
+
+def merge_top_k(shard_results, k: int):
+    """
+    shard_results: [(scores (nq, k_s), ids (nq, k_s))] per shard, each row sorted by score desc.
+    Returns (scores, shard positions, ids), each (nq, k), padded with -inf / -1 / -1.
+    """
+    nq = len(shard_results[0][0]) if shard_results else 0
+    scores = np.full((nq, k), -np.inf, dtype="float32")
+    shards = np.full((nq, k), -1, dtype="int32")
+    ids = np.full((nq, k), -1, dtype="int64")
+    for q in range(nq):
+        streams = [_ranked(result_scores[q], result_ids[q], shard)
+                   for shard, (result_scores, result_ids) in enumerate(shard_results)]
+        for rank, (neg_score, shard, packed_id) in enumerate(itertools.islice(heapq.merge(*streams), k)):
+            scores[q, rank], shards[q, rank], ids[q, rank] = -neg_score, shard, packed_id
+    return scores, shards, ids
+
+# ----- worker processes: each owns a fixed group of shards -----
+_worker_shards = []
+
+def _open_worker_shards(group, omp_threads: int):
+    global _worker_shards
+    faiss.omp_set_num_threads(omp_threads)
+    _worker_shards = [(pos, IndexShard(fandom, path)) for pos, fandom, path in group]
+
+def _search_worker_shards(queries, k):
+    return [(pos, shard.search(queries, k)) for pos, shard in _worker_shards]
+
+class FederatedSearch:
+    """
+    Search many fandom indexes as one. workers=0 keeps every shard in this process and
+    searches them on threads (FAISS releases the GIL); workers=N spreads the shards over N
+    processes, each opening (mmap) only its own group.
+    """
+    def __init__(self, paths: dict, workers: int = 0):
+        if not paths:
+            raise ValueError("FederatedSearch needs at least one fandom index")
+        self.fandoms = list(paths)
+        self.workers = workers
+        self.rep_members = [paragraph_dedup.members_by_rep(paragraph_dedup.load_clusters(clusters_path(fandom)))
+                            for fandom in self.fandoms]
+        if workers:
+            groups = [[] for _ in range(min(workers, MAX_PARALLEL_SHARDS, len(paths)))]
+            for pos, (fandom, path) in enumerate(paths.items()):
+                groups[pos % len(groups)].append((pos, fandom, str(path)))
+            ctx = mp.get_context("spawn")
+            omp_threads = omp_threads_per_search(len(groups))
+            self.pools = [ProcessPoolExecutor(max_workers=1, mp_context=ctx, initializer=_open_worker_shards,
+                                              initargs=(group, omp_threads)) for group in groups]
+        else:
+            self.shards = [IndexShard(fandom, path) for fandom, path in paths.items()]
+            parallel = min(MAX_PARALLEL_SHARDS, len(self.shards))
+            # the OpenMP thread count is per calling thread → set it in every pool thread
+            self.pool = ThreadPoolExecutor(max_workers=parallel, initializer=faiss.omp_set_num_threads,
+                                           initargs=(omp_threads_per_search(parallel),))
+
+    def search(self, queries: np.ndarray, k: int):
+        """(scores, fandom positions into self.fandoms, packed ids), each (nq, k)."""
+        queries = np.ascontiguousarray(queries, dtype="float32")
+        if self.workers:
+            per_shard = [None] * len(self.fandoms)
+            for fut in [pool.submit(_search_worker_shards, queries, k) for pool in self.pools]:
+                for pos, result in fut.result():
+                    per_shard[pos] = result
+        else:
+            per_shard = list(self.pool.map(lambda shard: shard.search(queries, k), self.shards))
+        return merge_top_k(per_shard, k)
+
+    def results(self, queries: np.ndarray, k: int):
+        """Per query: [(fandom, article_id, paragraph_id, score)] best first, near-duplicate copies expanded."""
+        scores, shards, ids = self.search(queries, k)
+        out = []
+        for q in range(len(scores)):
+            valid = ids[q] >= 0
+            keys = embedding_store.unpack_paragraph_ids(ids[q][valid]).tolist()
+            hits = []
+            for s, (a, p), sc in zip(shards[q][valid], keys, scores[q][valid]):
+                for member_a, member_p, member_sc in expand_duplicates([(a, p, float(sc))], self.rep_members[s], k - len(hits)):
+                    hits.append((self.fandoms[s], member_a, member_p, member_sc))
+                if len(hits) >= k:
+                    break
+            out.append(hits)
+        return out
+
+    def close(self):
+        if self.workers:
+            for pool in self.pools:
+                pool.shutdown()
+        else:
+            self.pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+def main():
+    parser = argparse.ArgumentParser(description="Search several fandom indexes as one.")
+    parser.add_argument("queries", nargs="+")
+    parser.add_argument("--fandoms", nargs="*", help="Default: every fandom with an index in 3.FAISS_Index.")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=0, help="0 = threads in this process.")
+    args = parser.parse_args()
+
+    from inference_backend import load_encoder
+    paths = index_paths(args.fandoms)
+    if not paths:
+        sys.exit(1)
+    print(f"🔎 Federated search over {len(paths)} fandoms: {', '.join(paths)}")
+    model = load_encoder(MODEL_NAME, config.INFERENCE_BACKEND)
+    queries = np.asarray(model.encode(args.queries, convert_to_tensor=False, show_progress_bar=False), dtype="float32")
+    faiss.normalize_L2(queries)
+
+    with FederatedSearch(paths, args.workers) as federated:
+        for query, hits in zip(args.queries, federated.results(queries, args.k)):
+            print(f"\n{query}")
+            for rank, (fandom, article_id, paragraph_id, score) in enumerate(hits, start=1):
+                print(f"  {rank:>3}. [{fandom}] ({article_id}, {paragraph_id})  {score:.4f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""
+Fusion of ranked paragraph lists from several first stages (dense FAISS + BM25), used by
+retreive.py --retriever hybrid.
+
+    rrf       score = sum over lists of weight / (RRF_K + rank)      (rank is 1-based)
+    weighted  score = sum over lists of weight * min-max normalized score within that list
+
+A paragraph missing from a list contributes nothing for it. Ties keep the order in which
+paragraphs were first seen, lists in the order given (dense first).
+"""
+FUSIONS = ("rrf", "weighted")
+RRF_K = 60
+
+def _normalized(scores):
+    lo, hi = min(scores), max(scores)
+    return [1.0] * len(scores) if hi <= lo else [(s - lo) / (hi - lo) for s in scores]
+
+def fuse(result_lists, top_k, fusion="rrf", weights=None, rrf_k=RRF_K):
+    """result_lists: per retriever [(article_id, paragraph_id, score)], best first → fused top_k, same shape."""
+    weights = weights or [1.0] * len(result_lists)
+    fused = {}
+    for results, weight in zip(result_lists, weights):
+        if not results:
+            continue
+        if fusion == "rrf":
+            contributions = [weight / (rrf_k + rank) for rank in range(1, len(results) + 1)]
+        else:
+            contributions = [weight * s for s in _normalized([float(score) for _, _, score in results])]
+        for (article_id, paragraph_id, _), contribution in zip(results, contributions):
+            key = (article_id, paragraph_id)
+            fused[key] = fused.get(key, 0.0) + contribution
+    ranked = sorted(fused.items(), key=lambda item: -item[1])       # stable → first-seen order on ties
+    return [(article_id, paragraph_id, score) for (article_id, paragraph_id), score in ranked[:top_k]]
@@ -2,18 +2,18 @@ import pandas as pd
 import json
 import faiss
 import numpy as np
-import pickle
 import csv
 import os
 import logging
+import argparse
 from pathlib import Path
 
-from sentence_transformers import SentenceTransformer
-
 CONFIG_DIR = Path("/home/sundeep/Fandom-Span-Identification-and-Retrieval/1.Fandom_Dataset_Collection/scripts")
 import sys
 sys.path.append(str(CONFIG_DIR))
 import config
+import paragraph_dedup
+import paragraph_store
 # Config 
 MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
 # Derive project paths from config 
@@ -21,14 +21,30 @@ PROJECT_ROOT   = config.BASE_DIR.parents[1]
 RAW_DATA_DIR   = config.FANDOM_DATA_DIR                   
 QUERY_DIR      = PROJECT_ROOT / "4.Query"
 EMBED_DIR      = PROJECT_ROOT / "2.Embeddings"
+INDEX_DIR      = PROJECT_ROOT / "3.FAISS_Index"
 RETRIEVE_DIR   = PROJECT_ROOT / "5.Retrieval"
+sys.path.append(str(EMBED_DIR))
+sys.path.append(str(INDEX_DIR))
+import embedding_store
+import index_tuning
+import article_search
+import hybrid_search
+import bm25_index
+import evaluation
+import run_store
+from inference_backend import load_encoder
 model_short    = MODEL_NAME.split("/")[-1]
 fandom_name    = config.fandom_name
 # Inputs (aligned with query code’s outputs and raw data layout)
-EMBEDDINGS_PATH   = EMBED_DIR / f"embeddings_{fandom_name}_{model_short}.pkl"   # Pickled dict {(article_id, paragraph_id): np.array(384,)}
+FAISS_INDEX_PATH  = INDEX_DIR / f"FAISS_index_{fandom_name}_{model_short}.faiss" # ids inside are packed (article_id, paragraph_id)
+EMBEDDINGS_PATH   = EMBED_DIR / f"embeddings_{fandom_name}_{model_short}.npy"   # only read when the index re-scores (IVF-PQ) or in centroid mode
+ARTICLE_INDEX_PATH = INDEX_DIR / f"FAISS_article_index_{fandom_name}_{model_short}.faiss" # centroid mode (create_article_index.py)
 MASTER_CSV        = RAW_DATA_DIR / f"master_csv_{fandom_name}.csv"              # Same pattern as query code
 QUERIES_CSV       = QUERY_DIR / f"queries_{fandom_name}_{model_short}.csv"      # Produced by your query script
+QUERY_VERSIONS_DIR = PROJECT_ROOT / "Fandom_Dataset_Collection" / "query" / "query_versions"  # --variants: 9.multiple_query_phrasings.py output
 TITLE_TO_ID_JSON  = RAW_DATA_DIR / f"title_to_id_mapping_{fandom_name}.json"    # Fandom-scoped mapping
+TEXT_STORE        = paragraph_store.STORE_PATH                                  # mmap text store (step 8c); else texts come from MASTER_CSV
+BM25_INDEX_PATH   = bm25_index.BM25_INDEX_PATH                                  # --retriever bm25 | hybrid (3.FAISS_Index/bm25_index.py)
 
 # Outputs (fandom + model aware)
 os.makedirs(RETRIEVE_DIR, exist_ok=True)
@@ -36,50 +52,209 @@ OUTPUT_LOG        = RETRIEVE_DIR / f"retrieval_{fandom_name}_{model_short}.log"
 RETRIEVED_DOCS    = RETRIEVE_DIR / f"retrieved_docs_{fandom_name}_{model_short}.csv"
 QUERY_DOC_SCORES  = RETRIEVE_DIR / f"query_doc_scores_{fandom_name}_{model_short}.csv"
 SUMMARY_METRICS   = RETRIEVE_DIR / f"retrieval_metrics_{fandom_name}_{model_short}.csv"
+RETRIEVAL_RUN     = RETRIEVE_DIR / f"retrieval_run_{fandom_name}_{model_short}"   # run_store: .ids.npy/.scores.npy/.queries.csv/.meta.json
 
 # Retrieval params
-TOP_K = 1000
+TOP_K = 1000                 # paragraphs, or articles in the article/centroid modes
+SEARCH_MODE = "paragraph"    # --mode paragraph | article (aggregate paragraph hits) | centroid (article centroid index)
+ARTICLE_AGG = "max"          # article mode: score an article by its best paragraph, or the sum of its best ARTICLE_TOP_N
+ARTICLE_TOP_N = 3
+RETRIEVER = "dense"          # paragraph mode: --retriever dense | bm25 | hybrid (dense + BM25 fused)
+FUSION = "rrf"               # hybrid: rrf | weighted (min-max normalized scores)
+DENSE_K = 100                # hybrid: dense candidates per query
+SPARSE_K = 1000              # hybrid: BM25 candidates per query
+DENSE_WEIGHT = 0.5           # hybrid: weight of the dense list (BM25 gets 1 - DENSE_WEIGHT)
+EXCLUDE_SOURCE = False       # paragraph mode: --exclude-source drops each query's source_article_id inside the index scan
+ARTICLE_RANGE = None         # paragraph mode: --article-range LO HI keeps articles LO..HI (queries CSV may narrow it
+                             # per query with min_article_id / max_article_id columns)
+QUERY_BATCH_SIZE = 1024      # queries encoded + searched per FAISS call (bounds the top-k result matrices)
+ENCODE_BATCH_SIZE = 256      # transformer batch size inside one query batch
+WRITE_CSV = False            # --csv: also write the full-text RETRIEVED_DOCS / QUERY_DOC_SCORES CSVs
 # Helpers
 
-def load_embeddings(embeddings_pkl):
-    with open(embeddings_pkl, "rb") as f:
-        embeddings_dict = pickle.load(f)
-    logging.info(f"Loaded {len(embeddings_dict)} embeddings from {embeddings_pkl}")
-    return embeddings_dict
-
-def get_paragraph_text(df, article_id, paragraph_id):
-    row = df[(df['article_id'] == article_id) & (df['paragraph_id'] == paragraph_id)]
-    if not row.empty:
-        return row.iloc[0]['paragraph_text']
+def load_faiss_index(index_path):
+    """
+    Open the index written by create_faiss_index.py memory-mapped, with its tuned search params.
+    Returns (index, rescorer or None, rescore factor).
+    """
+    index, params = index_tuning.open_index(index_path, mmap=True)
+    logging.info(f"Loaded FAISS index {index_path} (type={params['index_type']}, ntotal={index.ntotal})")
+    rescore = int(params.get("rescore", 0))
+    if rescore <= 1:
+        return index, None, 0
+    ids, embeddings, meta = embedding_store.load_embeddings(EMBEDDINGS_PATH)   # memory-mapped
+    logging.info(f"Re-scoring {rescore}x candidates with {len(ids)} exact vectors from {EMBEDDINGS_PATH}")
+    return index, index_tuning.ExactRescorer(ids, embeddings), rescore
+
+class RetrievalContext:
+    """
+    What the query functions search with, loaded once per run: the FAISS index and query encoder,
+    the exact re-scorer (IVF-PQ), near-duplicate clusters, and the BM25 / centroid searchers
+    (None unless --retriever / --mode needs them).
+    """
+    def __init__(self, index, model, rescorer=None, rescore=0, rep_members=None, bm25=None, centroid_search=None):
+        self.index, self.model = index, model
+        self.rescorer, self.rescore = rescorer, rescore
+        self.rep_members = rep_members or {}
+        self.bm25, self.centroid_search = bm25, centroid_search
+
+def summary_label():
+    """Row label of this configuration in SUMMARY_METRICS."""
+    label = {"paragraph": {"dense": "L6", "bm25": "BM25", "hybrid": f"L6+BM25-{FUSION}"}[RETRIEVER],
+             "article": f"L6-article-{ARTICLE_AGG}", "centroid": "L6-centroid"}[SEARCH_MODE]
+    if EXCLUDE_SOURCE:
+        label += "-exclude-source"
+    if ARTICLE_RANGE:
+        label += f"-articles-{ARTICLE_RANGE[0]}-{ARTICLE_RANGE[1]}"
+    return label
+
+def build_title_lookup(title_to_id_mapping):
+    """Reverse of title_to_id_mapping: {str(article_id): title}; the first title wins for shared ids."""
+    id_to_title = {}
+    for title, article_id in title_to_id_mapping.items():
+        id_to_title.setdefault(str(article_id), title)
+    return id_to_title
+
+def get_paragraph_text(paragraph_lookup, article_id, paragraph_id):
+    """paragraph_lookup: a paragraph_store.ParagraphStore or its {(article_id, paragraph_id): text} fallback dict."""
+    text = paragraph_lookup.get((article_id, paragraph_id))
+    if text is not None:
+        return text
     return f"Could not find paragraph text for ({article_id},{paragraph_id})."
 
-def get_key(my_dict, val):
-    for key, value in my_dict.items():
-        if str(value) == str(val):
-            return key
-    return None
-
-def create_faiss_index(embeddings_dict):
-    embeddings = np.array(list(embeddings_dict.values())).astype('float32')
-    index = faiss.IndexFlatIP(embeddings.shape[1])  # cosine similarity
-    faiss.normalize_L2(embeddings)
-    index.add(embeddings)
-    id_to_article_paragraph = list(embeddings_dict.keys())
-    return index, id_to_article_paragraph
-
-def query_index(index, query_text, model, id_to_article_paragraph, top_k=5):
-    query_embedding = model.encode([query_text], convert_to_tensor=False)
-    query_embedding = np.array(query_embedding).astype('float32')
-    faiss.normalize_L2(query_embedding)
-    distances, indices = index.search(query_embedding, top_k)
-
-    results = []
-    for i in range(top_k):
-        idx = indices[0, i]
-        article_id, paragraph_id = id_to_article_paragraph[idx]
-        score = distances[0, i]
-        results.append((article_id, paragraph_id, score))
-    return results
+def get_title(id_to_title, article_id):
+    return id_to_title.get(str(article_id))
+
+def encode_queries(model, query_texts):
+    query_embeddings = model.encode(list(query_texts), batch_size=ENCODE_BATCH_SIZE, convert_to_tensor=False,
+                                    show_progress_bar=False)
+    query_embeddings = np.ascontiguousarray(query_embeddings, dtype='float32')
+    faiss.normalize_L2(query_embeddings)
+    return query_embeddings
+
+def query_index(index, query_embeddings, top_k=5, rescorer=None, rescore=0, article_filters=None):
+    """
+    One FAISS call for the whole batch → per query [(article_id, paragraph_id, score)].
+    With article_filters (one index_tuning.ArticleFilter or None per query), queries sharing a
+    filter are searched together with its IDSelector, one call per distinct filter.
+    """
+    if article_filters is None:
+        distances, ids = index_tuning.search(index, query_embeddings, top_k, rescorer, rescore)
+    else:
+        distances = np.full((len(query_embeddings), top_k), -np.inf, dtype="float32")
+        ids = np.full((len(query_embeddings), top_k), -1, dtype="int64")
+        groups = {}
+        for i, article_filter in enumerate(article_filters):
+            groups.setdefault(article_filter.key if article_filter else None, (article_filter, []))[1].append(i)
+        for article_filter, rows in groups.values():
+            distances[rows], ids[rows] = index_tuning.search(index, query_embeddings[rows], top_k, rescorer, rescore,
+                                                             article_filter)
+
+    batch_results = []
+    for row_ids, row_distances in zip(ids, distances):
+        hits = row_ids >= 0   # fewer than top_k hits (approximate indexes)
+        keys = embedding_store.unpack_paragraph_ids(row_ids[hits]).tolist()
+        batch_results.append([(article_id, paragraph_id, score)
+                              for (article_id, paragraph_id), score in zip(keys, row_distances[hits])])
+    return batch_results
+
+def query_bm25(bm25, query_texts, top_k, article_filters=None):
+    """Per query [(article_id, paragraph_id, BM25 score)] from the inverted index."""
+    batch_results = []
+    for ids, scores in bm25.search(query_texts, top_k, article_filters):
+        keys = embedding_store.unpack_paragraph_ids(ids).tolist()
+        batch_results.append([(article_id, paragraph_id, float(score))
+                              for (article_id, paragraph_id), score in zip(keys, scores)])
+    return batch_results
+
+def query_paragraphs(ctx, query_texts, article_filters=None):
+    """Paragraph mode: dense, BM25, or both fused (RETRIEVER); near-duplicate copies expanded."""
+    dense_results = sparse_results = None
+    per_query = article_filters or [None] * len(query_texts)
+    if RETRIEVER != "bm25":
+        dense_k = DENSE_K if RETRIEVER == "hybrid" else TOP_K
+        dense_hits = query_index(ctx.index, encode_queries(ctx.model, query_texts), dense_k,
+                                 ctx.rescorer, ctx.rescore, article_filters)
+        dense_results = [expand_duplicates(results, ctx.rep_members, dense_k, article_filter)
+                         for results, article_filter in zip(dense_hits, per_query)]
+    if RETRIEVER != "dense":
+        sparse_k = SPARSE_K if RETRIEVER == "hybrid" else TOP_K
+        sparse_results = [expand_duplicates(results, ctx.rep_members, sparse_k, article_filter)
+                          for results, article_filter in zip(query_bm25(ctx.bm25, query_texts, sparse_k, article_filters),
+                                                             per_query)]
+    if RETRIEVER == "dense":
+        return dense_results
+    if RETRIEVER == "bm25":
+        return sparse_results
+    return [hybrid_search.fuse([dense, sparse], TOP_K, FUSION, [DENSE_WEIGHT, 1 - DENSE_WEIGHT])
+            for dense, sparse in zip(dense_results, sparse_results)]
+
+def query_articles(ctx, query_embeddings, top_k=5):
+    """Top-k articles per query as (article_id, best paragraph_id, score), one row per article."""
+    if SEARCH_MODE == "centroid":
+        return ctx.centroid_search.search(query_embeddings, top_k)
+    return article_search.search_articles(ctx.index, query_embeddings, top_k, ARTICLE_AGG, ARTICLE_TOP_N,
+                                          ctx.rescorer, ctx.rescore, ctx.rep_members)
+
+def retrieve_batches(sampled_df, ctx):
+    """(row, top-k results) per query; queries are encoded and searched QUERY_BATCH_SIZE at a time."""
+    for start in range(0, len(sampled_df), QUERY_BATCH_SIZE):
+        batch_df = sampled_df.iloc[start:start + QUERY_BATCH_SIZE]
+        query_texts = batch_df['query'].astype(str).tolist()
+        if SEARCH_MODE == "paragraph":
+            batch_results = query_paragraphs(ctx, query_texts, query_filters(batch_df))
+        elif per_query_range_columns(batch_df):
+            raise ValueError(f"{SEARCH_MODE} mode cannot apply the per-query {per_query_range_columns(batch_df)} filters")
+        else:
+            batch_results = query_articles(ctx, encode_queries(ctx.model, query_texts), TOP_K)
+        yield from zip((row for _, row in batch_df.iterrows()), batch_results)
+
+def _bound(value, default, pick):
+    """Combine a per-query bound from the queries CSV (blank = none) with the CLI one."""
+    if value is None or pd.isna(value) or str(value).strip() == "":
+        return default
+    return int(value) if default is None else pick(int(value), default)
+
+def per_query_range_columns(df) -> list:
+    """min_article_id / max_article_id columns of a queries frame that hold at least one bound."""
+    return [c for c in ("min_article_id", "max_article_id")
+            if c in df.columns and pd.to_numeric(df[c], errors="coerce").notna().any()]
+
+def query_filters(batch_df):
+    """
+    One index_tuning.ArticleFilter (or None) per query from --exclude-source / --article-range and
+    the queries CSV columns source_article_id, min_article_id, max_article_id; None when no filter is active.
+    """
+    per_query_range = {"min_article_id", "max_article_id"} & set(batch_df.columns)
+    if not (EXCLUDE_SOURCE or ARTICLE_RANGE or per_query_range):
+        return None
+    lo_default, hi_default = ARTICLE_RANGE or (None, None)
+    filters, cache = [], {}
+    for row in batch_df.to_dict("records"):
+        source = _bound(row.get("source_article_id"), None, max)
+        exclude = (source,) if EXCLUDE_SOURCE and source is not None else ()
+        lo = _bound(row.get("min_article_id"), lo_default, max)
+        hi = _bound(row.get("max_article_id"), hi_default, min)
+        key = (exclude, lo, hi)
+        if key not in cache:
+            cache[key] = index_tuning.ArticleFilter(exclude, lo, hi) or None
+        filters.append(cache[key])
+    return filters
+
+def expand_duplicates(results, rep_members, top_k, article_filter=None):
+    """A hit on a near-duplicate cluster representative counts for every copy, at the same score.
+    Copies in articles the query's filter excludes are skipped."""
+    if not rep_members:
+        return results
+    expanded = []
+    for article_id, paragraph_id, score in results:
+        for member_article_id, member_paragraph_id in rep_members.get((article_id, paragraph_id), [(article_id, paragraph_id)]):
+            if article_filter and not article_filter.keeps(member_article_id):
+                continue
+            expanded.append((member_article_id, member_paragraph_id, score))
+            if len(expanded) >= top_k:
+                return expanded
+    return expanded
 
 def write_retrieved_results_to_file(RETRIEVED_RESULTS_FILE_PATH, retrieved_texts_with_ID):
     file_exists = os.path.isfile(RETRIEVED_RESULTS_FILE_PATH)
@@ -98,146 +273,234 @@ def write_retrieved_results_to_file(RETRIEVED_RESULTS_FILE_PATH, retrieved_texts
 # ===============================
 # Retrieval main loop
 # ===============================
-def retrieve_top_k(sampled_df, fiass_index, model, title_to_id_mapping, query_doc_score_path, retrieved_results_file_path):
-    retrived_texts_recall_overall = []
-    retrived_texts_recall_1 = []
-    retrived_texts_recall_3 = []
-    retrived_texts_recall_5 = []
-    retrived_texts_recall_10 = []
-    retrived_texts_recall_100 = []
-    retrived_texts_recall_1000 = []
-
+def retrieve_top_k(sampled_df, ctx, id_to_title, paragraph_texts, query_doc_score_path, retrieved_results_file_path):
     iteration = 0
     n_rows_in_df = sampled_df.shape[0]
     progress_checkpoint = max(1, n_rows_in_df // 10)
 
+    # Ranked ids + scores per query; text is resolved later by id, only where needed
+    run = run_store.RunWriter(RETRIEVAL_RUN, n_rows_in_df, TOP_K,
+                              {"model": MODEL_NAME, "fandom": fandom_name, "mode": SEARCH_MODE,
+                               "agg": ARTICLE_AGG if SEARCH_MODE == "article" else None,
+                               "retriever": RETRIEVER if SEARCH_MODE == "paragraph" else "dense",
+                               "fusion": FUSION if SEARCH_MODE == "paragraph" and RETRIEVER == "hybrid" else None,
+                               "exclude_source": EXCLUDE_SOURCE, "article_range": ARTICLE_RANGE})
+
     # Write headers
-    with open(query_doc_score_path, mode='w', encoding='utf-8', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow(["query","document","score"])
-    with open(retrieved_results_file_path, mode='w', encoding='utf-8', newline='') as file_2:
-        writer = csv.writer(file_2)
-        writer.writerow([
-            'rank','query_text','correct_article_id',
-            'retrieved_article_id','retrieved_paragraph_id',
-            'correct_article_name','retrieved_article_name',
-            'retrieval_score','retrieved_para_text'
-        ])
-
-    query_recall_list_of_retriever = []
-
-    for _, row in sampled_df.iterrows():
-        query_text, linked_word, q_id, correct_article_id = row['query'], row['linked_word'], row['q_id'], row['correct_article_id']
-        correct_article_name = get_key(title_to_id_mapping, str(correct_article_id))
+    if WRITE_CSV:
+        with open(query_doc_score_path, mode='w', encoding='utf-8', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(["query","document","score"])
+        with open(retrieved_results_file_path, mode='w', encoding='utf-8', newline='') as file_2:
+            writer = csv.writer(file_2)
+            writer.writerow([
+                'rank','query_text','correct_article_id',
+                'retrieved_article_id','retrieved_paragraph_id',
+                'correct_article_name','retrieved_article_name',
+                'retrieval_score','retrieved_para_text'
+            ])
 
-        top_k_results = query_index(fiass_index, query_text, model, id_to_article_paragraph, TOP_K)
+    for row, top_k_results in retrieve_batches(sampled_df, ctx):
+        query_text, linked_word, q_id, correct_article_id = row['query'], row['linked_word'], row['q_id'], row['correct_article_id']
+        run.append(row, top_k_results)
 
         rows = []
-        rows.append((query_text, get_paragraph_text(paragraphs_split_all_df, correct_article_id, 1), 1))
         retrieved_texts_with_ID = []
-        curr_recall_top_1 = curr_recall_top_3 = curr_recall_top_5 = 0
-        curr_recall_top_10 = curr_recall_top_100 = curr_recall_top_1000 = curr_recall_overall = 0
-
+        if WRITE_CSV:
+            correct_article_name = get_title(id_to_title, correct_article_id)
+            rows.append((query_text, get_paragraph_text(paragraph_texts, correct_article_id, 1), 1))
         for rank, (retrieved_article_id, retrieved_paragraph_id, score) in enumerate(top_k_results):
-            if retrieved_article_id == correct_article_id:
-                curr_recall_overall = 1
-                rows.append((query_text, get_paragraph_text(paragraphs_split_all_df, retrieved_article_id, retrieved_paragraph_id), 1))
-            else:
-                rows.append((query_text, get_paragraph_text(paragraphs_split_all_df, retrieved_article_id, retrieved_paragraph_id), 0))
-
-            if rank+1 == 1: curr_recall_top_1 = curr_recall_overall
-            if rank+1 == 3: curr_recall_top_3 = curr_recall_overall
-            if rank+1 == 5: curr_recall_top_5 = curr_recall_overall
-            if rank+1 == 10: curr_recall_top_10 = curr_recall_overall
-            if rank+1 == 100: curr_recall_top_100 = curr_recall_overall
-            if rank+1 == 1000: curr_recall_top_1000 = curr_recall_overall
-
-            retrieved_article_name = get_key(title_to_id_mapping, str(retrieved_article_id))
-            retrieved_para_text = get_paragraph_text(paragraphs_split_all_df, retrieved_article_id, retrieved_paragraph_id)
-            retrieved_text_with_ID = (
-                rank+1, query_text, correct_article_id, retrieved_article_id,
-                retrieved_paragraph_id, correct_article_name, retrieved_article_name,
-                score, retrieved_para_text
-            )
-            retrieved_texts_with_ID.append(retrieved_text_with_ID)
-
-        write_retrieved_results_to_file(retrieved_results_file_path, retrieved_texts_with_ID)
-
-        retrived_texts_recall_overall.append(curr_recall_overall)
-        retrived_texts_recall_1.append(curr_recall_top_1)
-        retrived_texts_recall_3.append(curr_recall_top_3)
-        retrived_texts_recall_5.append(curr_recall_top_5)
-        retrived_texts_recall_10.append(curr_recall_top_10)
-        retrived_texts_recall_100.append(curr_recall_top_100)
-        retrived_texts_recall_1000.append(curr_recall_top_1000)
-
-        query_recall_list_of_retriever.append(
-            (query_text, curr_recall_top_1, curr_recall_top_3, curr_recall_top_5,
-             curr_recall_top_10, curr_recall_top_100, curr_recall_top_1000, curr_recall_overall)
-        )
-
-        with open(query_doc_score_path, mode='a', encoding='utf-8', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerows(rows)
+            if WRITE_CSV:
+                retrieved_para_text = get_paragraph_text(paragraph_texts, retrieved_article_id, retrieved_paragraph_id)
+                rows.append((query_text, retrieved_para_text, 1 if retrieved_article_id == correct_article_id else 0))
+                retrieved_article_name = get_title(id_to_title, retrieved_article_id)
+                retrieved_text_with_ID = (
+                    rank+1, query_text, correct_article_id, retrieved_article_id,
+                    retrieved_paragraph_id, correct_article_name, retrieved_article_name,
+                    score, retrieved_para_text
+                )
+                retrieved_texts_with_ID.append(retrieved_text_with_ID)
+
+        if WRITE_CSV:
+            write_retrieved_results_to_file(retrieved_results_file_path, retrieved_texts_with_ID)
+            with open(query_doc_score_path, mode='a', encoding='utf-8', newline='') as file:
+                writer = csv.writer(file)
+                writer.writerows(rows)
 
         iteration += 1
         if iteration % progress_checkpoint == 0:
             logging.info(f"{100 * iteration // n_rows_in_df}% completed.")
 
-    logging.info("\n ===================Retrieved Text Stats======================")
-    logging.info(f"Average Recall@1: {sum(retrived_texts_recall_1)/len(retrived_texts_recall_1):.4f}")
-    logging.info(f"Average Recall@3: {sum(retrived_texts_recall_3)/len(retrived_texts_recall_3):.4f}")
-    logging.info(f"Average Recall@5: {sum(retrived_texts_recall_5)/len(retrived_texts_recall_5):.4f}")
-    logging.info(f"Average Recall@10: {sum(retrived_texts_recall_10)/len(retrived_texts_recall_10):.4f}")
-    logging.info(f"Average Recall@100: {sum(retrived_texts_recall_100)/len(retrived_texts_recall_100):.4f}")
-    logging.info(f"Average Recall@1000: {sum(retrived_texts_recall_1000)/len(retrived_texts_recall_1000):.4f}")
-    logging.info(f"Average Overall Recall: {sum(retrived_texts_recall_overall)/len(retrived_texts_recall_overall):.4f}")
-    logging.info("\n ===================Retrieved Text Stats End======================")
-
-    # Append summary line
-    with open(SUMMARY_METRICS, mode='a', encoding='utf-8', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow([
-            "L6",
-            sum(retrived_texts_recall_1)/len(retrived_texts_recall_1),
-            sum(retrived_texts_recall_3)/len(retrived_texts_recall_3),
-            sum(retrived_texts_recall_5)/len(retrived_texts_recall_5),
-            sum(retrived_texts_recall_10)/len(retrived_texts_recall_10),
-            sum(retrived_texts_recall_100)/len(retrived_texts_recall_100),
-            sum(retrived_texts_recall_1000)/len(retrived_texts_recall_1000),
-            sum(retrived_texts_recall_overall)/len(retrived_texts_recall_overall)
-        ])
+    run.close()
+    logging.info(f"Wrote run {RETRIEVAL_RUN} ({iteration} queries x top {TOP_K})")
+
+    metrics = evaluation.evaluate_run(RETRIEVAL_RUN)
+    evaluation.log_metrics(metrics, "Retrieved Text Stats")
+    evaluation.append_summary(SUMMARY_METRICS, summary_label(), metrics)
+
+# ===============================
+# All query phrasings in one process
+# ===============================
+def load_variants(variants_dir):
+    """Every sampled_queries_<version>.csv of 9.multiple_query_phrasings.py as one DataFrame with a 'variant' column."""
+    frames = []
+    for path in sorted(Path(variants_dir).glob("sampled_queries_*.csv")):
+        df = pd.read_csv(path)
+        df["variant"] = path.stem[len("sampled_queries_"):]
+        frames.append(df)
+    if not frames:
+        return None
+    return pd.concat(frames, ignore_index=True)
+
+def evaluate_variants(variants_df, ctx):
+    """
+    Retrieve every distinct query once (same string and, when filtering, same filter columns), score the
+    first-hit rank of every row sharing it as its results stream by, then write one summary row per variant.
+    Only the ranks are kept, never the top-k lists.
+    """
+    key_cols = ["query"]
+    if SEARCH_MODE == "paragraph":
+        key_cols += (["source_article_id"] if EXCLUDE_SOURCE else []) + \
+                    sorted({"min_article_id", "max_article_id"} & set(variants_df.columns))
+    variants_df = variants_df.assign(query=variants_df["query"].astype(str))
+    codes = variants_df.groupby(key_cols, sort=False, dropna=False).ngroup().to_numpy()
+    unique_df = variants_df.iloc[np.unique(codes, return_index=True)[1]]   # one row per distinct query, by code
+    rows_by_code = np.split(np.argsort(codes, kind="stable"), np.cumsum(np.bincount(codes))[:-1])
+    correct = pd.to_numeric(variants_df["correct_article_id"], errors="coerce").fillna(-2).astype("int64").to_numpy()
+    logging.info(f"{variants_df['variant'].nunique()} variants, {len(variants_df)} queries, "
+                 f"{len(unique_df)} distinct ({len(variants_df) - len(unique_df)} duplicates searched once)")
+
+    ranks = np.zeros(len(variants_df), dtype="int64")
+    progress_checkpoint = max(1, len(unique_df) // 10)
+    for code, (_, top_k_results) in enumerate(retrieve_batches(unique_df, ctx)):
+        rows = rows_by_code[code]
+        article_ids = np.fromiter((article_id for article_id, _, _ in top_k_results), dtype="int64",
+                                  count=len(top_k_results))
+        ranks[rows] = evaluation.first_hit_ranks(article_ids[None, :], correct[rows])
+        if (code + 1) % progress_checkpoint == 0:
+            logging.info(f"{100 * (code + 1) // len(unique_df)}% completed.")
+
+    variants = variants_df["variant"].to_numpy()
+    for variant in dict.fromkeys(variants.tolist()):
+        metrics = evaluation.evaluate_ranks(ranks[variants == variant])
+        evaluation.log_metrics(metrics, f"{variant} ({metrics['n_queries']} queries)")
+        evaluation.append_summary(SUMMARY_METRICS, f"{summary_label()}-{variant}", metrics)
 
 # MAIN
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Retrieve and score the queries against the FAISS index.")
+    parser.add_argument("--mode", choices=["paragraph", "article", "centroid"], default=SEARCH_MODE)
+    parser.add_argument("--agg", choices=article_search.AGGREGATIONS, default=ARTICLE_AGG)
+    parser.add_argument("--top-n", type=int, default=ARTICLE_TOP_N, help="article mode, --agg sum: paragraphs summed per article.")
+    parser.add_argument("--top-k", type=int, default=TOP_K)
+    parser.add_argument("--retriever", choices=["dense", "bm25", "hybrid"], default=RETRIEVER,
+                        help="paragraph mode: first stage (hybrid = dense + BM25 fused).")
+    parser.add_argument("--fusion", choices=hybrid_search.FUSIONS, default=FUSION)
+    parser.add_argument("--dense-k", type=int, default=DENSE_K, help="hybrid: dense candidates per query.")
+    parser.add_argument("--sparse-k", type=int, default=SPARSE_K, help="hybrid: BM25 candidates per query.")
+    parser.add_argument("--dense-weight", type=float, default=DENSE_WEIGHT, help="hybrid: weight of the dense list.")
+    parser.add_argument("--exclude-source", action="store_true", default=EXCLUDE_SOURCE,
+                        help="paragraph mode: never return paragraphs of the query's source article.")
+    parser.add_argument("--article-range", type=int, nargs=2, metavar=("LO", "HI"), default=ARTICLE_RANGE,
+                        help="paragraph mode: only search articles LO..HI.")
+    parser.add_argument("--csv", action="store_true", default=WRITE_CSV,
+                        help="Also write the full-text retrieved-docs and query-doc-score CSVs.")
+    parser.add_argument("--variants", nargs="?", const=QUERY_VERSIONS_DIR, type=Path, default=None, metavar="DIR",
+                        help="Evaluate every sampled_queries_<version>.csv in DIR (default: the "
+                             "9.multiple_query_phrasings.py output) with one model/index load; one summary row each.")
+    args = parser.parse_args()
+    SEARCH_MODE, ARTICLE_AGG, ARTICLE_TOP_N, TOP_K = args.mode, args.agg, args.top_n, args.top_k
+    WRITE_CSV = args.csv
+    RETRIEVER, FUSION, DENSE_K, SPARSE_K, DENSE_WEIGHT = args.retriever, args.fusion, args.dense_k, args.sparse_k, args.dense_weight
+    EXCLUDE_SOURCE, ARTICLE_RANGE = args.exclude_source, args.article_range
+    if args.variants and WRITE_CSV:
+        parser.error("--csv is not available with --variants (metrics only)")
+    if RETRIEVER != "dense" and SEARCH_MODE != "paragraph":
+        parser.error("--retriever bm25/hybrid needs --mode paragraph")
+    if (EXCLUDE_SOURCE or ARTICLE_RANGE) and SEARCH_MODE != "paragraph":
+        parser.error("--exclude-source / --article-range need --mode paragraph")
+
     logging.basicConfig(
         level=logging.INFO,
         format="%(message)s",
         handlers=[logging.FileHandler(OUTPUT_LOG, mode="w"), logging.StreamHandler()]
     )
 
-    # Load embeddings
-    embeddings_dict = load_embeddings(EMBEDDINGS_PATH)
-    fiass_index, id_to_article_paragraph = create_faiss_index(embeddings_dict)
-    logging.info("Created FAISS index.")
-
-    # Load master
-    paragraphs_split_all_df = pd.read_csv(MASTER_CSV)
-    logging.info("Loaded master CSV.")
+    # Load the persisted index (memory-mapped; ids are the packed paragraph keys)
+    if not FAISS_INDEX_PATH.exists():
+        logging.error(f"FAISS index not found: {FAISS_INDEX_PATH} — run 3.FAISS_Index/create_faiss_index.py first.")
+        sys.exit(1)
+    fiass_index, rescorer, rescore = load_faiss_index(FAISS_INDEX_PATH)
+
+    bm25 = None
+    if RETRIEVER != "dense":
+        if not BM25_INDEX_PATH.exists():
+            logging.error(f"BM25 index not found: {BM25_INDEX_PATH} — run 3.FAISS_Index/bm25_index.py first.")
+            sys.exit(1)
+        bm25 = bm25_index.BM25Index(BM25_INDEX_PATH)
+        logging.info(f"Loaded BM25 index {BM25_INDEX_PATH} ({len(bm25)} paragraphs, {len(bm25.vocab)} terms)")
+
+    # Near-duplicate clusters (paragraph_dedup.py): only representatives were embedded
+    rep_members = paragraph_dedup.members_by_rep(paragraph_dedup.load_clusters())
+    logging.info(f"Loaded {len(rep_members)} near-duplicate clusters")
+
+    centroid_search = None
+    if SEARCH_MODE == "centroid":
+        if not ARTICLE_INDEX_PATH.exists():
+            logging.error(f"Article index not found: {ARTICLE_INDEX_PATH} — run 3.FAISS_Index/create_article_index.py first.")
+            sys.exit(1)
+        paragraph_ids, paragraph_embeddings, _ = embedding_store.load_embeddings(EMBEDDINGS_PATH)
+        centroid_search = article_search.open_centroid_search(ARTICLE_INDEX_PATH, paragraph_ids, paragraph_embeddings, rep_members)
+    search_desc = f"{SEARCH_MODE}" + (f" ({ARTICLE_AGG})" if SEARCH_MODE == "article" else "")
+    if SEARCH_MODE == "paragraph":
+        search_desc += f", retriever={RETRIEVER}"
+        if RETRIEVER == "hybrid":
+            search_desc += f" ({FUSION}, dense_k={DENSE_K}, sparse_k={SPARSE_K})"
+    logging.info(f"Search mode: {search_desc}, top_k={TOP_K}")
+
+    # (article_id, paragraph_id) → text, only for the --csv outputs: the mmap store, else a dict from the master CSV
+    paragraph_texts, id_to_title = None, {}
+    if WRITE_CSV:
+        paragraph_texts = paragraph_store.open_texts(TEXT_STORE, MASTER_CSV)
+        source = TEXT_STORE if isinstance(paragraph_texts, paragraph_store.ParagraphStore) else MASTER_CSV
+        logging.info(f"Loaded paragraph texts from {source} ({len(paragraph_texts)} paragraphs).")
 
     # Load model (L6 only)
-    model = SentenceTransformer(MODEL_NAME)
-    logging.info(f"Loaded model: {MODEL_NAME}")
-
-    # Load queries (from your query script’s output)
-    sampled_df = pd.read_csv(QUERIES_CSV)
-    logging.info(f"Loaded queries: {len(sampled_df)}")
-
-    # Load title->id mapping (scoped to fandom)
-    with open(TITLE_TO_ID_JSON, 'r') as f:
-        title_to_id_mapping = json.load(f)
-    logging.info("Loaded title_to_id_mapping")
-
+    model = load_encoder(MODEL_NAME, config.INFERENCE_BACKEND)
+    logging.info(f"Loaded model: {MODEL_NAME} ({config.INFERENCE_BACKEND})")
+
+    # Load queries (from your query script’s output, or all of its phrasings)
+    if args.variants:
+        sampled_df = load_variants(args.variants)
+        if sampled_df is None:
+            logging.error(f"No sampled_queries_*.csv in {args.variants} — run 4.Query/9.multiple_query_phrasings.py first.")
+            sys.exit(1)
+        logging.info(f"Loaded query variants from {args.variants}: {len(sampled_df)} queries")
+    else:
+        sampled_df = pd.read_csv(QUERIES_CSV)
+        logging.info(f"Loaded queries: {len(sampled_df)}")
+    if EXCLUDE_SOURCE and "source_article_id" not in sampled_df.columns:
+        logging.error(f"{args.variants or QUERIES_CSV} has no source_article_id column — re-run 4.Query/8.query_creation.py.")
+        sys.exit(1)
+    range_columns = per_query_range_columns(sampled_df)
+    if range_columns and SEARCH_MODE != "paragraph":
+        # article/centroid search has no article filter → the ranges would be silently ignored
+        logging.error(f"{args.variants or QUERIES_CSV} sets per-query {range_columns}, which only --mode paragraph applies.")
+        sys.exit(1)
+    if SEARCH_MODE == "paragraph" and (EXCLUDE_SOURCE or ARTICLE_RANGE or range_columns):
+        logging.info(f"Filtered search: exclude_source={EXCLUDE_SOURCE}, article_range={ARTICLE_RANGE}, "
+                     f"per-query ranges={range_columns}")
+
+    # Load title->id mapping (scoped to fandom; article names only go into the --csv outputs)
+    if WRITE_CSV:
+        with open(TITLE_TO_ID_JSON, 'r') as f:
+            id_to_title = build_title_lookup(json.load(f))
+        logging.info("Loaded title_to_id_mapping")
+
+    ctx = RetrievalContext(fiass_index, model, rescorer, rescore, rep_members, bm25, centroid_search)
     logging.info("Retrieval started!")
-    retrieve_top_k(sampled_df, fiass_index, model, title_to_id_mapping, QUERY_DOC_SCORES, RETRIEVED_DOCS)
\ No newline at end of file
+    if args.variants:
+        evaluate_variants(sampled_df, ctx)
+    else:
+        retrieve_top_k(sampled_df, ctx, id_to_title, paragraph_texts, QUERY_DOC_SCORES, RETRIEVED_DOCS)
\ No newline at end of file
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Long-running local retrieval service: the encoder, the FAISS index, the near-duplicate
+clusters and the paragraph text store are loaded once and stay warm between requests.
+
+    python retrieval_service.py [--port 8765] [--mode paragraph|article|centroid] [--window-ms 5] [--max-batch 64]
+
+    POST /search    {"query": "...", "k": 10}  or  {"queries": ["...", ...], "k": 10}
+                    optional "text": false / "titles": false to skip paragraph text / article names
+    GET  /metrics   request and query counts, QPS, batch sizes, latency percentiles
+    GET  /health
+
+Concurrent requests are coalesced by a micro-batcher: the first request opens a batch
+window of --window-ms, everything that arrives inside it (up to --max-batch queries) is
+encoded and searched in one call at the largest k asked for, and each request gets its
+own slice back. Encoding and search run on a single worker thread, so while one batch is
+being searched the next one fills up and the event loop keeps accepting connections.
+Plain asyncio + HTTP/1.1 with keep-alive, no web framework.
+"""
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import numpy as np
+
+CONFIG_DIR = Path("/home/sundeep/Fandom-Span-Identification-and-Retrieval/1.Fandom_Dataset_Collection/scripts")
+sys.path.append(str(CONFIG_DIR))
+import config
+import paragraph_dedup
+import paragraph_store
+import retreive                      # paths, index loading, encode/search helpers
+import article_search
+import embedding_store
+from inference_backend import load_encoder
+
+HOST = "127.0.0.1"
+PORT = 8765
+BATCH_WINDOW_MS = 5          # how long the first request of a batch waits for company
+MAX_BATCH = 64               # queries per encode + search call
+DEFAULT_K = 10
+MAX_K = 1000
+MAX_BODY_BYTES = 1 << 20
+LATENCY_WINDOW = 10000       # recent requests kept for the latency percentiles
+RATE_WINDOW_S = 60           # recent_qps is measured over this many seconds
+
+class Searcher:
+    """Everything a query needs, loaded once; search() is called from the batcher's worker thread."""
+    def __init__(self, mode="paragraph", agg=retreive.ARTICLE_AGG, top_n=retreive.ARTICLE_TOP_N):
+        self.mode, self.agg, self.top_n = mode, agg, top_n
+        self.index, self.rescorer, self.rescore = retreive.load_faiss_index(retreive.FAISS_INDEX_PATH)
+        self.rep_members = paragraph_dedup.members_by_rep(paragraph_dedup.load_clusters())
+        self.centroid_search = None
+        if mode == "centroid":
+            paragraph_ids, paragraph_embeddings, _ = embedding_store.load_embeddings(retreive.EMBEDDINGS_PATH)
+            self.centroid_search = article_search.open_centroid_search(retreive.ARTICLE_INDEX_PATH, paragraph_ids,
+                                                                       paragraph_embeddings, self.rep_members)
+        self.texts = paragraph_store.open_texts(retreive.TEXT_STORE, retreive.MASTER_CSV)
+        self.id_to_title = {}
+        if retreive.TITLE_TO_ID_JSON.exists():
+            with open(retreive.TITLE_TO_ID_JSON, "r") as f:
+                self.id_to_title = retreive.build_title_lookup(json.load(f))
+        self.model = load_encoder(retreive.MODEL_NAME, config.INFERENCE_BACKEND)
+        logging.info(f"Loaded model {retreive.MODEL_NAME} ({config.INFERENCE_BACKEND}), mode={mode}, "
+                     f"{len(self.rep_members)} near-duplicate clusters, "
+                     f"{len(self.texts) if self.texts is not None else 0} paragraph texts")
+
+    def search(self, query_texts, k):
+        """Per query [(article_id, paragraph_id, score)], best first."""
+        query_embeddings = retreive.encode_queries(self.model, query_texts)
+        if self.mode == "centroid":
+            return self.centroid_search.search(query_embeddings, k)
+        if self.mode == "article":
+            return article_search.search_articles(self.index, query_embeddings, k, self.agg, self.top_n,
+                                                  self.rescorer, self.rescore, self.rep_members)
+        return [retreive.expand_duplicates(results, self.rep_members, k)
+                for results in retreive.query_index(self.index, query_embeddings, k, self.rescorer, self.rescore)]
+
+    def hits(self, results, with_text=True, with_titles=True):
+        """JSON-ready hits for one query."""
+        article_ids = [article_id for article_id, _, _ in results]
+        paragraph_ids = [paragraph_id for _, paragraph_id, _ in results]
+        texts = [None] * len(results)
+        if with_text and self.texts is not None and results:
+            texts = paragraph_store.lookup_texts(self.texts, article_ids, paragraph_ids)
+        hits = []
+        for (article_id, paragraph_id, score), text in zip(results, texts):
+            hit = {"article_id": int(article_id), "paragraph_id": int(paragraph_id), "score": float(score)}
+            if with_titles:
+                hit["title"] = retreive.get_title(self.id_to_title, article_id)
+            if with_text:
+                hit["text"] = text
+            hits.append(hit)
+        return hits
+
+class Metrics:
+    def __init__(self):
+        self.started = time.time()
+        self.requests = self.queries = self.errors = self.batches = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)      # seconds per /search request
+        self.batch_sizes = deque(maxlen=LATENCY_WINDOW)    # queries per encode + search call
+        self.batch_seconds = deque(maxlen=LATENCY_WINDOW)
+        self.completed = deque()                           # (finish time, n queries) in the last RATE_WINDOW_S
+
+    def record_request(self, seconds, n_queries):
+        now = time.time()
+        self.requests += 1
+        self.queries += n_queries
+        self.latencies.append(seconds)
+        self.completed.append((now, n_queries))
+        while self.completed and self.completed[0][0] < now - RATE_WINDOW_S:
+            self.completed.popleft()
+
+    def record_batch(self, n_queries, seconds):
+        self.batches += 1
+        self.batch_sizes.append(n_queries)
+        self.batch_seconds.append(seconds)
+
+    def snapshot(self) -> dict:
+        uptime = time.time() - self.started
+        window = min(RATE_WINDOW_S, uptime) or 1.0
+        def ms(values):
+            if not values:
+                return {}
+            arr = 1000 * np.asarray(values)
+            return {f"p{p}": float(np.percentile(arr, p)) for p in (50, 95, 99)} | {"mean": float(arr.mean())}
+        return {
+            "uptime_s": uptime,
+            "requests": self.requests,
+            "queries": self.queries,
+            "errors": self.errors,
+            "batches": self.batches,
+            "qps": self.queries / uptime if uptime else 0.0,
+            "recent_qps": sum(n for _, n in self.completed) / window,
+            "mean_batch_queries": float(np.mean(self.batch_sizes)) if self.batch_sizes else 0.0,
+            "max_batch_queries": int(max(self.batch_sizes)) if self.batch_sizes else 0,
+            "request_latency_ms": ms(self.latencies),
+            "batch_search_ms": ms(self.batch_seconds),
+        }
+
+class MicroBatcher:
+    """Coalesces concurrent submit() calls into one searcher.search() call per batch window."""
+    def __init__(self, searcher: Searcher, metrics: Metrics, window_ms=BATCH_WINDOW_MS, max_batch=MAX_BATCH):
+        self.searcher, self.metrics = searcher, metrics
+        self.window, self.max_batch = window_ms / 1000, max_batch
+        self.queue = asyncio.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=1)   # one encoder/index user at a time
+
+    async def submit(self, query_texts, k):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((list(query_texts), k, future))
+        return await future
+
+    async def _collect(self):
+        """
+        First queued request, then whatever else arrives within the window (up to max_batch queries).
+        Waiting goes through a get() task that is cancelled at the deadline; if it took an item in
+        the meantime that item still joins this batch (wait_for could drop it on the floor).
+        """
+        batch = [await self.queue.get()]
+        n = len(batch[0][0])
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.window
+        while n < self.max_batch:
+            try:
+                item = self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                getter = asyncio.ensure_future(self.queue.get())
+                done, _ = await asyncio.wait({getter}, timeout=timeout)
+                if not done:
+                    getter.cancel()
+                    await asyncio.wait({getter})     # settles as cancelled, or with an item it already took
+                if getter.cancelled():
+                    break
+                item = getter.result()
+            batch.append(item)
+            n += len(item[0])
+        return batch
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            query_texts = [text for texts, _, _ in batch for text in texts]
+            k = max(k for _, k, _ in batch)
+            t0 = time.perf_counter()
+            try:
+                results = await loop.run_in_executor(self.executor, self.searcher.search, query_texts, k)
+            except Exception as e:
+                logging.exception("Batch search failed")
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.metrics.record_batch(len(query_texts), time.perf_counter() - t0)
+            start = 0
+            for texts, k_i, future in batch:
+                if not future.done():          # the client may have gone away
+                    future.set_result([r[:k_i] for r in results[start:start + len(texts)]])
+                start += len(texts)
+
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+class RetrievalService:
+    def __init__(self, searcher: Searcher, window_ms=BATCH_WINDOW_MS, max_batch=MAX_BATCH):
+        self.searcher = searcher
+        self.metrics = Metrics()
+        self.batcher = MicroBatcher(searcher, self.metrics, window_ms, max_batch)
+
+    async def search(self, body: dict) -> dict:
+        single = "query" in body
+        query_texts = [body["query"]] if single else body.get("queries")
+        if not isinstance(query_texts, list) or not query_texts or not all(isinstance(q, str) for q in query_texts):
+            raise RequestError(400, 'expected "query": str or "queries": [str, ...]')
+        k = body.get("k", DEFAULT_K)
+        if not isinstance(k, int) or not 1 <= k <= MAX_K:
+            raise RequestError(400, f'"k" must be an integer in 1..{MAX_K}')
+        t0 = time.perf_counter()
+        results = await self.batcher.submit(query_texts, k)
+        hits = [self.searcher.hits(r, body.get("text", True), body.get("titles", True)) for r in results]
+        took = time.perf_counter() - t0
+        self.metrics.record_request(took, len(query_texts))
+        return {"results": hits[0] if single else hits, "took_ms": 1000 * took}
+
+    async def route(self, method, path, body: bytes) -> dict:
+        if path == "/health":
+            return {"status": "ok", "mode": self.searcher.mode, "ntotal": int(self.searcher.index.ntotal)}
+        if path == "/metrics":
+            return self.metrics.snapshot()
+        if path == "/search":
+            if method != "POST":
+                raise RequestError(405, "use POST")
+            try:
+                payload = json.loads(body or b"{}")
+            except (ValueError, UnicodeDecodeError):
+                raise RequestError(400, "body is not valid JSON")
+            if not isinstance(payload, dict):
+                raise RequestError(400, "body must be a JSON object")
+            return await self.search(payload)
+        raise RequestError(404, f"no route {path}")
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """One connection; requests are served in order until the client closes or asks to."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode("latin-1").split(maxsplit=2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = (headers.get("connection", "").lower() != "close"
+                              and not version.strip().upper().endswith("1.0"))
+                length = int(headers.get("content-length", 0) or 0)
+                try:
+                    if length > MAX_BODY_BYTES:
+                        keep_alive = False
+                        raise RequestError(413, f"body over {MAX_BODY_BYTES} bytes")
+                    body = await reader.readexactly(length) if length else b""
+                    status, payload = 200, await self.route(method.upper(), target.split("?", 1)[0], body)
+                except RequestError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except Exception as e:
+                    logging.exception("Request failed")
+                    status, payload = 500, {"error": str(e)}
+                if status != 200:
+                    self.metrics.errors += 1
+                data = json.dumps(payload).encode("utf-8")
+                writer.write(f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: application/json\r\n"
+                             f"Content-Length: {len(data)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}"
+                             f"\r\n\r\n".encode("latin-1") + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host=HOST, port=PORT):
+        batcher = asyncio.create_task(self.batcher.run())
+        server = await asyncio.start_server(self.handle, host, port)
+        logging.info(f"🚀 Retrieval service on http://{host}:{port} (window {1000 * self.batcher.window:.1f} ms, "
+                     f"max batch {self.batcher.max_batch})")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve retrieval over HTTP with warm models and micro-batching.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--mode", choices=["paragraph", "article", "centroid"], default=retreive.SEARCH_MODE)
+    parser.add_argument("--agg", choices=article_search.AGGREGATIONS, default=retreive.ARTICLE_AGG)
+    parser.add_argument("--top-n", type=int, default=retreive.ARTICLE_TOP_N)
+    parser.add_argument("--window-ms", type=float, default=BATCH_WINDOW_MS, help="Batch window (0 = no waiting).")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if not retreive.FAISS_INDEX_PATH.exists():
+        logging.error(f"FAISS index not found: {retreive.FAISS_INDEX_PATH} — run 3.FAISS_Index/create_faiss_index.py first.")
+        sys.exit(1)
+    if args.mode == "centroid" and not retreive.ARTICLE_INDEX_PATH.exists():
+        logging.error(f"Article index not found: {retreive.ARTICLE_INDEX_PATH} — run 3.FAISS_Index/create_article_index.py first.")
+        sys.exit(1)
+    searcher = Searcher(args.mode, args.agg, args.top_n)
+    service = RetrievalService(searcher, args.window_ms, args.max_batch)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        logging.info("Stopped.")
+
+if __name__ == "__main__":
+    main()
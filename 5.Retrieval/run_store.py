@@ -0,0 +1,109 @@
+"""
+Compact on-disk format for a ranked run (retrieval or re-ranking output), shared by
+retreive.py and 6.Re-Rank/rerank.py.
+
+A run is four files next to each other:
+
+    <run>.ids.npy       int64 (n_queries, top_k)   packed (article_id, paragraph_id), -1 = no hit
+    <run>.scores.npy    float32 (n_queries, top_k) score of each hit, -inf = no hit
+    <run>.queries.csv   one row per query: q_id, query, linked_word, correct_article_id
+    <run>.meta.json     {"top_k", "n_queries", "model", "mode", ...}
+
+Row i of both matrices belongs to row i of the queries CSV, best hit first. The matrices are
+written through a memory map and read back with mmap, so a consumer touches only the rows it
+needs. Paragraph text and article titles are not stored; they are resolved by id (paragraph
+text store, title mapping) only where a step actually needs them.
+"""
+import os
+import csv
+import json
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+import embedding_store
+
+QUERY_FIELDS = ["q_id", "query", "linked_word", "correct_article_id"]
+
+def run_files(run_path: Path) -> dict:
+    run_path = Path(run_path)
+    return {part: run_path.with_name(f"{run_path.name}.{part}") for part in
+            ("ids.npy", "scores.npy", "queries.csv", "meta.json")}
+
+def run_exists(run_path: Path) -> bool:
+    return all(p.exists() for p in run_files(run_path).values())
+
+class RunWriter:
+    """Fills a run query by query; files appear under their final names only on close()."""
+    def __init__(self, run_path: Path, n_queries: int, top_k: int, meta: dict = None):
+        self.files = run_files(run_path)
+        self.tmp = {part: p.with_name(p.name + ".tmp") for part, p in self.files.items()}
+        self.n_queries, self.top_k = n_queries, top_k
+        self.meta = {**(meta or {}), "top_k": top_k, "n_queries": n_queries, "key_format": embedding_store.KEY_FORMAT}
+        self.ids = np.lib.format.open_memmap(self.tmp["ids.npy"], mode="w+", dtype="int64", shape=(n_queries, top_k))
+        self.scores = np.lib.format.open_memmap(self.tmp["scores.npy"], mode="w+", dtype="float32",
+                                                shape=(n_queries, top_k))
+        self.ids[:] = -1
+        self.scores[:] = -np.inf
+        self._queries = open(self.tmp["queries.csv"], "w", encoding="utf-8", newline="")
+        self._writer = csv.DictWriter(self._queries, fieldnames=QUERY_FIELDS, extrasaction="ignore")
+        self._writer.writeheader()
+        self.count = 0
+
+    def append(self, query_row: dict, results):
+        """query_row: q_id/query/linked_word/correct_article_id; results: [(article_id, paragraph_id, score)]."""
+        results = results[:self.top_k]
+        if results:
+            article_ids, paragraph_ids, scores = zip(*results)
+            keys = np.stack([np.asarray(article_ids, dtype="int64"), np.asarray(paragraph_ids, dtype="int64")], axis=1)
+            self.ids[self.count, :len(results)] = embedding_store.pack_paragraph_ids(keys)
+            self.scores[self.count, :len(results)] = np.asarray(scores, dtype="float32")
+        self._writer.writerow({field: query_row.get(field) for field in QUERY_FIELDS})
+        self.count += 1
+
+    def close(self) -> int:
+        self.ids.flush()
+        self.scores.flush()
+        del self.ids, self.scores
+        self._queries.close()
+        self.meta["n_queries"] = self.count
+        with open(self.tmp["meta.json"], "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, indent=2)
+        for part, tmp in self.tmp.items():
+            os.replace(tmp, self.files[part])
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self._queries.close()
+            for tmp in self.tmp.values():
+                if tmp.exists():
+                    tmp.unlink()
+        return False
+
+class Run:
+    """A run opened read-only: ids/scores are memory-mapped, the queries CSV is small and loaded."""
+    def __init__(self, run_path: Path):
+        files = run_files(run_path)
+        with open(files["meta.json"], "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        n = self.meta["n_queries"]
+        self.ids = np.load(files["ids.npy"], mmap_mode="r")[:n]
+        self.scores = np.load(files["scores.npy"], mmap_mode="r")[:n]
+        self.queries = pd.read_csv(files["queries.csv"], keep_default_na=False,
+                                   dtype={"query": str, "linked_word": str})
+
+    def __len__(self):
+        return len(self.queries)
+
+    def hits(self, i: int):
+        """(article_ids, paragraph_ids, scores) of query i, best first, without padding."""
+        ids = np.asarray(self.ids[i])
+        valid = ids >= 0
+        keys = embedding_store.unpack_paragraph_ids(ids[valid])
+        return keys[:, 0], keys[:, 1], np.asarray(self.scores[i])[valid]
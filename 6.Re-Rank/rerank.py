@@ -5,12 +5,12 @@ import pandas as pd
 import numpy as np
 import csv
 import os
+import json
 import logging
+import argparse
 from pathlib import Path
 import sys
 
-from sentence_transformers import CrossEncoder
-
 #Config
 CONFIG_DIR = Path("/home/sundeep/Fandom-Span-Identification-and-Retrieval/1.Fandom_Dataset_Collection/scripts")
 sys.path.append(str(CONFIG_DIR))
@@ -25,23 +25,34 @@ PROJECT_ROOT = config.BASE_DIR.parents[1]  # ".../Fandom-Span-Identification-and
 RAW_DATA_DIR = config.FANDOM_DATA_DIR      # ".../raw_data/<fandom>_fandom_data"
 RETRIEVE_DIR = PROJECT_ROOT / "5.Retrieval"
 RERANK_DIR   = PROJECT_ROOT / "6.Reranking"
+sys.path.append(str(PROJECT_ROOT / "2.Embeddings"))
+sys.path.append(str(RETRIEVE_DIR))
+from inference_backend import load_cross_encoder
+import paragraph_store
+import run_store
+import evaluation
 
 model_short = MODEL_NAME.split("/")[-1]
 fandom_name = config.fandom_name
 
 # Inputs (from your retrieval script output)
-RETRIEVED_DOCS = RETRIEVE_DIR / f"retrieved_docs_{fandom_name}_{model_short}.csv"
-MASTER_CSV     = RAW_DATA_DIR / f"master_csv_{fandom_name}.csv"   # (only if you ever re-fetch text)
+RETRIEVAL_RUN  = RETRIEVE_DIR / f"retrieval_run_{fandom_name}_{model_short}"          # ids + scores (run_store)
+RETRIEVED_DOCS = RETRIEVE_DIR / f"retrieved_docs_{fandom_name}_{model_short}.csv"     # full-text CSV (retreive.py --csv)
+TEXT_STORE     = paragraph_store.STORE_PATH                                          # paragraph text by id
+MASTER_CSV     = RAW_DATA_DIR / f"master_csv_{fandom_name}.csv"   # text fallback when the store is not built
+TITLE_TO_ID_JSON = RAW_DATA_DIR / f"title_to_id_mapping_{fandom_name}.json"          # article names, --csv only
 
 # Outputs (fandom + model aware)
 os.makedirs(RERANK_DIR, exist_ok=True)
 OUTPUT_LOG        = RERANK_DIR / f"rerank_{fandom_name}_{model_short}.log"
 RE_RANKED_RESULTS = RERANK_DIR / f"re_ranked_docs_{fandom_name}_{model_short}.csv"
+RE_RANKED_RUN     = RERANK_DIR / f"re_ranked_run_{fandom_name}_{model_short}"        # ids + CE scores (run_store)
 SUMMARY_METRICS   = RERANK_DIR / f"rerank_metrics_{fandom_name}_{model_short}.csv"
 
 # Reranking params
 TOP_K = 1000  # same as retrieval
 CROSS_ENCODER_NAME = "cross-encoder/ms-marco-MiniLM-L-6-v2"  # standard CE
+WRITE_CSV = False  # --csv: also write the full-text RE_RANKED_RESULTS CSV
 
 # ===============================
 # Helpers (logic unchanged)
@@ -57,46 +68,37 @@ def normalize_range(data, new_min=-1.0, new_max=1.0):
     return [(x - lo) * scale + new_min for x in vals]
 
 
-def cross_encoder_rerank(cross_encoder, df_group):
+def cross_encoder_rerank(cross_encoder, query_text, para_texts):
     """
-    df_group: rows for a single query_text (up to TOP_K).
-    Adds cross_encoder_score and cross_encoder_rank (1-based).
+    para_texts: retrieved paragraphs of one query (up to TOP_K), in retrieval order.
+    Returns (scaled cross_encoder scores, order best-first as indices into para_texts).
     """
-    pairs = [[str(row['query_text']), str(row['retrieved_para_text'])] for _, row in df_group.iterrows()]
-    raw_scores = cross_encoder.predict(pairs)
-    scaled = normalize_range(raw_scores)
-
-    df_scored = df_group.copy()
-    df_scored['cross_encoder_score'] = scaled
-    df_scored = df_scored.sort_values('cross_encoder_score', ascending=False).reset_index(drop=True)
-    df_scored['cross_encoder_rank'] = df_scored.index + 1
-    return df_scored
-
-
-def _recall_at_k(ranked_article_ids, correct_article_id, k):
-    topk = ranked_article_ids[:k]
-    return 1 if any(aid == correct_article_id for aid in topk) else 0
-
-
-def _compute_recall_row(ranked_df, correct_article_id):
-    ids = ranked_df['retrieved_article_id'].tolist()
-    overall = 1 if correct_article_id in ids else 0
-    return {
-        'r_at_1':   _recall_at_k(ids, correct_article_id, 1),
-        'r_at_3':   _recall_at_k(ids, correct_article_id, 3),
-        'r_at_5':   _recall_at_k(ids, correct_article_id, 5),
-        'r_at_10':  _recall_at_k(ids, correct_article_id, 10),
-        'r_at_100': _recall_at_k(ids, correct_article_id, 100),
-        'r_at_1000':_recall_at_k(ids, correct_article_id, 1000),
-        'overall':  overall,
-    }
+    pairs = [[str(query_text), str(text)] for text in para_texts]
+    raw_scores = cross_encoder.predict(pairs) if pairs else []
+    scaled = np.asarray(normalize_range(raw_scores), dtype="float32")
+    order = np.argsort(-scaled, kind="stable")
+    return scaled, order
 
 
 # ===============================
-# Reranking main (logic unchanged)
+# Retrieval inputs
 # ===============================
-def rerank_top_k(retrieved_results_file_path, re_ranked_results_file_path, summary_metrics_path):
-    # Load retrieval CSV from seniors' pipeline
+def run_queries(run_path, paragraph_texts):
+    """
+    (n_queries, iterator) over a run_store run; per query yields
+    (query row, article_ids, paragraph_ids, retrieval_scores, paragraph texts). Text is read by id.
+    """
+    run = run_store.Run(run_path)
+
+    def queries():
+        for i, query_row in enumerate(run.queries.to_dict("records")):
+            article_ids, paragraph_ids, scores = (a[:TOP_K] for a in run.hits(i))
+            texts = paragraph_store.lookup_texts(paragraph_texts, article_ids, paragraph_ids, default="")
+            yield query_row, article_ids, paragraph_ids, scores, texts
+    return len(run), queries()
+
+def csv_queries(retrieved_results_file_path):
+    """Same as run_queries() for a full-text retrieved-docs CSV (retreive.py --csv)."""
     df = pd.read_csv(retrieved_results_file_path)
 
     # Expected columns from your retrieval script
@@ -110,9 +112,25 @@ def rerank_top_k(retrieved_results_file_path, re_ranked_results_file_path, summa
         if c not in df.columns:
             raise ValueError(f"Missing required column in retrieval CSV: {c}")
 
+    groups = list(df.groupby('query_text', sort=False))
+
+    def queries():
+        for q, dfq in groups:
+            # Ensure per-query limit of TOP_K (if any extra rows present)
+            dfq = dfq.sort_values('rank', ascending=True).head(TOP_K)
+            query_row = {"query": q, "correct_article_id": dfq['correct_article_id'].iloc[0]}
+            yield (query_row, dfq['retrieved_article_id'].to_numpy(), dfq['retrieved_paragraph_id'].to_numpy(),
+                   dfq['retrieval_score'].to_numpy(), dfq['retrieved_para_text'].tolist())
+    return len(groups), queries()
+
+# ===============================
+# Reranking main
+# ===============================
+def rerank_top_k(n_queries, queries, re_ranked_run_path, re_ranked_results_file_path, summary_metrics_path,
+                 id_to_title=None):
     # Load cross-encoder
-    cross_encoder = CrossEncoder(CROSS_ENCODER_NAME)
-    logging.info(f"Loaded CrossEncoder: {CROSS_ENCODER_NAME}")
+    cross_encoder = load_cross_encoder(CROSS_ENCODER_NAME, config.INFERENCE_BACKEND)
+    logging.info(f"Loaded CrossEncoder: {CROSS_ENCODER_NAME} ({config.INFERENCE_BACKEND})")
 
     # Prepare output schema (keep everything + CE fields; rename 'rank' -> 'retrieval_rank' to distinguish)
     out_fields = [
@@ -128,107 +146,94 @@ def rerank_top_k(retrieved_results_file_path, re_ranked_results_file_path, summa
         'retrieved_article_name',
         'retrieved_para_text',
     ]
-    with open(re_ranked_results_file_path, mode='w', encoding='utf-8', newline='') as f:
-        csv.writer(f).writerow(out_fields)
-
-    # Metrics accumulators
-    r1 = r3 = r5 = r10 = r100 = r1000 = roverall = 0
-    n_queries = 0
+    if WRITE_CSV:
+        with open(re_ranked_results_file_path, mode='w', encoding='utf-8', newline='') as f:
+            csv.writer(f).writerow(out_fields)
+    run = run_store.RunWriter(re_ranked_run_path, n_queries, TOP_K,
+                              {"model": MODEL_NAME, "cross_encoder": CROSS_ENCODER_NAME, "fandom": fandom_name})
 
-    groups = list(df.groupby('query_text', sort=False))
-    n_queries = len(groups)
     logging.info(f"Found {n_queries} queries for reranking.")
     step = max(1, n_queries // 10)
 
-    for i, (q, dfq) in enumerate(groups, start=1):
-        # Ensure per-query limit of TOP_K (if any extra rows present)
-        dfq = dfq.sort_values('rank', ascending=True).head(TOP_K)
-
-        ranked_df = cross_encoder_rerank(cross_encoder, dfq)
-        correct_article_id = dfq['correct_article_id'].iloc[0]
+    for i, (query_row, article_ids, paragraph_ids, retrieval_scores, para_texts) in enumerate(queries, start=1):
+        query_text, correct_article_id = query_row['query'], query_row['correct_article_id']
+        ce_scores, order = cross_encoder_rerank(cross_encoder, query_text, para_texts)
 
-        rec = _compute_recall_row(ranked_df, correct_article_id)
-        r1     += rec['r_at_1']
-        r3     += rec['r_at_3']
-        r5     += rec['r_at_5']
-        r10    += rec['r_at_10']
-        r100   += rec['r_at_100']
-        r1000  += rec['r_at_1000']
-        roverall += rec['overall']
+        run.append(query_row, list(zip(article_ids[order].tolist(), paragraph_ids[order].tolist(), ce_scores[order])))
 
         # Write rows
-        out_rows = []
-        for _, row in ranked_df.iterrows():
-            out_rows.append((
-                row.get('rank'),                        # as retrieval_rank
-                row.get('cross_encoder_rank'),
-                row.get('retrieval_score'),
-                row.get('cross_encoder_score'),
-                row.get('query_text'),
-                row.get('correct_article_id'),
-                row.get('retrieved_article_id'),
-                row.get('retrieved_paragraph_id'),
-                row.get('correct_article_name'),
-                row.get('retrieved_article_name'),
-                row.get('retrieved_para_text'),
-            ))
-
-        with open(re_ranked_results_file_path, mode='a', encoding='utf-8', newline='') as f:
-            csv.writer(f).writerows(out_rows)
+        if WRITE_CSV:
+            correct_article_name = id_to_title.get(str(correct_article_id))
+            out_rows = []
+            for ce_rank, j in enumerate(order.tolist(), start=1):
+                out_rows.append((
+                    j + 1,                                  # as retrieval_rank
+                    ce_rank,
+                    retrieval_scores[j],
+                    ce_scores[j],
+                    query_text,
+                    correct_article_id,
+                    article_ids[j],
+                    paragraph_ids[j],
+                    correct_article_name,
+                    id_to_title.get(str(article_ids[j])),
+                    para_texts[j],
+                ))
+
+            with open(re_ranked_results_file_path, mode='a', encoding='utf-8', newline='') as f:
+                csv.writer(f).writerows(out_rows)
 
         if i % step == 0 or i == n_queries:
             pct = int(round(100 * i / n_queries))
             logging.info(f"Re-ranked {i}/{n_queries} queries ({pct}%).")
 
-    # Averages
-    denom = max(1, n_queries)
-    avg_r1     = r1/denom
-    avg_r3     = r3/denom
-    avg_r5     = r5/denom
-    avg_r10    = r10/denom
-    avg_r100   = r100/denom
-    avg_r1000  = r1000/denom
-    avg_overall= roverall/denom
-
-    logging.info("\n ===================Re-ranked Text Stats======================")
-    logging.info(f"Average Recall@1:     {avg_r1:.4f}")
-    logging.info(f"Average Recall@3:     {avg_r3:.4f}")
-    logging.info(f"Average Recall@5:     {avg_r5:.4f}")
-    logging.info(f"Average Recall@10:    {avg_r10:.4f}")
-    logging.info(f"Average Recall@100:   {avg_r100:.4f}")
-    logging.info(f"Average Recall@1000:  {avg_r1000:.4f}")
-    logging.info(f"Average Overall:      {avg_overall:.4f}")
-    logging.info(" ===================Re-ranked Text Stats End======================\n")
-
-    # Append one-line summary to metrics CSV
-    file_exists = os.path.isfile(summary_metrics_path)
-    with open(summary_metrics_path, mode='a', encoding='utf-8', newline='') as f:
-        writer = csv.writer(f)
-        if not file_exists:
-            writer.writerow([
-                "Version",
-                "Recall@1","Recall@3","Recall@5","Recall@10","Recall@100","Recall@1000","Overall"
-            ])
-        writer.writerow([
-            "L6-CE",
-            avg_r1, avg_r3, avg_r5, avg_r10, avg_r100, avg_r1000, avg_overall
-        ])
+    run.close()
+    logging.info(f"Wrote re-ranked run {re_ranked_run_path}")
+
+    metrics = evaluation.evaluate_run(re_ranked_run_path)
+    evaluation.log_metrics(metrics, "Re-ranked Text Stats")
+    evaluation.append_summary(summary_metrics_path, "L6-CE", metrics, header=True)
 
 
 # ===============================
 # MAIN (paths + logging aligned)
 # ===============================
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-rank the retrieval run with a cross-encoder.")
+    parser.add_argument("--csv", action="store_true", default=WRITE_CSV,
+                        help="Also write the full-text re-ranked docs CSV.")
+    WRITE_CSV = parser.parse_args().csv
+
     logging.basicConfig(
         level=logging.INFO,
         format="%(message)s",
         handlers=[logging.FileHandler(OUTPUT_LOG, mode="w"), logging.StreamHandler()]
     )
 
+    # Retrieval output: the compact run (text resolved by id), else the full-text CSV of retreive.py --csv
+    if run_store.run_exists(RETRIEVAL_RUN):
+        paragraph_texts = paragraph_store.open_texts(TEXT_STORE, MASTER_CSV)
+        if paragraph_texts is None:
+            logging.error(f"No paragraph text: build {TEXT_STORE} (paragraph_store.py) or {MASTER_CSV}.")
+            sys.exit(1)
+        n_queries, queries = run_queries(RETRIEVAL_RUN, paragraph_texts)
+        logging.info(f"Reading run {RETRIEVAL_RUN}")
+    else:
+        n_queries, queries = csv_queries(RETRIEVED_DOCS)
+        logging.info(f"Reading {RETRIEVED_DOCS}")
+
+    id_to_title = {}
+    if WRITE_CSV:
+        with open(TITLE_TO_ID_JSON, 'r') as f:
+            for title, article_id in json.load(f).items():
+                id_to_title.setdefault(str(article_id), title)
+
     logging.info("Reranking started!")
     rerank_top_k(
-        retrieved_results_file_path=RETRIEVED_DOCS,
+        n_queries, queries,
+        re_ranked_run_path=RE_RANKED_RUN,
         re_ranked_results_file_path=RE_RANKED_RESULTS,
-        summary_metrics_path=SUMMARY_METRICS
+        summary_metrics_path=SUMMARY_METRICS,
+        id_to_title=id_to_title
     )
     logging.info("Reranking complete.")
\ No newline at end of file